@@ -1,19 +1,312 @@
 import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 from google import genai
 
+import context_cache
+from prompts import estimate_tokens
+from rate_limiter import GEMINI_LIMITER, RateLimitTimeout
+from resilience import BREAKERS, call_timeout, remaining
+from telemetry import STAGE_SECONDS, counter, record_gemini_usage, span
+from utils import submit_in_context
+
 load_dotenv()
 
 api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not found in .env")
 
-client = genai.Client(api_key=api_key)
 MODEL_NAME = "gemini-2.0-flash-001"
 
-def ask_gemini(prompt: str) -> str:
-    response = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=prompt,
-    )
-    return response.text or ""
+# USD per 1M tokens (input, output), used for cost accounting per model
+MODEL_PRICES = {
+    "gemini-2.0-flash-lite-001": (0.075, 0.30),
+    "gemini-2.0-flash-001": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+# Resilience settings for every Gemini call
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "30"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_BACKOFF_BASE_S = float(os.getenv("GEMINI_BACKOFF_BASE_S", "0.5"))
+GEMINI_BACKOFF_MAX_S = float(os.getenv("GEMINI_BACKOFF_MAX_S", "8"))
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "1") == "1"
+# Until enough calls have been observed, hedge after this many seconds
+GEMINI_HEDGE_DEFAULT_S = float(os.getenv("GEMINI_HEDGE_DEFAULT_S", "8"))
+HEDGE_MIN_SAMPLES = 20
+# A stream that sends nothing for this long (before / between chunks) has stalled
+GEMINI_STREAM_FIRST_CHUNK_S = float(os.getenv("GEMINI_STREAM_FIRST_CHUNK_S", "15"))
+GEMINI_STREAM_IDLE_S = float(os.getenv("GEMINI_STREAM_IDLE_S", "10"))
+# A batch job still running after this long is cancelled and its prompts sent one by one
+GEMINI_BATCH_MAX_WAIT_S = float(os.getenv("GEMINI_BATCH_MAX_WAIT_S", "600"))
+
+# The SDK's own HTTP timeout (ms) ends calls that _call_once stopped waiting
+# for, so a hung Gemini can't pile abandoned requests up in _llm_pool
+client = genai.Client(api_key=api_key, http_options={"timeout": int(GEMINI_TIMEOUT_S * 1000)})
+
+TRANSIENT_CODES = {429, 500, 502, 503, 504}
+
+# Gemini calls run here so they can be timed out and hedged
+_llm_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini")
+
+HEDGES = counter("travelbuddy_gemini_hedges_total", "Hedged Gemini calls by winner (primary/hedge).")
+RETRIES = counter("travelbuddy_gemini_retries_total", "Gemini retries by reason.")
+
+
+def is_throttled(error: Exception) -> bool:
+    """True for Gemini quota errors (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    return getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying: timeouts, quota, 5xx and connection problems."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "code", None) in TRANSIENT_CODES or is_throttled(error)
+
+
+def _send(prompt: str, model: str, system: str = None, stream: bool = False):
+    """
+    generate_content (or generate_content_stream) with the static system
+    instruction taken from the context cache when possible, otherwise sent inline.
+    """
+    generate = client.models.generate_content_stream if stream else client.models.generate_content
+    if not system:
+        return generate(model=model, contents=prompt)
+    handle = context_cache.get_handle(client, model, system)
+    if handle:
+        try:
+            return generate(model=model, contents=prompt, config={"cached_content": handle})
+        except Exception as e:
+            if not context_cache.is_missing_cache_error(e):
+                raise
+            # Expired or deleted behind our back: drop it and send inline
+            context_cache.invalidate(model, system)
+    return generate(model=model, contents=prompt, config={"system_instruction": system})
+
+
+def _generate(prompt: str, model: str, system: str = None):
+    """One generate_content call, with breaker and limiter bookkeeping."""
+    try:
+        with span("llm", "gemini", model=model):
+            response = _send(prompt, model, system)
+    except Exception as e:
+        if is_throttled(e):
+            GEMINI_LIMITER.report_throttled()
+            # Quota says nothing about health, but must not hold a half-open trial
+            BREAKERS["gemini"].release_trial()
+        else:
+            BREAKERS["gemini"].record_failure()
+        raise
+    BREAKERS["gemini"].record_success()
+    GEMINI_LIMITER.report_success()
+    record_gemini_usage(model, response, MODEL_PRICES.get(model))
+    return response
+
+
+def hedge_delay() -> float:
+    """Fire the hedge once a call has taken longer than the observed p95."""
+    if STAGE_SECONDS.count(kind="llm", name="gemini") < HEDGE_MIN_SAMPLES:
+        return GEMINI_HEDGE_DEFAULT_S
+    return STAGE_SECONDS.quantile(0.95, kind="llm", name="gemini")
+
+
+def _call_once(prompt: str, model: str, cost: int, timeout: float, system: str = None):
+    """
+    Run one attempt with a timeout. If hedging is on and the primary call is
+    slower than hedge_delay(), a duplicate is fired and the first answer wins.
+    """
+    primary = submit_in_context(_llm_pool, _generate, prompt, model, system)
+    pending = {primary}
+    started = time.monotonic()
+    hedged = False
+
+    done, _ = wait(pending, timeout=min(hedge_delay(), timeout))
+    if not done and GEMINI_HEDGE:
+        try:
+            # Only hedge if a rate limit slot is free right now
+            GEMINI_LIMITER.acquire(cost=cost, timeout=0)
+            pending.add(submit_in_context(_llm_pool, _generate, prompt, model, system))
+            hedged = True
+        except RateLimitTimeout:
+            pass
+
+    first_error = None
+    while pending:
+        left = timeout - (time.monotonic() - started)
+        if left <= 0:
+            break
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if hedged:
+                    HEDGES.inc(winner="primary" if future is primary else "hedge")
+                return future.result()
+            first_error = first_error or future.exception()
+    if first_error is not None and not pending:
+        raise first_error
+    # The abandoned call may still finish, but a hang has to count towards the breaker
+    BREAKERS["gemini"].record_failure()
+    raise TimeoutError(f"Gemini call exceeded {timeout:.1f}s")
+
+
+def ask_gemini(prompt: str, model: str = MODEL_NAME, system: str = None) -> str:
+    """
+    Resilient Gemini call: per-attempt timeout, retries with exponential
+    backoff and full jitter on transient errors, optional hedging.
+    `system` is a static instruction served from the context cache (see
+    context_cache); `prompt` is then only the request-specific part.
+    Raises resilience.Unavailable when the Gemini breaker is open or the
+    request deadline leaves too little time for a call.
+    """
+    # Cached tokens still count towards the TPM quota
+    cost = estimate_tokens(prompt) + (estimate_tokens(system) if system else 0)
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        # Reserve an RPM slot and the prompt's share of the TPM budget first
+        GEMINI_LIMITER.acquire(cost=cost, timeout=remaining())
+        timeout = call_timeout("gemini", GEMINI_TIMEOUT_S)
+        try:
+            response = _call_once(prompt, model, cost, timeout, system)
+            return response.text or ""
+        except Exception as e:
+            if not is_transient(e) or attempt == GEMINI_MAX_RETRIES:
+                raise
+            RETRIES.inc(reason=type(e).__name__)
+            backoff = random.uniform(0, min(GEMINI_BACKOFF_MAX_S, GEMINI_BACKOFF_BASE_S * 2 ** attempt))
+            left = remaining()
+            if left is not None and left < backoff:
+                raise
+            time.sleep(backoff)
+
+
+_STREAM_END = object()
+
+
+def _pump_stream(prompt: str, model: str, system: str, chunks: queue.Queue, stop: threading.Event):
+    """Read a Gemini stream into `chunks` (in _llm_pool); ends with _STREAM_END or the exception."""
+    try:
+        for chunk in _send(prompt, model, system, stream=True):
+            if stop.is_set():
+                return
+            chunks.put(chunk)
+        chunks.put(_STREAM_END)
+    except Exception as e:
+        chunks.put(e)
+
+
+def ask_gemini_stream(prompt: str, model: str = MODEL_NAME, system: str = None):
+    """
+    Stream a Gemini answer as text chunks. Uses the same limiter, breaker and
+    deadline as ask_gemini. Transient errors are retried only until the first
+    chunk has arrived; streams are not hedged. The stream is read in _llm_pool,
+    so a stall before the first chunk (GEMINI_STREAM_FIRST_CHUNK_S) or between
+    chunks (GEMINI_STREAM_IDLE_S) times out like a hung call.
+    """
+    cost = estimate_tokens(prompt) + (estimate_tokens(system) if system else 0)
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        GEMINI_LIMITER.acquire(cost=cost, timeout=remaining())
+        timeout = call_timeout("gemini", GEMINI_TIMEOUT_S)
+        started = time.monotonic()
+        streamed = False
+        last = None
+        chunks, stop = queue.Queue(), threading.Event()
+        try:
+            with span("llm", "gemini_stream", model=model):
+                submit_in_context(_llm_pool, _pump_stream, prompt, model, system, chunks, stop)
+                while True:
+                    idle = GEMINI_STREAM_IDLE_S if last is not None else GEMINI_STREAM_FIRST_CHUNK_S
+                    try:
+                        chunk = chunks.get(timeout=max(min(idle, timeout - (time.monotonic() - started)), 0))
+                    except queue.Empty:
+                        raise TimeoutError(f"Gemini stream stalled ({'idle' if last is not None else 'no first chunk'})")
+                    if chunk is _STREAM_END:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    last = chunk
+                    if chunk.text:
+                        streamed = True
+                        yield chunk.text
+                    if time.monotonic() - started > timeout:
+                        raise TimeoutError(f"Gemini stream exceeded {timeout:.1f}s")
+        except GeneratorExit:
+            # The consumer stopped reading; the stream proved nothing either way
+            BREAKERS["gemini"].release_trial()
+            raise
+        except Exception as e:
+            if is_throttled(e):
+                GEMINI_LIMITER.report_throttled()
+                BREAKERS["gemini"].release_trial()
+            else:
+                BREAKERS["gemini"].record_failure()
+            # Streams fail on first read, past _send's own cache fallback
+            cache_missing = bool(system) and context_cache.is_missing_cache_error(e)
+            if streamed or not (is_transient(e) or cache_missing) or attempt == GEMINI_MAX_RETRIES:
+                raise
+            if cache_missing:
+                context_cache.invalidate(model, system)
+            RETRIES.inc(reason=type(e).__name__)
+            backoff = random.uniform(0, min(GEMINI_BACKOFF_MAX_S, GEMINI_BACKOFF_BASE_S * 2 ** attempt))
+            left = remaining()
+            if left is not None and left < backoff:
+                raise
+            time.sleep(backoff)
+            continue
+        finally:
+            # Tell an abandoned reader to stop (the SDK's HTTP timeout bounds it)
+            stop.set()
+        BREAKERS["gemini"].record_success()
+        GEMINI_LIMITER.report_success()
+        # The final chunk carries the usage totals
+        record_gemini_usage(model, last, MODEL_PRICES.get(model))
+        return
+
+
+def ask_gemini_batch(prompts: list, model: str = MODEL_NAME, poll_seconds: int = 30, system: str = None,
+                     max_wait_s: float = GEMINI_BATCH_MAX_WAIT_S) -> list:
+    """
+    Submit many prompts as one Gemini batch job and return their texts in order.
+    Falls back to individual ask_gemini calls when the SDK has no batch support,
+    the job fails, or it hasn't finished within max_wait_s (it is cancelled).
+    """
+    batches = getattr(client, "batches", None)
+    if batches is None or not prompts:
+        return [ask_gemini(p, model=model, system=system) for p in prompts]
+
+    config = {"system_instruction": system} if system else {}
+    try:
+        job = batches.create(
+            model=model,
+            src=[{"contents": [{"role": "user", "parts": [{"text": p}]}], "config": config} for p in prompts],
+        )
+        done_states = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+        give_up_at = time.monotonic() + max_wait_s
+        while getattr(job.state, "name", str(job.state)) not in done_states:
+            left = give_up_at - time.monotonic()
+            if left <= 0:
+                try:
+                    batches.cancel(name=job.name)
+                except Exception:
+                    # Nothing to do: an uncancelled job just expires server-side
+                    pass
+                raise TimeoutError(f"Gemini batch job not finished after {max_wait_s}s")
+            time.sleep(min(poll_seconds, left))
+            job = batches.get(name=job.name)
+
+        if getattr(job.state, "name", str(job.state)) != "JOB_STATE_SUCCEEDED":
+            raise RuntimeError(f"Gemini batch job ended in state {job.state}")
+
+        texts = []
+        for item in job.dest.inlined_responses:
+            response = getattr(item, "response", None)
+            texts.append((response.text or "") if response else "")
+        if len(texts) != len(prompts):
+            raise RuntimeError("Gemini batch job returned an unexpected number of responses")
+        return texts
+    except Exception:
+        return [ask_gemini(p, model=model, system=system) for p in prompts]
@@ -1,53 +1,238 @@
-from agent_client import ask_gemini
+from model_router import route_gemini, route_gemini_stream
 from utils import cleanup_json
-from date_utils import extract_dates_from_text
-from amadeus_api import search_flight_offers, search_hotel_offers, city_to_iata
+from date_utils import extract_dates_from_text, flexible_window_from_text
+from amadeus_api import search_hotel_offers, city_to_iata
 from country_info_api import get_country_info
-from weather_api import get_weather
+from trip_weather import trip_weather
+from risk_data import safety_context
+from safety_rules import fast_assessment
+from geo import city_info
+from budget_engine import estimate_trip_cost
+from flight_ranking import preferences_from_text
+from offer_store import find_offers
+from fare_calendar import fare_calendar
+from transport import FLIGHT_SEARCHES_SKIPPED, estimate_route
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from prompts import PromptTemplate, Slot
+from resilience import Unavailable
+from utils import submit_in_context
+
+# Flight offers passed downstream after local ranking
+FLIGHT_TOP_K = 3
+
+# City -> ISO country code for REST Countries lookups
+CITY_TO_COUNTRY = {
+    "Paris": "FR",
+    "Brussels": "BE",
+    "Amsterdam": "NL",
+    "Berlin": "DE",
+    "Kyoto": "JP"
+}
+
+# Static part of each agent's prompt: sent as a Gemini system instruction and
+# context-cached per model, so each call only carries the trip-specific data
+PLANNER_INSTRUCTIONS = """
+You are the Trip Planner Agent in a multi-agent travel system.
+
+Your job:
+- Propose a structured trip plan for the user request and preferences you are given.
+- Use a list of cities, number of days, and daily activities.
+- Include a constraints section (budget, travel_style, transportation, accommodation).
+
+Respond STRICTLY in valid JSON with this structure:
+
+{
+  "summary": "string",
+  "city": ["Paris", "Brussels"],
+  "days": 7,
+  "daily_plan": [
+    {
+      "day": 1,
+      "city": "Paris",
+      "activities": [
+        "Visit Eiffel Tower",
+        "Walk along the Seine"
+      ]
+    }
+  ],
+  "constraints": {
+    "budget": "string",
+    "travel_style": "string",
+    "transportation": "string",
+    "accommodation": "string"
+  }
+}
+"""
+
+BOOKING_INSTRUCTIONS = """
+You are the Booking Agent in a multi-agent travel system.
+Based on the trip plan you are given, suggest hotels and day-by-day activities.
+
+Return STRICT JSON with:
+{
+  "hotels": [
+    {
+      "city": "string",
+      "hotel": "string",
+      "approx_price_per_night": number
+    }
+  ],
+  "activities": [
+    {
+      "day": number,
+      "city": "string",
+      "activities": ["string", "string"]
+    }
+  ]
+}
+"""
+
+SAFETY_INSTRUCTIONS = """
+You are the Safety and Compliance Agent in a multi-agent travel system.
+You are given a trip plan and a compact safety context per city: the weather
+on the travel dates (forecast, or monthly climate normals beyond the
+forecast horizon), the country's baseline advisory level and the seasonal
+hazards for the travel months.
+Based on all this information, return STRICT JSON:
+
+{
+  "overall_risk": "Low | Moderate | High",
+  "city_safety_notes": [
+    {
+      "city": "string",
+      "weather_risk": "string",
+      "country_risk": "string",
+      "guidelines": ["string", "string"]
+    }
+  ],
+  "general_recommendations": ["string", "string"]
+}
+"""
+
+BUDGET_INSTRUCTIONS = """
+You are the Budget Agent in a travel assistant system.
+You are given a trip summary, its cost breakdown and the user's budget.
+Suggest 2-3 practical adjustments to fit the budget.
+Respond STRICTLY in valid JSON: {"adjustments": ["string", "string"]}
+"""
+
+FUSED_INSTRUCTIONS = """
+You are the Booking, Safety and Budget agents of a travel system, answering together.
+You are given a trip plan, the user request, real flight and hotel offers,
+a compact safety context per city (weather on the travel dates, baseline
+advisory level, seasonal hazards) and a cost estimate in USD that was
+computed locally (do not recompute it).
+
+Return STRICT JSON with exactly these sections:
+{
+  "bookings": {
+    "hotels": [
+      {"city": "string", "hotel": "string", "approx_price_per_night": number}
+    ],
+    "activities": [
+      {"day": number, "city": "string", "activities": ["string", "string"]}
+    ]
+  },
+  "safety": {
+    "overall_risk": "Low | Moderate | High",
+    "city_safety_notes": [
+      {"city": "string", "weather_risk": "string", "country_risk": "string", "guidelines": ["string"]}
+    ],
+    "general_recommendations": ["string", "string"]
+  },
+  "budget": {
+    "adjustments": ["string", "string"]
+  }
+}
+"""
+
+# Request-specific part of each prompt. Slot budgets (in tokens) keep a
+# runaway plan or tool payload from blowing up prompt size and latency
+PLANNER_PROMPT = PromptTemplate("planner", """
+    User request and preferences:
+    {user_request}
+    """, user_request=Slot("text", max_tokens=1500))
+
+BOOKING_PROMPT = PromptTemplate("booking", """
+    TRIP PLAN:
+    {trip_plan}
+    """, trip_plan=Slot("json", max_tokens=2000))
+
+SAFETY_PROMPT = PromptTemplate("safety", """
+    TRIP PLAN:
+    {trip_plan}
+
+    SAFETY CONTEXT:
+    {safety_context}
+    """,
+    trip_plan=Slot("json", max_tokens=1500),
+    safety_context=Slot("json", max_tokens=1000),
+)
+
+BUDGET_PROMPT = PromptTemplate("budget", """
+    Trip summary: {summary}
+    Cities: {cities}
+
+    Cost breakdown ({currency}): {breakdown}
+    User budget: {budget}
+    Over budget by: {over_by}
+    """,
+    summary=Slot("text", max_tokens=200),
+    cities=Slot("json", max_tokens=100),
+    currency=Slot("text", max_tokens=5),
+    breakdown=Slot("json", max_tokens=150),
+    budget=Slot("number"),
+    over_by=Slot("number"),
+)
+
+FUSED_PROMPT = PromptTemplate("fused", """
+    TRIP PLAN:
+    {trip_plan}
+
+    USER REQUEST:
+    {user_request}
+
+    REAL FLIGHT OFFERS (cheapest first where available):
+    {flights}
+
+    REAL HOTEL OFFERS:
+    {hotel_offers}
+
+    SAFETY CONTEXT:
+    {safety_context}
+
+    COST ESTIMATE (USD):
+    {estimate}
+    """,
+    trip_plan=Slot("json", max_tokens=1500),
+    user_request=Slot("text", max_tokens=500),
+    flights=Slot("json", max_tokens=800),
+    hotel_offers=Slot("json", max_tokens=600),
+    safety_context=Slot("json", max_tokens=1000),
+    estimate=Slot("json", max_tokens=200),
+)
+
 
 class TripPlannerAgent:
-    def plan_trip(self, user_request: str) -> dict:
+    def plan_trip(self, user_request: str, on_field=None) -> dict:
         """
         Ask Gemini to create a structured trip plan and return it as a dict.
+        With on_field, the answer is streamed and on_field(key, value) is
+        called for each top-level field of the plan as soon as it is complete.
         """
-        prompt = f"""
-        You are the Trip Planner Agent in a multi-agent travel system.
-
-        User request and preferences:
-        {user_request}
-
-        Your job:
-        - Propose a structured trip plan.
-        - Use a list of cities, number of days, and daily activities.
-        - Include a constraints section (budget, travel_style, transportation, accommodation).
-
-        Respond STRICTLY in valid JSON with this structure:
-
-        {{
-          "summary": "string",
-          "city": ["Paris", "Brussels"],
-          "days": 7,
-          "daily_plan": [
-            {{
-              "day": 1,
-              "city": "Paris",
-              "activities": [
-                "Visit Eiffel Tower",
-                "Walk along the Seine"
-              ]
-            }}
-          ],
-          "constraints": {{
-            "budget": "string",
-            "travel_style": "string",
-            "transportation": "string",
-            "accommodation": "string"
-          }}
-        }}
-        """
+        prompt = self.build_prompt(user_request)
+        if on_field is not None:
+            raw = route_gemini_stream("planner", prompt, system=PLANNER_INSTRUCTIONS, on_field=on_field)
+        else:
+            raw = route_gemini("planner", prompt, system=PLANNER_INSTRUCTIONS)
+        return self.parse_plan(raw)
 
-        raw = ask_gemini(prompt)
+    def build_prompt(self, user_request: str) -> str:
+        """The request-specific part of the planner prompt (see PLANNER_INSTRUCTIONS)."""
+        return PLANNER_PROMPT.render(user_request=user_request)
+
+    def parse_plan(self, raw: str) -> dict:
         data = cleanup_json(raw)
         # If parsing failed, still wrap in dict
         if not isinstance(data, dict):
@@ -55,147 +240,72 @@ class TripPlannerAgent:
         return data
 
 
-class BookingAgent:
-    def suggest_bookings(self, trip_plan: dict) -> dict:
-        """
-        Uses:
-        - LLM for hotel/activity ideas
-        - Amadeus API for real flights
-        - Date parser for dynamic departure/return dates
-        """
-
-        # Extract original user request for date parsing
-        user_request_text = trip_plan.get("user_request", "")
-
-        # 1. Parse dates
-        depart_date, return_date = extract_dates_from_text(user_request_text)
-
-        # 2. Identify cities
-        cities = trip_plan.get("city", [])
-        flights = []
-        hotels = []
-        activities = []
-
-        # LLM for hotel/activity content (you already have this)
-        llm_prompt = f"""
-        You are the Booking Agent. Based on this trip plan:
-        {trip_plan}
-
-        Return JSON:
-        {{
-            "hotels": [...],
-            "activities": [...]
-        }}
-        """
-        raw = ask_gemini(llm_prompt)
-        parsed = cleanup_json(raw)
-
-        if isinstance(parsed, dict):
-            hotels = parsed.get("hotels", [])
-            activities = parsed.get("activities", [])
-
-        # 3. Flight search: first→last city
-        if len(cities) >= 2:
-            origin_city = cities[0]
-            dest_city = cities[-1]
-
-            origin_iata = city_to_iata(origin_city)
-            dest_iata = city_to_iata(dest_city)
-
-            if origin_iata and dest_iata:
-                flights = search_flight_offers(
-                    origin=origin_iata,
-                    destination=dest_iata,
-                    departDate=depart_date,
-                    returnDate=return_date,
-                    adults=1,
-                    maxResults=5
-                )
-            else:
-                flights = [{
-                    "error": "Could not map city to IATA",
-                    "origin_city": origin_city,
-                    "dest_city": dest_city,
-                    "origin_iata": origin_iata,
-                    "dest_iata": dest_iata
-                }]
-        else:
-            flights = [{"error": "Not enough cities for flight search"}]
-
-        return {
-            "depart_date": depart_date,
-            "return_date": return_date,
-            "flights": flights,
-            "hotels": hotels,
-            "activities": activities
-        }
-
-
 class SafetyAgent:
-    def check_safety(self, trip_plan: dict) -> dict:
+    def check_safety(self, trip_plan: dict, depart_date: str = None, return_date: str = None) -> dict:
         """
         Combines:
-        - Real weather data (OpenWeather)
+        - Weather for the travel dates (OpenWeather forecast / climate normals)
         - Country profile data (REST Countries)
-        - Gemini safety reasoning
+        - Advisory levels and seasonal hazards from the local risk table
+        - Gemini safety reasoning over a compact context built from those,
+          only when a rule flags elevated risk or the user asks about safety
+        Dates default to the ones in the user request.
         """
+        weather_data, country_profiles = self.gather_data(trip_plan, depart_date, return_date)
+        context = safety_context(weather_data, country_profiles)
 
+        # 4) Low-risk trips get the rule-based report without an LLM call
+        report = fast_assessment(context, trip_plan.get("user_request", ""))
+        if report is not None:
+            return self.finalize(report, weather_data, country_profiles)
+
+        # 5) Ask Gemini to reason about risks
+        prompt = SAFETY_PROMPT.render(trip_plan=trip_plan, safety_context=context)
+
+        try:
+            raw = route_gemini("safety", prompt, system=SAFETY_INSTRUCTIONS)
+        except Unavailable as e:
+            # Degrade: return the real data without the LLM's risk assessment
+            raw = f"Safety reasoning skipped: {e}"
+        return self.finalize(cleanup_json(raw), weather_data, country_profiles)
+
+    def gather_data(self, trip_plan: dict, depart_date: str = None, return_date: str = None):
+        """(weather_data, country_profiles), one entry per planned city."""
         # 1) Get cities from trip plan
         cities = trip_plan.get("city") or []
+        if not (depart_date and return_date):
+            depart_date, return_date = BookingAgent().travel_dates(trip_plan)
 
-        # 2) Real-time weather data
-        weather_data = [get_weather(city) for city in cities]
-
-        # Map city to country code
-        city_to_country = {
-            "Paris": "FR",
-            "Brussels": "BE",
-            "Amsterdam": "NL",
-            "Berlin": "DE",
-            "Kyoto": "JP"
-        }
+        # Map city to country code (gazetteer first)
+        city_to_country = dict(CITY_TO_COUNTRY)
+        for city in cities:
+            info = city_info(city)
+            if info:
+                city_to_country[city] = info["country"]
+
+        # 2) Weather for each city's dates and country profiles, fetched for
+        #    all cities at once (each lookup is bounded by the request
+        #    deadline and its upstream's circuit breaker)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            weather_future = submit_in_context(pool, trip_weather, trip_plan, depart_date, return_date)
+            country_futures = {
+                city: submit_in_context(pool, get_country_info, city_to_country[city])
+                for city in cities if city in city_to_country
+            }
+            weather_data = weather_future.result()
 
         # 3) Country info data
         country_profiles = []
         for city in cities:
-            code = city_to_country.get(city)
-            if code:
-                country_profiles.append(get_country_info(code))
+            if city in country_futures:
+                country_profiles.append(country_futures[city].result())
             else:
                 country_profiles.append({"city": city, "error": "no country mapping"})
 
-        # 4) Ask Gemini to reason about risks
-        prompt = f"""
-        You are the Safety and Compliance Agent.
-
-        TRIP PLAN:
-        {trip_plan}
-
-        REAL WEATHER DATA:
-        {weather_data}
-
-        COUNTRY PROFILES:
-        {country_profiles}
-
-        Based on all this information, return STRICT JSON:
-
-        {{
-          "overall_risk": "Low | Moderate | High",
-          "city_safety_notes": [
-            {{
-              "city": "string",
-              "weather_risk": "string",
-              "country_risk": "string",
-              "guidelines": ["string", "string"]
-            }}
-          ],
-          "general_recommendations": ["string", "string"]
-        }}
-        """
-
-        raw = ask_gemini(prompt)
-        data = cleanup_json(raw)
+        return weather_data, country_profiles
 
+    def finalize(self, data, weather_data: list, country_profiles: list) -> dict:
+        """Shape the LLM's safety answer and attach the real data."""
         # ensure robustness
         if not isinstance(data, dict):
             return {
@@ -215,20 +325,29 @@ class SafetyAgent:
 class BudgetAgent:
     """
     Estimate trip costs and compare to user budget.
+    Numbers come from the local cost model in budget_engine; Gemini is only
+    used (optionally) to phrase the adjustment suggestions.
     Returns a structured dict:
     {
       "estimated_total": {
-         "accommodation": "...",
-         "transportation": "...",
-         "food": "...",
-         "activities": "...",
-         "total_estimate": "..."
+         "accommodation": 420.0,
+         "transportation": 310.5,
+         "food": 300.0,
+         "activities": 200.0,
+         "total_estimate": 1230.5
       },
+      "currency": "USD",
+      "budget": 1000.0,
       "within_budget": "yes"|"no"|"unknown",
+      "unpriced": [],              # components whose price couldn't be converted
+      "over_budget_by": 230.5,
       "adjustments": ["..."]
     }
     """
 
+    def __init__(self, phrase_with_llm: bool = False):
+        self.phrase_with_llm = phrase_with_llm
+
     def check_budget(self, trip_plan: dict, bookings: dict, budget: float) -> dict:
         # Defensive defaults
         if not isinstance(trip_plan, dict):
@@ -236,65 +355,35 @@ class BudgetAgent:
         if not isinstance(bookings, dict):
             bookings = {}
 
-        prompt = f"""
-        You are the Budget Agent in a travel assistant system.
-
-        Trip plan (structured):
-        {trip_plan}
-
-        Booking suggestions (flights/hotels/activities):
-        {bookings}
-
-        User budget (USD): {budget}
-
-        Tasks:
-        - Provide an estimated cost breakdown for accommodation, transportation, food, and activities.
-        - Provide a total estimate.
-        - Indicate whether the total is within the user's budget ("yes" or "no").
-        - Suggest 2-3 practical adjustments to fit budget if it's over.
-
-        Respond STRICTLY in valid JSON with the following keys:
-        {{
-          "estimated_total": {{
-            "accommodation": "string",
-            "transportation": "string",
-            "food": "string",
-            "activities": "string",
-            "total_estimate": "string"
-          }},
-          "within_budget": "yes" or "no" or "unknown",
-          "adjustments": ["string", "string"]
-        }}
-        """
+        result = estimate_trip_cost(trip_plan, bookings, budget)
 
-        raw = ask_gemini(prompt)
-        parsed = cleanup_json(raw)
+        if self.phrase_with_llm and result["within_budget"] == "no":
+            result["adjustments"] = self._phrase_adjustments(trip_plan, result) or result["adjustments"]
 
-        # If parsed JSON is not dict, return safe fallback
-        if not isinstance(parsed, dict):
-            return {
-                "estimated_total": {"total_estimate": str(parsed)},
-                "within_budget": "unknown",
-                "adjustments": []
-            }
-
-        # Ensure keys exist
-        estimated = parsed.get("estimated_total", {})
-        within = parsed.get("within_budget", "unknown")
-        adjustments = parsed.get("adjustments", [])
+        return result
 
-        return {
-            "estimated_total": estimated,
-            "within_budget": within,
-            "adjustments": adjustments
-        }   
+    def _phrase_adjustments(self, trip_plan: dict, result: dict) -> list:
+        prompt = BUDGET_PROMPT.render(
+            summary=trip_plan.get("summary", ""),
+            cities=trip_plan.get("city", []),
+            currency=result["currency"],
+            breakdown=result["estimated_total"],
+            budget=result["budget"],
+            over_by=result["over_budget_by"],
+        )
+        parsed = cleanup_json(route_gemini("budget", prompt, system=BUDGET_INSTRUCTIONS))
+        if isinstance(parsed, dict) and isinstance(parsed.get("adjustments"), list):
+            return parsed["adjustments"]
+        return []
 
 
-def _safe_call_amadeus(origin_iata: str, dest_iata: str, depart_date: str, return_date: str = None):
+def _safe_call_amadeus(origin_iata: str, dest_iata: str, depart_date: str, return_date: str = None,
+                       preferences: dict = None, top_k: int = 5):
     """
-    Validate and sanitize dates, then call Amadeus search_flight_offers.
+    Validate and sanitize dates, then query the flight offer store (one
+    large Amadeus page per route and dates, filtered and ranked locally).
     Returns either:
-      - list of offers (as returned by search_flight_offers)
+      - list of the top_k offers for `preferences` (see flight_ranking)
       - or [{'error': '...'}] on validation or API error
     """
     # Validate depart_date format
@@ -337,15 +426,16 @@ def _safe_call_amadeus(origin_iata: str, dest_iata: str, depart_date: str, retur
     if not origin_iata or not dest_iata:
         return [{"error": "Missing IATA codes for origin or destination", "origin_iata": origin_iata, "dest_iata": dest_iata}]
 
-    # Call Amadeus (wrapped in try/except by search_flight_offers)
+    # Call Amadeus (wrapped in try/except by fetch_flight_offers)
     try:
-        offers = search_flight_offers(
-            origin=origin_iata,
-            destination=dest_iata,
-            departDate=d_dt.strftime("%Y-%m-%d"),
-            returnDate=r_dt.strftime("%Y-%m-%d"),
+        offers = find_offers(
+            origin_iata,
+            dest_iata,
+            d_dt.strftime("%Y-%m-%d"),
+            r_dt.strftime("%Y-%m-%d"),
             adults=1,
-            maxResults=5
+            preferences=preferences,
+            top_k=top_k
         )
         return offers
     except Exception as e:
@@ -365,71 +455,30 @@ class BookingAgent:
         if not isinstance(trip_plan, dict):
             trip_plan = {"summary": str(trip_plan)}
 
-        # 1. Extract original user request text (coordinator should have inserted it)
-        user_request_text = trip_plan.get("user_request", "") or str(trip_plan.get("summary", ""))
-
-        # 2. Parse dates (depart_date, return_date)
-        depart_date, return_date = extract_dates_from_text(user_request_text)
+        # 1-2. Parse dates (depart_date, return_date) from the original user request
+        depart_date, return_date, calendar = self.choose_dates(trip_plan)
 
         # 3. Ask Gemini for hotels + activities (LLM)
-        llm_prompt = f"""
-        You are the Booking Agent. Based on this trip plan:
-        {trip_plan}
-
-        Return STRICT JSON with:
-        {{
-          "hotels": [
-            {{
-              "city": "string",
-              "hotel": "string",
-              "approx_price_per_night": number
-            }}
-          ],
-          "activities": [
-            {{
-              "day": number,
-              "city": "string",
-              "activities": ["string", "string"]
-            }}
-          ]
-        }}
-        """
-        llm_raw = ask_gemini(llm_prompt)
+        llm_prompt = BOOKING_PROMPT.render(trip_plan=trip_plan)
+        try:
+            llm_raw = route_gemini("booking", llm_prompt, system=BOOKING_INSTRUCTIONS)
+        except Unavailable:
+            # Degrade: flights and hotel offers still come from Amadeus
+            llm_raw = ""
         llm_parsed = cleanup_json(llm_raw)
         hotels = llm_parsed.get("hotels", []) if isinstance(llm_parsed, dict) else []
         activities = llm_parsed.get("activities", []) if isinstance(llm_parsed, dict) else []
 
         # 4. Flights: map first -> last city to IATA and call Amadeus safely
-        cities = trip_plan.get("city") or trip_plan.get("cities") or []
-        flights = []
-
-        if isinstance(cities, list) and len(cities) >= 2:
-            origin_city = cities[0]
-            dest_city = cities[-1]
-
-            origin_iata = city_to_iata(origin_city)
-            dest_iata = city_to_iata(dest_city)
-
-            # Use the safe wrapper which validates dates and fixes obvious issues
-            flights = _safe_call_amadeus(origin_iata, dest_iata, depart_date, return_date)
-        else:
-            flights = [{"error": "Not enough cities to perform flight search", "cities": cities}]
+        flights = self.search_flights(trip_plan, depart_date, return_date)
 
         # 5. Optionally include hotel offers if check-in/out dates parsed
         hotel_offers = []
-        try:
-            # if dates are available and hotels are requested, try hotel offers
-            if depart_date and return_date and hotels:
-                # Try map first hotel's city to IATA/city code (Amadeus expects city codes)
-                first_hotel = hotels[0]
-                city_name = first_hotel.get("city") if isinstance(first_hotel, dict) else None
-                if city_name:
-                    city_code = city_to_iata(city_name)
-                    if city_code:
-                        hotel_offers = search_hotel_offers(city_code, depart_date, return_date, adults=1, max_results=3)
-        except Exception:
-            # Non-fatal — keep proceeding
-            hotel_offers = [{"error": "Hotel offers lookup failed"}]
+        if hotels:
+            # Try map first hotel's city to IATA/city code (Amadeus expects city codes)
+            first_hotel = hotels[0]
+            city_name = first_hotel.get("city") if isinstance(first_hotel, dict) else None
+            hotel_offers = self.search_hotel_offers(city_name, depart_date, return_date)
 
         return {
             "depart_date": depart_date,
@@ -437,6 +486,119 @@ class BookingAgent:
             "flights": flights,
             "hotels": hotels,
             "hotel_offers": hotel_offers,
-            "activities": activities
+            "activities": activities,
+            "fare_calendar": calendar,
+            "transport": self.route_transport(trip_plan)
         }
 
+    def travel_dates(self, trip_plan: dict):
+        """(depart_date, return_date) parsed from the original user request."""
+        user_request_text = trip_plan.get("user_request", "") or str(trip_plan.get("summary", ""))
+        return extract_dates_from_text(user_request_text)
+
+    def choose_dates(self, trip_plan: dict):
+        """
+        (depart_date, return_date, fare_calendar). For flexible requests
+        ('sometime in March, 7 days') the dates are the cheapest window of
+        the fare calendar, or its first days when no flight search will be
+        made (see route_transport); otherwise they are travel_dates(). The
+        calendar is None unless one was built.
+        """
+        window = flexible_window_from_text(trip_plan.get("user_request", ""))
+        cities = trip_plan.get("city") or trip_plan.get("cities") or []
+        if window and isinstance(cities, list) and len(cities) >= 2:
+            route = self.route_transport(trip_plan)
+            if route and not route["search_flights"]:
+                # Ground legs only: no fares to compare, so skip the fare grid
+                start = datetime.strptime(window["earliest"], "%Y-%m-%d")
+                return window["earliest"], (start + timedelta(days=window["length_days"])).strftime("%Y-%m-%d"), None
+            origin_iata = city_to_iata(cities[0])
+            dest_iata = city_to_iata(cities[-1])
+            if origin_iata and dest_iata:
+                calendar = fare_calendar(origin_iata, dest_iata, window["earliest"], window["latest"],
+                                         window["length_days"])
+                cheapest = calendar["cheapest"]
+                if cheapest:
+                    return cheapest["depart_date"], cheapest["return_date"], calendar
+        depart_date, return_date = self.travel_dates(trip_plan)
+        return depart_date, return_date, None
+
+    def search_flights(self, trip_plan: dict, depart_date: str, return_date: str) -> list:
+        """
+        Amadeus flight offers for the first -> last city of the plan, ranked
+        locally against the preferences in the request (best FLIGHT_TOP_K only).
+        Empty when every leg of the route is short enough for rail/bus/car
+        (see route_transport).
+        """
+        cities = trip_plan.get("city") or trip_plan.get("cities") or []
+
+        if isinstance(cities, list) and len(cities) >= 2:
+            route = self.route_transport(trip_plan)
+            if route and not route["search_flights"]:
+                FLIGHT_SEARCHES_SKIPPED.inc()
+                return []
+            origin_iata = city_to_iata(cities[0])
+            dest_iata = city_to_iata(cities[-1])
+
+            # Use the safe wrapper which validates dates and fixes obvious issues
+            preferences = preferences_from_text(trip_plan.get("user_request", ""))
+            return _safe_call_amadeus(origin_iata, dest_iata, depart_date, return_date,
+                                      preferences=preferences, top_k=FLIGHT_TOP_K)
+        return [{"error": "Not enough cities to perform flight search", "cities": cities}]
+
+    def route_transport(self, trip_plan: dict):
+        """
+        Local transport estimate for every leg of the trip, in plan (route)
+        order and back to the first city (see transport.estimate_route), or None.
+        """
+        cities = trip_plan.get("city") or trip_plan.get("cities") or []
+        return estimate_route(cities)
+
+    def search_hotel_offers(self, city_name: str, depart_date: str, return_date: str) -> list:
+        """Real Amadeus hotel offers for one city (empty list if not possible)."""
+        try:
+            if depart_date and return_date and city_name:
+                city_code = city_to_iata(city_name)
+                if city_code:
+                    offers = search_hotel_offers(city_code, depart_date, return_date, adults=1, max_results=3)
+                    # Tag the offers so the budget prices each city's nights separately
+                    return [dict(o, city=city_name) if not o.get("error") else o for o in offers]
+        except Exception:
+            # Non-fatal — keep proceeding
+            return [{"error": "Hotel offers lookup failed"}]
+        return []
+
+
+
+class FusedAnalysisAgent:
+    """
+    One Gemini call that does the Booking, Safety and Budget agents' LLM work
+    together, over a single shared context (plan + tool data + cost estimate).
+    """
+
+    def analyze(self, trip_plan: dict, tool_data: dict, cost_estimate: dict) -> dict:
+        plan_context = {k: v for k, v in trip_plan.items() if k != "user_request"}
+        prompt = FUSED_PROMPT.render(
+            trip_plan=plan_context,
+            user_request=trip_plan.get("user_request", ""),
+            # the raw Amadeus offer is bulky and adds nothing the model needs
+            flights=[{k: v for k, v in f.items() if k != "raw"} if isinstance(f, dict) else f
+                     for f in tool_data.get("flights", [])[:3]],
+            hotel_offers=tool_data.get("hotel_offers", []),
+            safety_context=safety_context(tool_data.get("weather_data", []), tool_data.get("country_profiles", [])),
+            estimate={
+                "estimated_total": cost_estimate.get("estimated_total"),
+                "budget": cost_estimate.get("budget"),
+                "within_budget": cost_estimate.get("within_budget"),
+                "unpriced": cost_estimate.get("unpriced"),
+            },
+        )
+
+        try:
+            raw = route_gemini("fused", prompt, system=FUSED_INSTRUCTIONS)
+        except Unavailable as e:
+            raw = f"Fused analysis skipped: {e}"
+        parsed = cleanup_json(raw)
+        if not isinstance(parsed, dict):
+            return {"bookings": {}, "safety": str(parsed), "budget": {}}
+        return parsed
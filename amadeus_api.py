@@ -1,9 +1,17 @@
 # amadeus_api.py  (merged, improved, beginner-friendly)
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from dotenv import load_dotenv
 
+import shared_cache
+from cache_utils import ttl_cache
+from rate_limiter import AMADEUS_LIMITER, parse_retry_after
+from resilience import guarded_request, remaining
+from telemetry import span
+from utils import submit_in_context
+
 load_dotenv()
 
 CLIENT_ID = os.getenv("AMADEUS_CLIENT_ID")
@@ -14,17 +22,49 @@ if not CLIENT_ID or not CLIENT_SECRET:
 # Endpoints (test environment)
 TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
 FLIGHT_OFFERS_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+FLIGHT_DATES_URL = "https://test.api.amadeus.com/v1/shopping/flight-dates"
 LOCATION_SEARCH_URL = "https://test.api.amadeus.com/v1/reference-data/locations"
 HOTEL_BY_CITY_URL = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-city"
 HOTEL_OFFERS_URL = "https://test.api.amadeus.com/v3/shopping/hotel-offers"
 
 # Simple in-memory token cache (for demo)
 _token_cache = {"access_token": None, "expires_at": 0}
+# The token is also kept in the shared cache tier, so all worker processes use one token
+TOKEN_SHARED_KEY = "amadeus_api.access_token"
+
+# Hotel lists per city change rarely, so keep them for a day
+HOTEL_LIST_TTL = 24 * 60 * 60
+
+# hotel-offers accepts a limited number of hotelIds per call
+HOTEL_IDS_PER_CALL = 20
+HOTEL_OFFER_WORKERS = 2
+
+# How often a 429 is retried (after the limiter's backoff) before giving up
+MAX_THROTTLE_RETRIES = 2
+
+
+def _request(method: str, url: str, endpoint: str, **kwargs):
+    """
+    Every Amadeus HTTP call goes through here so it is rate limited to the
+    TPS quota, traced, guarded by the circuit breaker and request deadline,
+    and backs off (then retries) on 429.
+    """
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        AMADEUS_LIMITER.acquire(timeout=remaining())
+        with span("tool", f"amadeus.{endpoint}"):
+            resp = guarded_request("amadeus", method, url, **kwargs)
+        if resp.status_code != 429:
+            AMADEUS_LIMITER.report_success()
+            return resp
+        AMADEUS_LIMITER.report_throttled(parse_retry_after(getattr(resp, "headers", {}).get("Retry-After")))
+    return resp
 
 
 def _get_new_token():
-    resp = requests.post(
+    resp = _request(
+        "POST",
         TOKEN_URL,
+        "token",
         headers={"Content-Type": "application/x-www-form-urlencoded"},
         data={
             "grant_type": "client_credentials",
@@ -40,31 +80,47 @@ def _get_new_token():
     expires_in = data.get("expires_in", 1800)
     _token_cache["access_token"] = token
     _token_cache["expires_at"] = time.time() + expires_in - 60  # refresh 60s before expiry
+    shared_cache.put(TOKEN_SHARED_KEY, token, expires_in - 60)
     return token
 
 
 def get_access_token():
     """
     Return a cached token if valid, otherwise request a new one.
+    Across processes, only the holder of the refresh lease asks Amadeus for
+    a token; the others wait for it in the shared cache (at most until the
+    request deadline, see shared_cache.wait_for).
     """
     if _token_cache["access_token"] and time.time() < _token_cache["expires_at"]:
         return _token_cache["access_token"]
-    return _get_new_token()
+
+    entry = shared_cache.get(TOKEN_SHARED_KEY)
+    if not (entry and time.time() < entry[0]):
+        with shared_cache.lease(TOKEN_SHARED_KEY, ttl=20) as leader:
+            if leader:
+                return _get_new_token()
+            entry = shared_cache.wait_for(TOKEN_SHARED_KEY, timeout=20)
+        if not entry:
+            return _get_new_token()
+    _token_cache["access_token"] = entry[2]
+    _token_cache["expires_at"] = entry[0]
+    return entry[2]
 
 
+@ttl_cache(7 * 24 * 60 * 60, stale_ttl=30 * 24 * 60 * 60)
 def city_to_iata(city_name: str, country_code: str = None):
     """
     Use Amadeus Reference Data Locations endpoint to find a CITY or AIRPORT iataCode.
     Returns e.g. 'PAR' or 'CDG' or None.
     """
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
     params = {"keyword": city_name, "subType": "CITY", "page[limit]": 10}
     if country_code:
         params["countryCode"] = country_code
 
     try:
-        resp = requests.get(LOCATION_SEARCH_URL, headers=headers, params=params, timeout=10)
+        token = get_access_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = _request("GET", LOCATION_SEARCH_URL, "locations", headers=headers, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json().get("data", [])
         for item in data:
@@ -73,7 +129,7 @@ def city_to_iata(city_name: str, country_code: str = None):
                 return iata
         # fallback to AIRPORT subtype
         params["subType"] = "AIRPORT"
-        resp = requests.get(LOCATION_SEARCH_URL, headers=headers, params=params, timeout=10)
+        resp = _request("GET", LOCATION_SEARCH_URL, "locations", headers=headers, params=params, timeout=10)
         resp.raise_for_status()
         for item in resp.json().get("data", []):
             iata = item.get("iataCode")
@@ -85,14 +141,13 @@ def city_to_iata(city_name: str, country_code: str = None):
     return None
 
 
-def search_flight_offers(origin: str, destination: str, departDate: str, returnDate: str = None, adults: int = 1, maxResults: int = 5):
+def fetch_flight_offers(origin: str, destination: str, departDate: str, returnDate: str = None, adults: int = 1, maxResults: int = 5):
     """
-    Simple wrapper around Amadeus Flight Offers search (test endpoint).
+    Amadeus Flight Offers search (test endpoint), uncached: offer_store
+    caches a compact form of the page itself.
     origin/destination: IATA codes like 'PAR', 'BER'
     departDate / returnDate: 'YYYY-MM-DD'
     """
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
     params = {
         "originLocationCode": origin,
         "destinationLocationCode": destination,
@@ -104,7 +159,9 @@ def search_flight_offers(origin: str, destination: str, departDate: str, returnD
         params["returnDate"] = returnDate
 
     try:
-        resp = requests.get(FLIGHT_OFFERS_URL, headers=headers, params=params, timeout=20)
+        token = get_access_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = _request("GET", FLIGHT_OFFERS_URL, "flight-offers", headers=headers, params=params, timeout=20)
         resp.raise_for_status()
         data = resp.json()
         offers = data.get("data", [])
@@ -114,6 +171,7 @@ def search_flight_offers(origin: str, destination: str, departDate: str, returnD
             itineraries = offer.get("itineraries", [])
             result.append({
                 "price": price,
+                "currency": offer.get("price", {}).get("currency"),
                 "itineraries": itineraries,
                 "raw": offer
             })
@@ -128,17 +186,56 @@ def search_flight_offers(origin: str, destination: str, departDate: str, returnD
         return [{"error": str(e)}]
 
 
+@ttl_cache(6 * 60 * 60, stale_ttl=24 * 60 * 60)
+def search_flight_dates(origin: str, destination: str, earliest: str, latest: str, min_days: int, max_days: int):
+    """
+    Cheapest round-trip fare per date pair from Amadeus Flight Cheapest Date
+    Search, for departures in [earliest, latest] and stays of min_days..max_days.
+    The endpoint serves cached prices for a limited set of routes only.
+    Returns [{"depart_date", "return_date", "price", "currency"}, ...] or [{'error': ...}].
+    """
+    params = {
+        "origin": origin,
+        "destination": destination,
+        "departureDate": f"{earliest},{latest}",
+        "oneWay": "false",
+        "duration": f"{min_days},{max_days}",
+        "viewBy": "DATE",
+    }
+
+    try:
+        token = get_access_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = _request("GET", FLIGHT_DATES_URL, "flight-dates", headers=headers, params=params, timeout=20)
+        resp.raise_for_status()
+        data = resp.json()
+        currency = (data.get("meta") or {}).get("currency")
+        return [{
+            "depart_date": item.get("departureDate"),
+            "return_date": item.get("returnDate"),
+            "price": (item.get("price") or {}).get("total"),
+            "currency": currency,
+        } for item in data.get("data", [])]
+    except requests.HTTPError as e:
+        try:
+            return [{"error": f"HTTPError: {e.response.status_code} {e.response.text}"}]
+        except Exception:
+            return [{"error": str(e)}]
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
 def search_hotels_by_city(city_code: str, radius: int = 5):
     """
     Get hotels around a city using Amadeus Hotel List (reference data).
     city_code example: 'PAR' for Paris
     """
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
     params = {"cityCode": city_code, "radius": radius, "radiusUnit": "KM"}
 
     try:
-        resp = requests.get(HOTEL_BY_CITY_URL, headers=headers, params=params, timeout=15)
+        token = get_access_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = _request("GET", HOTEL_BY_CITY_URL, "hotels-by-city", headers=headers, params=params, timeout=15)
         resp.raise_for_status()
         data = resp.json()
         hotels = []
@@ -154,32 +251,74 @@ def search_hotels_by_city(city_code: str, radius: int = 5):
         return [{"error": str(e)}]
 
 
-def search_hotel_offers(city_code: str, check_in: str, check_out: str, adults: int = 1, max_results: int = 5):
+def get_city_hotel_ids(city_code: str, radius: int = 5):
     """
-    Hotel offers using Amadeus /v3/shopping/hotel-offers
-    check_in/check_out format: 'YYYY-MM-DD'
+    Return the hotelIds around a city, cached per (city, radius) for HOTEL_LIST_TTL.
+    Failed lookups are not cached so the next request can retry.
+    """
+    return _city_hotel_ids(city_code.upper(), radius) or []
+
+
+@ttl_cache(HOTEL_LIST_TTL)
+def _city_hotel_ids(city_code: str, radius: int):
+    hotels = search_hotels_by_city(city_code, radius=radius)
+    # None (not an empty list) so that a failed or empty lookup isn't cached
+    return [h["hotelId"] for h in hotels if h.get("hotelId")] or None
+
+
+def search_hotel_offers_by_ids(hotel_ids: list, check_in: str, check_out: str, adults: int = 1, max_results: int = 5):
+    """
+    Hotel offers using Amadeus /v3/shopping/hotel-offers with a list of hotelIds.
+    Ids are sent in chunks of HOTEL_IDS_PER_CALL, a few chunks at a time, and we stop
+    as soon as max_results priced offers have been collected.
+    """
+    chunks = [hotel_ids[i:i + HOTEL_IDS_PER_CALL] for i in range(0, len(hotel_ids), HOTEL_IDS_PER_CALL)]
+    offers_result = []
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=HOTEL_OFFER_WORKERS) as pool:
+        for start in range(0, len(chunks), HOTEL_OFFER_WORKERS):
+            wave = chunks[start:start + HOTEL_OFFER_WORKERS]
+            futures = [submit_in_context(pool, _fetch_hotel_offers, ids, check_in, check_out, adults) for ids in wave]
+            for offers in (f.result() for f in futures):
+                for offer in offers:
+                    if offer.get("error"):
+                        errors.append(offer)
+                    elif offer.get("price") is not None:
+                        offers_result.append(offer)
+            if len(offers_result) >= max_results:
+                break
+
+    if not offers_result and errors:
+        return errors[:1]
+    return offers_result[:max_results]
+
+
+def _fetch_hotel_offers(hotel_ids: list, check_in: str, check_out: str, adults: int = 1):
+    """
+    One hotel-offers call for a single chunk of hotelIds.
     """
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
     params = {
-        "cityCode": city_code,
+        "hotelIds": ",".join(hotel_ids),
         "checkInDate": check_in,
         "checkOutDate": check_out,
         "adults": adults,
         "roomQuantity": 1,
-        "bestRateOnly": False
+        "bestRateOnly": "true"
     }
 
     try:
-        resp = requests.get(HOTEL_OFFERS_URL, headers=headers, params=params, timeout=20)
+        token = get_access_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = _request("GET", HOTEL_OFFERS_URL, "hotel-offers", headers=headers, params=params, timeout=20)
         resp.raise_for_status()
         data = resp.json()
         offers_result = []
         for hotel in data.get("data", []):
             hotel_info = hotel.get("hotel", {})
-            hotel_offers = hotel.get("offers", [])
-            for offer in hotel_offers[:max_results]:
+            for offer in hotel.get("offers", []):
                 offers_result.append({
+                    "hotel_id": hotel_info.get("hotelId"),
                     "hotel_name": hotel_info.get("name"),
                     "rating": hotel_info.get("rating"),
                     "address": hotel_info.get("address", {}).get("lines", []),
@@ -189,5 +328,23 @@ def search_hotel_offers(city_code: str, check_in: str, check_out: str, adults: i
                     "check_out": offer.get("checkOutDate")
                 })
         return offers_result
+    except requests.HTTPError as e:
+        try:
+            return [{"error": f"HTTPError: {e.response.status_code} {e.response.text}"}]
+        except Exception:
+            return [{"error": str(e)}]
     except Exception as e:
         return [{"error": str(e)}]
+
+
+def search_hotel_offers(city_code: str, check_in: str, check_out: str, adults: int = 1, max_results: int = 5):
+    """
+    Hotel offers for a city in two steps:
+      1. cached hotelId list for the city (search_hotels_by_city)
+      2. batched /v3/shopping/hotel-offers lookups by hotelIds
+    check_in/check_out format: 'YYYY-MM-DD'
+    """
+    hotel_ids = get_city_hotel_ids(city_code)
+    if not hotel_ids:
+        return [{"error": f"No hotels found for city code {city_code}"}]
+    return search_hotel_offers_by_ids(hotel_ids, check_in, check_out, adults=adults, max_results=max_results)
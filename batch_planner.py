@@ -0,0 +1,120 @@
+"""
+Plan many trips in one go.
+
+Input is JSONL, one request per line:
+    {"id": "t1", "user_id": "agency_42", "request": "5 days in Kyoto", "budget": 900}
+An optional "mode" ("sequential" or "fused") selects the pipeline mode.
+
+Usage:
+    python batch_planner.py trips.jsonl -o results.jsonl --workers 4 [--gemini-batch]
+"""
+import argparse
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agent_client import ask_gemini_batch
+from agents import PLANNER_INSTRUCTIONS
+from coordinator import TravelBuddyCoordinator
+from model_router import models_for
+from rate_limiter import BATCH, priority_scope
+
+DEFAULT_WORKERS = 4
+# Upper bound for `workers` (each one is a full pipeline with its own thread pools)
+MAX_WORKERS = 16
+
+
+def parse_jsonl(lines) -> list:
+    """Parse JSONL lines into request dicts; bad lines become error entries."""
+    items = []
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            items.append({"id": f"line-{line_no}", "error": f"Invalid JSON: {e}"})
+            continue
+        if not isinstance(item, dict) or not item.get("request"):
+            items.append({"id": f"line-{line_no}", "error": "Missing 'request' field"})
+            continue
+        item.setdefault("id", f"line-{line_no}")
+        items.append(item)
+    return items
+
+
+def _plan_one(item: dict, trip_plan: dict = None) -> dict:
+    coordinator = TravelBuddyCoordinator(user_id=item.get("user_id", "default_user"))
+    try:
+        # Batch work yields upstream quota to interactive /plan_trip requests
+        with priority_scope(BATCH):
+            result = coordinator.handle_request(item["request"], item.get("budget", 1000.0), trip_plan=trip_plan,
+                                                mode=item.get("mode", "sequential"))
+        return {"id": item["id"], "result": result}
+    except Exception as e:
+        logging.exception(f"Batch item {item['id']} failed")
+        return {"id": item["id"], "error": str(e)}
+
+
+def _batched_trip_plans(items: list) -> list:
+    """Run every planner prompt as a single Gemini batch job."""
+    prompts = []
+    for item in items:
+        coordinator = TravelBuddyCoordinator(user_id=item.get("user_id", "default_user"))
+        prompts.append(coordinator.planner.build_prompt(coordinator.enrich_request(item["request"])))
+    planner = TravelBuddyCoordinator().planner
+    return [planner.parse_plan(raw) for raw in ask_gemini_batch(prompts, model=models_for("planner")[0],
+                                                                system=PLANNER_INSTRUCTIONS)]
+
+
+def plan_batch(items: list, workers: int = DEFAULT_WORKERS, gemini_batch: bool = False):
+    """
+    Plan a list of trip requests with at most `workers` running at once.
+    Yields {"id": ..., "result": ...} or {"id": ..., "error": ...} as each finishes.
+    Shared lookups (IATA codes, weather, country info, flight searches) are
+    deduplicated across the batch by the tool caches.
+    """
+    valid = [item for item in items if "error" not in item]
+    for item in items:
+        if "error" in item:
+            yield item
+
+    trip_plans = _batched_trip_plans(valid) if gemini_batch and valid else [None] * len(valid)
+
+    with ThreadPoolExecutor(max_workers=min(max(1, workers), MAX_WORKERS)) as pool:
+        futures = [pool.submit(_plan_one, item, plan) for item, plan in zip(valid, trip_plans)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan a JSONL file of trip requests.")
+    parser.add_argument("input", help="JSONL file with one trip request per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="Write JSONL results here (default: stdout)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Requests planned concurrently")
+    parser.add_argument("--gemini-batch", action="store_true",
+                        help="Submit all planner prompts as one Gemini batch job")
+    args = parser.parse_args(argv)
+
+    if args.input == "-":
+        items = parse_jsonl(sys.stdin)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            items = parse_jsonl(f)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for record in plan_batch(items, workers=args.workers, gemini_batch=args.gemini_batch):
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Offline benchmark for the TravelBuddy pipeline.
+
+Record a cassette once (needs network + API keys):
+    python benchmark.py --mode record --cassette cassettes/default.json
+
+Replay it as often as needed (no network, no keys):
+    python benchmark.py --cassette cassettes/default.json --latency gemini=900,amadeus=350 --iterations 5
+
+Reports p50/p95/p99 latency per stage and end to end, throughput, peak
+allocations per stage (allocation tracking only runs with --concurrency 1)
+and time spent waiting on the client-side rate limiters.
+
+Replay runs with the rate limiters and Gemini hedging switched off and the
+circuit breakers reset, so the numbers measure the pipeline rather than
+the live quotas or a breaker left open by an earlier run.
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from cassette import Cassette, use_dummy_credentials
+
+DEFAULT_CORPUS = "bench_requests.jsonl"
+DEFAULT_CASSETTE = os.path.join("cassettes", "default.json")
+
+# (stage name, class name in agents.py, method name)
+STAGES = [
+    ("planner", "TripPlannerAgent", "plan_trip"),
+    ("booking", "BookingAgent", "suggest_bookings"),
+    ("safety", "SafetyAgent", "check_safety"),
+    ("budget", "BudgetAgent", "check_budget"),
+    ("fused", "FusedAnalysisAgent", "analyze"),
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+class StageRecorder:
+    """Wraps the agent methods to time them (and measure allocations)."""
+
+    def __init__(self, track_allocations: bool):
+        self.track_allocations = track_allocations
+        self.timings = {name: [] for name, _, _ in STAGES}
+        self.allocations = {name: [] for name, _, _ in STAGES}
+        self._originals = []
+
+    def _wrap(self, stage, func):
+        def wrapper(*args, **kwargs):
+            if self.track_allocations:
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.timings[stage].append(time.perf_counter() - start)
+                if self.track_allocations:
+                    _, peak = tracemalloc.get_traced_memory()
+                    self.allocations[stage].append(peak - before)
+        return wrapper
+
+    def __enter__(self):
+        import agents
+
+        for stage, class_name, method in STAGES:
+            cls = getattr(agents, class_name)
+            original = getattr(cls, method)
+            self._originals.append((cls, method, original))
+            setattr(cls, method, self._wrap(stage, original))
+        if self.track_allocations:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for cls, method, original in self._originals:
+            setattr(cls, method, original)
+        if self.track_allocations:
+            tracemalloc.stop()
+        return False
+
+
+@contextmanager
+def replay_conditions():
+    """No rate limiting, hedging or open breakers while replaying a cassette."""
+    import agent_client
+    from rate_limiter import AMADEUS_LIMITER, GEMINI_LIMITER
+    from resilience import BREAKERS
+
+    limiters = (GEMINI_LIMITER, AMADEUS_LIMITER)
+    hedge = agent_client.GEMINI_HEDGE
+    for breaker in BREAKERS.values():
+        breaker.reset()
+    for limiter in limiters:
+        limiter.enabled = False
+    # Replayed latencies are fixed, so a hedge would only duplicate the call
+    agent_client.GEMINI_HEDGE = False
+    try:
+        yield
+    finally:
+        for limiter in limiters:
+            limiter.enabled = True
+        agent_client.GEMINI_HEDGE = hedge
+
+
+def rate_limit_wait() -> dict:
+    """Total seconds spent waiting for a rate limit slot, per upstream."""
+    from rate_limiter import WAIT_SECONDS
+
+    return {upstream: WAIT_SECONDS.total(upstream=upstream) for upstream in ("gemini", "amadeus")}
+
+
+def _parse_latency(text: str):
+    if not text:
+        return {}
+    if text == "recorded":
+        return "recorded"
+    latency = {}
+    for part in text.split(","):
+        name, _, ms = part.partition("=")
+        latency[name.strip()] = float(ms)
+    return latency
+
+
+def run_benchmark(corpus: list, cassette: Cassette, iterations: int = 1, concurrency: int = 1, cold: bool = True) -> dict:
+    import memory
+    import shared_cache
+    from cache_utils import clear_all_caches
+    from coordinator import TravelBuddyCoordinator
+
+    # Isolated memory file so prompts don't drift between record and replay
+    memory_dir = tempfile.mkdtemp(prefix="tb-bench-")
+    memory.MEMORY_FILE = os.path.join(memory_dir, "user_memory.json")
+    # Nothing may be answered from another process's (or an earlier run's) cache
+    shared_cache.set_backend(None)
+
+    end_to_end = []
+    errors = []
+
+    def run_one(item):
+        if cold:
+            clear_all_caches()
+        if os.path.exists(memory.MEMORY_FILE):
+            os.remove(memory.MEMORY_FILE)
+        coordinator = TravelBuddyCoordinator(user_id=item.get("user_id", "bench_user"))
+        start = time.perf_counter()
+        try:
+            coordinator.handle_request(item["request"], item.get("budget", 1000.0),
+                                       mode=item.get("mode", "sequential"))
+        except Exception as e:
+            errors.append(f"{item.get('id')}: {e}")
+        end_to_end.append(time.perf_counter() - start)
+
+    work = [item for _ in range(iterations) for item in corpus]
+    recorder = StageRecorder(track_allocations=concurrency == 1)
+    conditions = replay_conditions() if cassette.mode == "replay" else nullcontext()
+    waited_before = rate_limit_wait()
+    with cassette, recorder, conditions:
+        wall_start = time.perf_counter()
+        if concurrency == 1:
+            for item in work:
+                run_one(item)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(run_one, work))
+        wall = time.perf_counter() - wall_start
+    waited_after = rate_limit_wait()
+
+    report = {
+        "requests": len(work),
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(work) / wall, 3) if wall else 0.0,
+        "end_to_end": summarize(end_to_end),
+        "stages": {stage: summarize(samples) for stage, samples in recorder.timings.items()},
+        "rate_limit_wait_s": {k: round(waited_after[k] - waited_before[k], 3) for k in waited_after},
+        "cassette": dict(cassette.stats),
+    }
+    if recorder.track_allocations:
+        report["allocations_peak_kb"] = {
+            stage: round(max(values) / 1024, 1) if values else 0.0
+            for stage, values in recorder.allocations.items()
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"requests={report['requests']} errors={report['errors']} concurrency={report['concurrency']} "
+          f"wall={report['wall_s']}s throughput={report['throughput_rps']} req/s")
+    print(f"{'stage':<12}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'alloc KB':>12}")
+    rows = list(report["stages"].items()) + [("end_to_end", report["end_to_end"])]
+    for stage, s in rows:
+        alloc = report.get("allocations_peak_kb", {}).get(stage, "")
+        print(f"{stage:<12}{s['mean_ms']:>10}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{alloc:>12}")
+    print(f"rate limit wait (s): {report['rate_limit_wait_s']}")
+    print(f"cassette: {report['cassette']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TravelBuddy pipeline against recorded fixtures.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL file of trip requests")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE, help="Cassette file to record to / replay from")
+    parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--latency", default="",
+                        help="Injected replay latency, e.g. 'gemini=900,amadeus=350' or 'recorded'")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for --latency recorded")
+    parser.add_argument("--strict", action="store_true", help="Fail on cassette misses instead of falling back")
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warm", action="store_true", help="Keep tool caches between requests")
+    parser.add_argument("--json", help="Also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.mode == "replay":
+        use_dummy_credentials()
+
+    from batch_planner import parse_jsonl
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = [item for item in parse_jsonl(f) if "error" not in item]
+    if not corpus:
+        parser.error(f"No trip requests found in {args.corpus}")
+
+    cassette = Cassette(args.cassette, mode=args.mode, latency=_parse_latency(args.latency),
+                        scale=args.scale, strict=args.strict)
+    report = run_benchmark(corpus, cassette, iterations=args.iterations,
+                           concurrency=args.concurrency, cold=not args.warm)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+from datetime import datetime
+
+from currency import BASE_CURRENCY, convert_many, rates_info
+
+# Rough per-person daily costs in USD (mid-range traveller)
+DAILY_FOOD_COST = {
+    "Paris": 60,
+    "Brussels": 50,
+    "Amsterdam": 55,
+    "Berlin": 45,
+    "Kyoto": 40,
+    "Tokyo": 45,
+    "Dubai": 55,
+    "London": 65,
+    "Rome": 50,
+    "Barcelona": 45,
+}
+DAILY_ACTIVITY_COST = {
+    "Paris": 40,
+    "Brussels": 25,
+    "Amsterdam": 35,
+    "Berlin": 30,
+    "Kyoto": 30,
+    "Tokyo": 35,
+    "Dubai": 50,
+    "London": 45,
+    "Rome": 35,
+    "Barcelona": 30,
+}
+# Used only when neither Amadeus nor the LLM gave us a hotel price
+NIGHTLY_HOTEL_COST = {
+    "Paris": 150,
+    "Brussels": 110,
+    "Amsterdam": 140,
+    "Berlin": 100,
+    "Kyoto": 90,
+    "Tokyo": 120,
+    "Dubai": 130,
+    "London": 160,
+    "Rome": 120,
+    "Barcelona": 110,
+}
+DEFAULT_FOOD_COST = 45
+DEFAULT_ACTIVITY_COST = 30
+DEFAULT_HOTEL_COST = 110
+
+
+def _to_number(value):
+    """Parse '123.45', 123 or '$123' into a float, or None."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        cleaned = "".join(ch for ch in value if ch.isdigit() or ch == ".")
+        try:
+            return float(cleaned)
+        except ValueError:
+            return None
+    return None
+
+
+def _nights_between(check_in: str, check_out: str):
+    try:
+        nights = (datetime.strptime(check_out, "%Y-%m-%d") - datetime.strptime(check_in, "%Y-%m-%d")).days
+    except (TypeError, ValueError):
+        return None
+    return nights if nights > 0 else None
+
+
+def _trip_nights(trip_plan: dict, bookings: dict) -> int:
+    nights = _nights_between(bookings.get("depart_date"), bookings.get("return_date"))
+    if nights:
+        return nights
+    days = _to_number(trip_plan.get("days"))
+    return max(int(days or 1), 1)
+
+
+def day_cities(trip_plan: dict, nights: int) -> list:
+    """One city name per trip day, from daily_plan when available."""
+    daily = trip_plan.get("daily_plan") or []
+    cities = [d.get("city") for d in daily if isinstance(d, dict)]
+    if cities:
+        return cities
+    plan_cities = trip_plan.get("city") or []
+    if isinstance(plan_cities, str):
+        plan_cities = [plan_cities]
+    if not plan_cities:
+        return [None] * nights
+    # Spread the days evenly over the planned cities
+    return [plan_cities[i * len(plan_cities) // nights] for i in range(nights)]
+
+
+def _priced_offers(flights: list) -> list:
+    return [f for f in flights or [] if isinstance(f, dict) and not f.get("error") and _to_number(f.get("price")) is not None]
+
+
+def flight_cost(flights: list):
+    """Cheapest grandTotal among the flight offers (in USD), or None."""
+    valid = _priced_offers(flights)
+    prices = convert_many([_to_number(f.get("price")) for f in valid], [f.get("currency") for f in valid])
+    prices = [p for p in prices if p is not None]
+    return min(prices) if prices else None
+
+
+def accommodation_cost(bookings: dict, day_cities: list, nights: int) -> float:
+    """
+    Price each night at its city's rate: the cheapest Amadeus hotel offer
+    for that city, then the LLM's approx_price_per_night, then the local
+    nightly table. Offers without a "city" are for the trip's first city.
+    """
+    first_city = day_cities[0] if day_cities else None
+    offers = [o for o in bookings.get("hotel_offers") or [] if isinstance(o, dict) and not o.get("error")]
+    totals = convert_many([_to_number(o.get("price")) for o in offers], [o.get("currency") for o in offers])
+    rates = {}
+    for offer, total in zip(offers, totals):
+        if total is None:
+            continue
+        offer_nights = _nights_between(offer.get("check_in"), offer.get("check_out")) or nights
+        city = offer.get("city", first_city)
+        rates[city] = min(rates.get(city, total / offer_nights), total / offer_nights)
+
+    for hotel in bookings.get("hotels") or []:
+        if isinstance(hotel, dict):
+            price = _to_number(hotel.get("approx_price_per_night"))
+            if price is not None:
+                rates.setdefault(hotel.get("city"), price)
+
+    def rate(city):
+        return rates.get(city, NIGHTLY_HOTEL_COST.get(city, DEFAULT_HOTEL_COST))
+
+    total = sum(rate(city) for city in day_cities[:nights])
+    # Extra nights beyond the daily plan are charged at the last city's rate
+    if len(day_cities) < nights:
+        last = day_cities[-1] if day_cities else None
+        total += rate(last) * (nights - len(day_cities))
+    return total
+
+
+def default_adjustments(breakdown: dict, over_by: float) -> list:
+    """Deterministic suggestions aimed at the largest cost lines."""
+    if over_by <= 0:
+        return []
+    suggestions = {
+        "accommodation": "Choose cheaper accommodation (hostels, guesthouses or stays outside the centre).",
+        "transportation": "Use flexible dates or trains/buses instead of flights to cut transport costs.",
+        "food": "Eat at local markets and casual restaurants instead of sit-down dinners.",
+        "activities": "Swap paid attractions for free walking tours, parks and museums' free days.",
+    }
+    ranked = sorted(suggestions, key=lambda k: breakdown.get(k, 0), reverse=True)
+    adjustments = [suggestions[k] for k in ranked[:2]]
+    adjustments.append(f"Reduce the total by about {over_by:.0f} {BASE_CURRENCY}, e.g. by shortening the trip by a day.")
+    return adjustments
+
+
+def estimate_trip_cost(trip_plan: dict, bookings: dict, budget: float) -> dict:
+    """
+    Deterministic cost model for a trip plan and its bookings.
+    Returns numeric totals (USD) and an exact within_budget flag, which is
+    "unknown" when a component couldn't be priced and the rest still fits.
+    """
+    if not isinstance(trip_plan, dict):
+        trip_plan = {}
+    if not isinstance(bookings, dict):
+        bookings = {}
+
+    nights = _trip_nights(trip_plan, bookings)
+    cities_by_day = day_cities(trip_plan, nights)
+
+    # Components we couldn't price (or convert to USD)
+    unpriced = []
+    route = bookings.get("transport")
+    legs = route.get("legs") if isinstance(route, dict) else None
+    transportation = flight_cost(bookings.get("flights"))
+    if legs and (transportation is None or len(legs) > 2):
+        # Sum of the legs (transport.estimate_route); a first <-> last
+        # round-trip fare only covers the whole journey of a two-city trip
+        transportation = route["cost_usd"]
+    if transportation is None:
+        # No usable fare and no local estimate (e.g. a city missing from the
+        # gazetteer): the trip still has to get between its cities
+        if bookings.get("flights") or len(set(filter(None, cities_by_day))) > 1:
+            unpriced.append("transportation")
+        transportation = 0.0
+    accommodation = accommodation_cost(bookings, cities_by_day, nights)
+    food = sum(DAILY_FOOD_COST.get(c, DEFAULT_FOOD_COST) for c in cities_by_day)
+    activities = sum(DAILY_ACTIVITY_COST.get(c, DEFAULT_ACTIVITY_COST) for c in cities_by_day)
+
+    breakdown = {
+        "accommodation": round(accommodation, 2),
+        "transportation": round(transportation, 2),
+        "food": round(food, 2),
+        "activities": round(activities, 2),
+    }
+    total = round(sum(breakdown.values()), 2)
+    breakdown["total_estimate"] = total
+
+    budget = _to_number(budget)
+    if budget is None:
+        within = "unknown"
+        over_by = 0.0
+    else:
+        within = "yes" if total <= budget else "no"
+        over_by = round(total - budget, 2)
+        if unpriced and within == "yes":
+            within = "unknown"
+
+    return {
+        "estimated_total": breakdown,
+        "currency": BASE_CURRENCY,
+        "fx_rates": rates_info(),
+        "budget": budget,
+        "within_budget": within,
+        "unpriced": unpriced,
+        "over_budget_by": max(over_by, 0.0),
+        "adjustments": default_adjustments(breakdown, over_by),
+    }
@@ -0,0 +1,185 @@
+import contextlib
+import copy
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import shared_cache
+
+# Every ttl_cache-wrapped function, so caches can be inspected or reset together
+_registry = {}
+
+# Per-function entry cap; least recently used entries go first
+CACHE_MAX_ENTRIES = int(os.getenv("TRAVELBUDDY_CACHE_MAX_ENTRIES", "2048"))
+
+
+def _is_error(result) -> bool:
+    """Tool functions report failures as {'error': ...}, [{'error': ...}] or None."""
+    if result is None:
+        return True
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list) and result and isinstance(result[0], dict):
+        return all("error" in item for item in result)
+    return False
+
+
+def _call_key(signature, args, kwargs) -> tuple:
+    """Bound arguments with defaults applied, so f(a, b=1) and f(a, 1) share a key."""
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        return (args, tuple(sorted(kwargs.items())))
+    bound.apply_defaults()
+    key = []
+    for name, value in bound.arguments.items():
+        kind = signature.parameters[name].kind
+        if kind is inspect.Parameter.VAR_KEYWORD:
+            value = tuple(sorted(value.items()))
+        key.append((name, value))
+    return tuple(key)
+
+
+def _shared_key(name: str, key: tuple) -> str:
+    return f"{name}:{json.dumps(key, default=str)}"
+
+
+def ttl_cache(ttl: float, stale_ttl: float = 0, shared: bool = True, max_entries: int = None):
+    """
+    Memoize a tool lookup for `ttl` seconds.
+    - identical concurrent calls share one upstream request (single flight)
+    - error results are never cached
+    - if a refresh fails, an expired value up to `stale_ttl` seconds old is
+      served instead of the error (graceful degradation)
+    - callers get a copy, so mutating a result can't poison the cache
+    - at most `max_entries` (CACHE_MAX_ENTRIES) entries are kept: entries
+      past their stale window are swept first, then the least recently used
+    - with shared=True, a miss is looked up in the node-wide shared_cache
+      tier, and results are written there; across processes, one of them
+      calls the upstream per key while the others wait for its result
+    The wrapped function gets .cache_clear() and .cache_info().
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__name__}"
+        signature = inspect.signature(func)
+        limit = max_entries or CACHE_MAX_ENTRIES
+        entries = OrderedDict()
+        in_flight = {}
+        lock = threading.Lock()
+        stats = {"hits": 0, "misses": 0, "stale": 0, "shared": 0, "evicted": 0}
+
+        def store(key, expires, value):
+            """Insert an entry and evict down to the size limit (call with the lock held)."""
+            entries[key] = (expires, value)
+            entries.move_to_end(key)
+            if len(entries) <= limit:
+                return
+            now = time.time()
+            for old in [k for k, e in entries.items() if now >= e[0] + stale_ttl]:
+                del entries[old]
+                stats["evicted"] += 1
+            while len(entries) > limit:
+                entries.popitem(last=False)
+                stats["evicted"] += 1
+
+        def adopt(key, entry):
+            """Take a fresh shared-tier entry into the in-process cache."""
+            with lock:
+                store(key, entry[0], copy.deepcopy(entry[2]))
+                stats["shared"] += 1
+            return entry[2]
+
+        def compute(key, skey, args, kwargs):
+            if skey:
+                entry = shared_cache.get(skey)
+                if entry and time.time() < entry[0]:
+                    return adopt(key, entry)
+            with shared_cache.lease(skey) if skey else _no_lease() as leader:
+                if not leader:
+                    # Another process is fetching this key: wait for its result
+                    entry = shared_cache.wait_for(skey)
+                    if entry:
+                        return adopt(key, entry)
+                result = func(*args, **kwargs)
+                if not _is_error(result):
+                    with lock:
+                        store(key, time.time() + ttl, copy.deepcopy(result))
+                    if skey:
+                        shared_cache.put(skey, result, ttl, stale_ttl)
+                    return result
+
+            with lock:
+                entry = entries.get(key)
+                if entry and time.time() < entry[0] + stale_ttl:
+                    stats["stale"] += 1
+                    return copy.deepcopy(entry[1])
+            if skey:
+                entry = shared_cache.get(skey)
+                if entry:
+                    with lock:
+                        stats["stale"] += 1
+                    return entry[2]
+            return result
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _call_key(signature, args, kwargs)
+            while True:
+                with lock:
+                    entry = entries.get(key)
+                    if entry and time.time() < entry[0]:
+                        stats["hits"] += 1
+                        entries.move_to_end(key)
+                        return copy.deepcopy(entry[1])
+                    event = in_flight.get(key)
+                    if event is None:
+                        event = threading.Event()
+                        in_flight[key] = event
+                        stats["misses"] += 1
+                        break
+                # Someone else is fetching the same key: wait and re-check
+                event.wait()
+
+            try:
+                return compute(key, _shared_key(name, key) if shared else None, args, kwargs)
+            finally:
+                with lock:
+                    in_flight.pop(key, None)
+                event.set()
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+            if shared:
+                shared_cache.clear(f"{name}:")
+
+        def cache_info():
+            with lock:
+                return {"hits": stats["hits"], "misses": stats["misses"], "stale": stats["stale"],
+                        "shared": stats["shared"], "evicted": stats["evicted"], "size": len(entries),
+                        "max_size": limit}
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = cache_info
+        _registry[name] = wrapper
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def _no_lease():
+    yield True
+
+
+def clear_all_caches():
+    for wrapper in _registry.values():
+        wrapper.cache_clear()
+
+
+def all_cache_info() -> dict:
+    return {name: wrapper.cache_info() for name, wrapper in _registry.items()}
@@ -0,0 +1,289 @@
+"""
+Record / replay of upstream traffic (Gemini, Amadeus, OpenWeather, REST Countries)
+so the pipeline can be run offline and benchmarked reproducibly.
+
+    with Cassette("cassettes/default.json", mode="record"):
+        coordinator.handle_request(...)   # live calls, saved to the cassette
+
+    with Cassette("cassettes/default.json", mode="replay", latency={"gemini": 800}):
+        coordinator.handle_request(...)   # no network, 800 ms per Gemini call
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+# Replayed streams are cut into chunks of this size, with the call's latency spread across them
+STREAM_CHUNK_CHARS = 64
+# Credentials never end up in cassette keys or files
+SECRET_PARAMS = {"appid", "client_id", "client_secret", "key", "api_key"}
+# Response fields (e.g. the Amadeus OAuth token) saved and replayed as a placeholder
+SECRET_FIELDS = {"access_token", "refresh_token", "id_token"}
+REPLAY_TOKEN = "replay"
+
+UPSTREAM_HOSTS = {
+    "api.amadeus.com": "amadeus",
+    "test.api.amadeus.com": "amadeus",
+    "api.openweathermap.org": "openweather",
+    "restcountries.com": "restcountries",
+}
+
+
+def upstream_for_url(url: str) -> str:
+    return UPSTREAM_HOSTS.get(urlparse(url).hostname or "", "http")
+
+
+def _digest(payload) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _public(params) -> dict:
+    if not isinstance(params, dict):
+        return {}
+    return {k: v for k, v in params.items() if k not in SECRET_PARAMS}
+
+
+def _redact(body):
+    if not isinstance(body, dict):
+        return body
+    return {k: REPLAY_TOKEN if k in SECRET_FIELDS else v for k, v in body.items()}
+
+
+class CassetteMiss(Exception):
+    """Raised in strict replay mode when no recorded interaction matches."""
+
+
+class ReplayResponse:
+    """The subset of requests.Response the tool modules use."""
+
+    def __init__(self, url: str, status_code: int, body):
+        self.url = url
+        self.status_code = status_code
+        self._body = body
+        self.text = body if isinstance(body, str) else json.dumps(body)
+
+    def json(self):
+        if isinstance(self._body, str):
+            return json.loads(self._body)
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class ReplayGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _ModelsProxy:
+    """Wraps client.models so generate_content goes through the cassette."""
+
+    def __init__(self, cassette, models):
+        self._cassette = cassette
+        self._models = models
+
+    def generate_content(self, model, contents, **kwargs):
+        return self._cassette.gemini_call(self._models, model, contents, **kwargs)
+
+    def generate_content_stream(self, model, contents, **kwargs):
+        return self._cassette.gemini_stream_call(self._models, model, contents, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+class _ClientProxy:
+    def __init__(self, cassette, client):
+        self._client = client
+        self.models = _ModelsProxy(cassette, client.models)
+        # No context caching: system instructions go inline, so they are part
+        # of the recorded interaction and the key
+        self.caches = None
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class Cassette:
+    """
+    mode:    "record" (live calls, saved on exit) or "replay" (no network)
+    latency: {"gemini": ms, "amadeus": ms, ...} injected on replay, or
+             "recorded" to replay each call with its recorded duration
+    scale:   multiplier applied to recorded durations
+    strict:  in replay, raise CassetteMiss instead of falling back to the
+             closest interaction for the same endpoint
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency=None, scale: float = 1.0, strict: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.latency = latency or {}
+        self.scale = scale
+        self.strict = strict
+        self.interactions = {}
+        self.stats = {"hits": 0, "fallbacks": 0, "misses": 0, "recorded": 0}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self._patched = []
+        if mode == "replay" or os.path.exists(path):
+            self.load()
+
+    # ---------- file handling ----------
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.interactions = data.get("interactions", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "interactions": self.interactions}, f, indent=1, sort_keys=True)
+
+    # ---------- keys ----------
+
+    @staticmethod
+    def http_key(method: str, url: str, params=None, data=None):
+        endpoint = f"{method.upper()} {url.split('?')[0]}"
+        return endpoint, f"{endpoint} {_digest([_public(params), _public(data)])}"
+
+    @staticmethod
+    def gemini_key(model: str, contents, system: str = None):
+        text = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        normalized = " ".join(((system or "") + " " + text).split())
+        # The opening line (system instruction or prompt) identifies the agent, used for loose matching
+        endpoint = f"GEMINI {model} {normalized[:80]}"
+        return endpoint, f"GEMINI {model} {_digest(normalized)}"
+
+    # ---------- record / replay core ----------
+
+    def _record(self, endpoint: str, key: str, upstream: str, entry: dict):
+        entry["endpoint"] = endpoint
+        entry["upstream"] = upstream
+        with self._lock:
+            self.interactions.setdefault(key, []).append(entry)
+            self.stats["recorded"] += 1
+
+    def _lookup(self, endpoint: str, key: str) -> dict:
+        with self._lock:
+            entries = self.interactions.get(key)
+            if entries:
+                self.stats["hits"] += 1
+            else:
+                if self.strict:
+                    self.stats["misses"] += 1
+                    raise CassetteMiss(key)
+                entries = [e for group in self.interactions.values() for e in group if e.get("endpoint") == endpoint]
+                if not entries:
+                    self.stats["misses"] += 1
+                    raise CassetteMiss(key)
+                self.stats["fallbacks"] += 1
+            # Repeated identical calls cycle through the recorded responses
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return entries[index % len(entries)]
+
+    def _delay(self, upstream: str, entry: dict) -> float:
+        if self.latency == "recorded":
+            return entry.get("elapsed", 0.0) * self.scale
+        return self.latency.get(upstream, 0) / 1000.0
+
+    def _sleep(self, upstream: str, entry: dict):
+        delay = self._delay(upstream, entry)
+        if delay > 0:
+            time.sleep(delay)
+
+    def http_call(self, real, method: str, url: str, params=None, data=None, **kwargs):
+        endpoint, key = self.http_key(method, url, params, data)
+        upstream = upstream_for_url(url)
+        if self.mode == "replay":
+            entry = self._lookup(endpoint, key)
+            self._sleep(upstream, entry)
+            return ReplayResponse(url, entry["status"], _redact(entry["body"]))
+
+        start = time.perf_counter()
+        resp = real(url, params=params, data=data, **kwargs)
+        elapsed = time.perf_counter() - start
+        try:
+            body = resp.json()
+        except ValueError:
+            body = resp.text
+        self._record(endpoint, key, upstream, {"status": resp.status_code, "body": _redact(body), "elapsed": elapsed})
+        return resp
+
+    def gemini_call(self, models, model, contents, **kwargs):
+        config = kwargs.get("config") or {}
+        endpoint, key = self.gemini_key(model, contents, config.get("system_instruction"))
+        if self.mode == "replay":
+            entry = self._lookup(endpoint, key)
+            self._sleep("gemini", entry)
+            return ReplayGeminiResponse(entry["body"])
+
+        start = time.perf_counter()
+        response = models.generate_content(model=model, contents=contents, **kwargs)
+        elapsed = time.perf_counter() - start
+        self._record(endpoint, key, "gemini", {"status": 200, "body": response.text or "", "elapsed": elapsed})
+        return response
+
+    def gemini_stream_call(self, models, model, contents, **kwargs):
+        """Streams are stored as their full text, under the same key as a plain call."""
+        config = kwargs.get("config") or {}
+        endpoint, key = self.gemini_key(model, contents, config.get("system_instruction"))
+        if self.mode == "replay":
+            entry = self._lookup(endpoint, key)
+            text = entry["body"]
+            chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+            pause = self._delay("gemini", entry) / len(chunks)
+            for chunk in chunks:
+                if pause > 0:
+                    time.sleep(pause)
+                yield ReplayGeminiResponse(chunk)
+            return
+
+        start = time.perf_counter()
+        parts = []
+        for chunk in models.generate_content_stream(model=model, contents=contents, **kwargs):
+            parts.append(chunk.text or "")
+            yield chunk
+        elapsed = time.perf_counter() - start
+        self._record(endpoint, key, "gemini", {"status": 200, "body": "".join(parts), "elapsed": elapsed})
+
+    # ---------- patching ----------
+
+    def _patch(self, obj, name, value):
+        self._patched.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    def __enter__(self):
+        import agent_client
+
+        real_get, real_post = requests.get, requests.post
+        self._patch(requests, "get", lambda url, params=None, **kw: self.http_call(real_get, "GET", url, params=params, **kw))
+        self._patch(requests, "post", lambda url, data=None, **kw: self.http_call(real_post, "POST", url, data=data, **kw))
+        self._patch(agent_client, "client", _ClientProxy(self, agent_client.client))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        while self._patched:
+            obj, name, original = self._patched.pop()
+            setattr(obj, name, original)
+        if self.mode == "record":
+            self.save()
+        return False
+
+
+def use_dummy_credentials():
+    """
+    The tool modules refuse to import without API keys. Replay never talks to
+    the network, so placeholders are enough; call this before importing them.
+    """
+    for name in ("GEMINI_API_KEY", "AMADEUS_CLIENT_ID", "AMADEUS_CLIENT_SECRET", "OPENWEATHER_API_KEY"):
+        os.environ.setdefault(name, "replay")
@@ -0,0 +1,34 @@
+"""
+Bundled monthly climate normals (data/climate_normals.json).
+
+Used for travel dates beyond the weather forecast horizon, so far-future
+trips need no weather API call. The file is columnar: a city list, and one
+12-month row per city for each variable.
+"""
+import json
+import os
+
+CLIMATE_NORMALS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "climate_normals.json")
+VARIABLES = ("temp_min_c", "temp_max_c", "precip_mm")
+
+_normals = {}
+
+
+def load_normals(path: str = CLIMATE_NORMALS_FILE) -> dict:
+    """{"version", "index": {lowercased city: row}, variable: [[12 values] per city]}, loaded once."""
+    if not _normals:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        _normals.update({name: data[name] for name in VARIABLES})
+        _normals["version"] = data.get("version")
+        _normals["index"] = {city.lower(): row for row, city in enumerate(data["cities"])}
+    return _normals
+
+
+def monthly_normals(city: str, month: int):
+    """{"temp_min_c", "temp_max_c", "precip_mm"} for a city and month (1-12), or None."""
+    normals = load_normals()
+    row = normals["index"].get((city or "").strip().lower())
+    if row is None:
+        return None
+    return {name: normals[name][row][month - 1] for name in VARIABLES}
@@ -0,0 +1,14 @@
+import os
+
+# Tests never reach the network, and must not share the node's cache file
+os.environ.setdefault("TRAVELBUDDY_SHARED_CACHE", "local")
+try:
+    from cassette import use_dummy_credentials
+except ImportError:
+    # requests isn't installed: the tests that need the tool modules skip
+    pass
+else:
+    use_dummy_credentials()
+
+# test_chat.py is a manual script that calls the live Gemini API
+collect_ignore = ["test_chat.py"]
@@ -0,0 +1,141 @@
+"""
+Explicit Gemini context caching for the static part of agent prompts.
+
+Each agent's role description and output schema is a fixed system
+instruction. It is uploaded once per model as cached content, and after that
+only the trip-specific part of the prompt is sent with each request.
+
+Handles are kept per (model, instruction) and are recreated shortly before
+they expire. When caching can't be used, get_handle() returns None and the
+caller sends the instruction inline as a system_instruction. That happens
+when the instruction is below the model's minimum cacheable size, the SDK
+has no caches API, or creating the cache failed.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from prompts import estimate_tokens
+from telemetry import counter
+
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "1") == "1"
+GEMINI_CACHE_TTL_S = int(os.getenv("GEMINI_CACHE_TTL_S", "3600"))
+# Gemini rejects cached content smaller than this many tokens
+GEMINI_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CACHE_MIN_TOKENS", "1024"))
+# Recreate a handle this long before it expires, so no call races the expiry
+REFRESH_MARGIN_S = 120
+# After a failed create, send inline for this long before trying again
+FAILURE_BACKOFF_S = 300
+
+# (model, instruction digest) -> {"name": str, "expires_at": float}
+#                             or {"name": None, "retry_at": float}
+_handles = {}
+_lock = threading.Lock()
+# One lock per key, held while its cache is created, so concurrent requests
+# don't create duplicates and other agents' lookups don't wait on the API call
+_create_locks = {}
+
+CONTEXT_CACHE_EVENTS = counter("travelbuddy_gemini_context_cache_total",
+                               "Gemini context cache lookups by outcome (hit/created/inline/failed/invalidated).")
+
+
+def _key(model: str, system: str) -> tuple:
+    return model, hashlib.sha256(system.encode("utf-8")).hexdigest()
+
+
+def get_handle(client, model: str, system: str):
+    """
+    Name of a live cached-content handle holding `system` for `model`,
+    creating it if needed. None means: send the instruction inline.
+    """
+    if not GEMINI_CONTEXT_CACHE or getattr(client, "caches", None) is None:
+        return None
+    if estimate_tokens(system) < GEMINI_CACHE_MIN_TOKENS:
+        CONTEXT_CACHE_EVENTS.inc(outcome="inline")
+        return None
+
+    key = _key(model, system)
+    handle = _lookup(key)
+    if handle is not False:
+        return handle
+
+    with _lock:
+        create_lock = _create_locks.setdefault(key, threading.Lock())
+    with create_lock:
+        # Another request may have created it while we waited
+        handle = _lookup(key)
+        if handle is not False:
+            return handle
+
+        now = time.time()
+        try:
+            cached = client.caches.create(
+                model=model,
+                config={
+                    "system_instruction": system,
+                    "ttl": f"{GEMINI_CACHE_TTL_S}s",
+                    "display_name": f"travelbuddy-{key[1][:12]}",
+                },
+            )
+        except Exception as e:
+            logging.warning(f"Gemini context cache unavailable for {model}: {e}")
+            with _lock:
+                _handles[key] = {"name": None, "retry_at": now + FAILURE_BACKOFF_S}
+            CONTEXT_CACHE_EVENTS.inc(outcome="failed")
+            return None
+
+        # A replaced handle is left to expire on its own: calls already in
+        # flight may still be using it
+        with _lock:
+            _handles[key] = {"name": cached.name, "expires_at": now + GEMINI_CACHE_TTL_S}
+        CONTEXT_CACHE_EVENTS.inc(outcome="created")
+        return cached.name
+
+
+def _lookup(key: tuple):
+    """The live handle name, None while backing off after a failure, or False (create one)."""
+    with _lock:
+        entry = _handles.get(key)
+    now = time.time()
+    if entry and entry["name"] and now < entry["expires_at"] - REFRESH_MARGIN_S:
+        CONTEXT_CACHE_EVENTS.inc(outcome="hit")
+        return entry["name"]
+    if entry and not entry["name"] and now < entry["retry_at"]:
+        CONTEXT_CACHE_EVENTS.inc(outcome="inline")
+        return None
+    return False
+
+
+def invalidate(model: str, system: str):
+    """Forget the handle, e.g. after Gemini reports it missing or expired."""
+    with _lock:
+        if _handles.pop(_key(model, system), None) is not None:
+            CONTEXT_CACHE_EVENTS.inc(outcome="invalidated")
+
+
+def is_missing_cache_error(error: Exception) -> bool:
+    """
+    True when a call failed because its cached content no longer exists:
+    a NOT_FOUND or PERMISSION_DENIED error that names the cached content.
+    Other 403/404s (bad model name, API key) are real errors.
+    """
+    text = str(error).lower()
+    if "cachedcontent" not in text:
+        return False
+    return (getattr(error, "code", None) in (403, 404)
+            or "not_found" in text or "not found" in text
+            or "permission_denied" in text or "permission denied" in text)
+
+
+def delete_all(client):
+    """Delete every cached content this process created (call on shutdown)."""
+    with _lock:
+        names = [entry["name"] for entry in _handles.values() if entry["name"]]
+        _handles.clear()
+    for name in names:
+        try:
+            client.caches.delete(name=name)
+        except Exception as e:
+            logging.warning(f"Could not delete Gemini context cache {name}: {e}")
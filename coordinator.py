@@ -1,10 +1,40 @@
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-from agents import TripPlannerAgent, BookingAgent, SafetyAgent, BudgetAgent
+from agents import TripPlannerAgent, BookingAgent, SafetyAgent, BudgetAgent, FusedAnalysisAgent
+from budget_engine import estimate_trip_cost
 from memory import get_user_preferences, update_user_preferences
+import prefetch
+import route_optimizer
+from resilience import Unavailable, deadline_scope
+from prompts import PromptTemplate, Slot
+from telemetry import span
+from utils import submit_in_context
 
 logging.basicConfig(level=logging.INFO)
 
+# "sequential": Booking, Safety and Budget agents each call Gemini
+# "fused": tool data gathered concurrently, then one combined Gemini call
+PIPELINE_MODES = ("sequential", "fused")
+
+def _no_progress(stage: str, data):
+    pass
+
+
+# Stream the planner's answer so tool lookups start once its "city" list is in
+# (only with prefetching on; TRAVELBUDDY_PREFETCH=0 turns off all speculative lookups)
+STREAM_PLANNER = os.getenv("TRAVELBUDDY_STREAM_PLANNER", "1") == "1"
+
+# Stored preferences grow with every trip; cap their share of the planner prompt
+ENRICHED_REQUEST = PromptTemplate("enriched_request", """
+    User request: {user_request}
+    Known user preferences: {preferences}
+    """,
+    user_request=Slot("text", max_tokens=800),
+    preferences=Slot("json", max_tokens=500),
+)
+
 class TravelBuddyCoordinator:
     def __init__(self, user_id: str = "default_user"):
         self.user_id = user_id
@@ -12,35 +42,88 @@ class TravelBuddyCoordinator:
         self.booking = BookingAgent()
         self.safety = SafetyAgent()
         self.budget = BudgetAgent()
+        self.fused = FusedAnalysisAgent()
 
-    def handle_request(self, user_request: str, budget: float = 1000.0) -> dict:
-        logging.info("Starting new TravelBuddy request")
-        logging.info(f"User request: {user_request}")
-
+    def enrich_request(self, user_request: str) -> str:
         # 🔹 Load user preferences from memory
         user_prefs = get_user_preferences(self.user_id)
         logging.info(f"Loaded user preferences: {user_prefs}")
 
         # 🔹 Enrich the request with known preferences
-        enriched_request = f"""
-        User request: {user_request}
-        Known user preferences: {user_prefs}
+        return ENRICHED_REQUEST.render(user_request=user_request, preferences=user_prefs)
+
+    def handle_request(self, user_request: str, budget: float = 1000.0, trip_plan: dict = None,
+                       deadline_s: float = None, mode: str = "sequential", progress=None) -> dict:
+        """
+        Run the full agent pipeline. A trip_plan produced elsewhere (e.g. by a
+        batched planner call) skips the TripPlannerAgent step.
+        deadline_s bounds the whole request (default TRAVELBUDDY_SLO_SECONDS);
+        tools that would overrun it are skipped and their data omitted.
+        mode is one of PIPELINE_MODES.
+        progress(stage, data), if given, is called with each stage's output
+        as soon as it is ready (used by background jobs for partial results).
         """
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        with span("request", "handle_request"), deadline_scope(deadline_s):
+            return self._run_pipeline(user_request, budget, trip_plan, mode, progress)
+
+    def _run_pipeline(self, user_request: str, budget: float, trip_plan: dict = None,
+                      mode: str = "sequential", progress=None) -> dict:
+        progress = progress or _no_progress
+        logging.info("Starting new TravelBuddy request")
+        logging.info(f"User request: {user_request}")
+
+        enriched_request = self.enrich_request(user_request)
+
+        if trip_plan is None:
+            # Start tool lookups for cities/dates named in the request while the planner runs
+            speculation = prefetch.start(user_request, enriched_request) if prefetch.PREFETCH_ENABLED else None
 
-        logging.info("Calling TripPlannerAgent")
-        trip_plan = self.planner.plan_trip(enriched_request)
+            logging.info("Calling TripPlannerAgent")
+            streaming = STREAM_PLANNER and prefetch.PREFETCH_ENABLED
+            on_field = self._plan_field_listener(enriched_request) if streaming else None
+            try:
+                with span("agent", "planner"):
+                    trip_plan = self.planner.plan_trip(enriched_request, on_field=on_field)
+            except Unavailable as e:
+                # Degrade: without a plan there is nothing to book, assess or price
+                logging.warning(f"TripPlannerAgent unavailable: {e}")
+                trip_plan = {"summary": f"Trip planning skipped: {e}"}
+                if speculation:
+                    speculation.settle(trip_plan)
+                progress("trip_plan", trip_plan)
+                return {"trip_plan": trip_plan, "bookings": {}, "safety": {}, "budget": {},
+                        "error": "planner unavailable"}
+            if speculation:
+                speculation.settle(trip_plan)
         if isinstance(trip_plan, dict):
             trip_plan["user_request"] = enriched_request
+        if route_optimizer.OPTIMIZE_ROUTE:
+            with span("tool", "route_optimizer"):
+                trip_plan = route_optimizer.optimize_plan(trip_plan)
+        progress("trip_plan", trip_plan)
 
 
-        logging.info("Calling BookingAgent")
-        bookings = self.booking.suggest_bookings(trip_plan)
+        if mode == "fused":
+            bookings, safety, budget_result = self._run_fused(trip_plan, budget)
+            progress("bookings", bookings)
+            progress("safety", safety)
+        else:
+            logging.info("Calling BookingAgent")
+            with span("agent", "booking"):
+                bookings = self.booking.suggest_bookings(trip_plan)
+            progress("bookings", bookings)
 
-        logging.info("Calling SafetyAgent")
-        safety = self.safety.check_safety(trip_plan)
+            logging.info("Calling SafetyAgent")
+            with span("agent", "safety"):
+                safety = self.safety.check_safety(trip_plan, bookings.get("depart_date"), bookings.get("return_date"))
+            progress("safety", safety)
 
-        logging.info("Calling BudgetAgent")
-        budget_result = self.budget.check_budget(trip_plan, bookings, budget)
+            logging.info("Calling BudgetAgent")
+            with span("agent", "budget"):
+                budget_result = self.budget.check_budget(trip_plan, bookings, budget)
+        progress("budget", budget_result)
 
         # 🔹 Update memory (simple example)
         logging.info("Updating user memory")
@@ -54,3 +137,67 @@ class TravelBuddyCoordinator:
             "safety": safety,
             "budget": budget_result,
         }
+
+    def _plan_field_listener(self, date_text: str):
+        """
+        on_field callback for the streamed planner: as soon as the plan's
+        cities are known, start their weather, country, hotel and flight
+        lookups. The agents later pick the results up from the tool caches.
+        """
+        def on_field(key, value):
+            if key == "city" and isinstance(value, list):
+                cities = [city for city in value if isinstance(city, str)]
+                if cities:
+                    logging.info(f"Planner streamed cities {cities}; starting tool lookups")
+                    prefetch.start_for_cities(cities, date_text)
+        return on_field
+
+    def _run_fused(self, trip_plan: dict, budget: float):
+        """
+        Fused mode: flights, hotel offers, weather and country data are fetched
+        concurrently, then a single Gemini call produces booking ideas, the
+        safety report and budget adjustments from one shared context.
+        """
+        if not isinstance(trip_plan, dict):
+            trip_plan = {"summary": str(trip_plan)}
+        depart_date, return_date, calendar = self.booking.choose_dates(trip_plan)
+        cities = trip_plan.get("city") or []
+        first_city = cities[0] if isinstance(cities, list) and cities else None
+
+        logging.info("Gathering tool data concurrently")
+        with span("agent", "tools"), ThreadPoolExecutor(max_workers=3) as pool:
+            flights_future = submit_in_context(pool, self.booking.search_flights, trip_plan, depart_date, return_date)
+            hotels_future = submit_in_context(pool, self.booking.search_hotel_offers, first_city, depart_date, return_date)
+            safety_future = submit_in_context(pool, self.safety.gather_data, trip_plan, depart_date, return_date)
+            bookings = {
+                "depart_date": depart_date,
+                "return_date": return_date,
+                "flights": flights_future.result(),
+                "hotels": [],
+                "hotel_offers": hotels_future.result(),
+                "activities": [],
+                "fare_calendar": calendar,
+                "transport": self.booking.route_transport(trip_plan),
+            }
+            weather_data, country_profiles = safety_future.result()
+
+        estimate = estimate_trip_cost(trip_plan, bookings, budget)
+        tool_data = dict(bookings, weather_data=weather_data, country_profiles=country_profiles)
+
+        logging.info("Calling FusedAnalysisAgent")
+        with span("agent", "fused"):
+            analysis = self.fused.analyze(trip_plan, tool_data, estimate)
+
+        llm_bookings = analysis.get("bookings") if isinstance(analysis.get("bookings"), dict) else {}
+        bookings["hotels"] = llm_bookings.get("hotels", [])
+        bookings["activities"] = llm_bookings.get("activities", [])
+
+        safety = self.safety.finalize(analysis.get("safety"), weather_data, country_profiles)
+
+        # Recompute: LLM hotel prices are used when Amadeus had no offers
+        budget_result = self.budget.check_budget(trip_plan, bookings, budget)
+        llm_budget = analysis.get("budget") if isinstance(analysis.get("budget"), dict) else {}
+        if budget_result["within_budget"] == "no" and llm_budget.get("adjustments"):
+            budget_result["adjustments"] = llm_budget["adjustments"]
+
+        return bookings, safety, budget_result
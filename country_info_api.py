@@ -1,5 +1,9 @@
-import requests
+from cache_utils import ttl_cache
+from resilience import guarded_request
+from telemetry import span
 
+
+@ttl_cache(24 * 60 * 60, stale_ttl=30 * 24 * 60 * 60)
 def get_country_info(country_code: str):
     """
     Uses REST Countries API to retrieve reliable data about a country.
@@ -9,7 +13,8 @@ def get_country_info(country_code: str):
     url = f"https://restcountries.com/v3.1/alpha/{country_code}"
 
     try:
-        resp = requests.get(url, timeout=5)
+        with span("tool", "restcountries.alpha"):
+            resp = guarded_request("restcountries", "GET", url, timeout=5)
         resp.raise_for_status()
         data = resp.json()
 
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+BASE_CURRENCY = "USD"
+
+# Bundled snapshot so conversion works offline; refreshed from FX_RATES_URL
+FX_SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fx_rates.json")
+FX_RATES_URL = os.getenv("FX_RATES_URL", "https://open.er-api.com/v6/latest/USD")
+FX_REFRESH_SECONDS = int(os.getenv("FX_REFRESH_SECONDS", str(12 * 60 * 60)))
+
+# rates[code] = units of `code` per 1 USD
+_fx_state = {"rates": {}, "as_of": None, "loaded_at": 0, "source": None}
+_fx_lock = threading.Lock()
+# Set while a refresh is in flight, so stale lookups start at most one
+_refreshing = threading.Event()
+
+
+def load_snapshot(path: str = FX_SNAPSHOT_FILE):
+    """Load the local FX snapshot into the rate table."""
+    with open(path, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    with _fx_lock:
+        _fx_state["rates"] = {k.upper(): float(v) for k, v in snapshot["rates"].items()}
+        _fx_state["as_of"] = snapshot.get("as_of")
+        _fx_state["loaded_at"] = time.time()
+        _fx_state["source"] = "snapshot"
+
+
+def refresh_rates():
+    """
+    Fetch fresh USD-based rates. On failure the current table is kept.
+    Returns True if the table was updated.
+    """
+    try:
+        resp = requests.get(FX_RATES_URL, timeout=5)
+        resp.raise_for_status()
+        data = resp.json()
+        rates = data.get("rates") or {}
+        if data.get("base_code", BASE_CURRENCY) != BASE_CURRENCY:
+            rates = {}
+    except Exception:
+        rates = {}
+    if not rates:
+        with _fx_lock:
+            # Don't retry on every lookup while the source is down
+            _fx_state["loaded_at"] = time.time()
+        return False
+
+    with _fx_lock:
+        _fx_state["rates"] = {k.upper(): float(v) for k, v in rates.items()}
+        _fx_state["as_of"] = data.get("time_last_update_utc")
+        _fx_state["loaded_at"] = time.time()
+        _fx_state["source"] = "live"
+    return True
+
+
+def start_refresh_scheduler(interval: int = FX_REFRESH_SECONDS):
+    """Refresh rates in a daemon thread every `interval` seconds."""
+    def _loop():
+        while True:
+            refresh_rates()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=_loop, name="fx-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def _refresh_in_background():
+    if _refreshing.is_set():
+        return
+    with _fx_lock:
+        if _refreshing.is_set():
+            return
+        _refreshing.set()
+
+    def _run():
+        try:
+            refresh_rates()
+        finally:
+            _refreshing.clear()
+
+    threading.Thread(target=_run, name="fx-refresh-once", daemon=True).start()
+
+
+def get_rates() -> dict:
+    """
+    Current rate table, loading the snapshot first if needed. Stale rates
+    are served while one background thread refreshes them (the scheduler
+    normally keeps them fresh); lookups never wait for the FX source.
+    """
+    if not _fx_state["rates"]:
+        load_snapshot()
+    if time.time() - _fx_state["loaded_at"] > FX_REFRESH_SECONDS:
+        _refresh_in_background()
+    return _fx_state["rates"]
+
+
+def rates_info() -> dict:
+    get_rates()
+    return {"base": BASE_CURRENCY, "as_of": _fx_state["as_of"], "source": _fx_state["source"]}
+
+
+def convert(amount, from_currency: str, to_currency: str = BASE_CURRENCY):
+    """Convert one amount; returns None for unknown currencies or amounts."""
+    return convert_many([amount], [from_currency], to_currency)[0]
+
+
+def convert_many(amounts: list, currencies: list, to_currency: str = BASE_CURRENCY) -> list:
+    """
+    Convert a list of amounts in one pass.
+    Each distinct currency's factor is looked up once; missing currencies
+    default to the target currency, unknown ones give None.
+    """
+    rates = get_rates()
+    to_currency = (to_currency or BASE_CURRENCY).upper()
+    to_rate = rates.get(to_currency)
+    if to_rate is None:
+        return [None] * len(amounts)
+
+    factors = {}
+    for code in set(currencies):
+        code_key = (code or to_currency).upper()
+        from_rate = rates.get(code_key)
+        factors[code] = to_rate / from_rate if from_rate else None
+
+    converted = []
+    for amount, code in zip(amounts, currencies):
+        factor = factors[code]
+        if amount is None or factor is None:
+            converted.append(None)
+        else:
+            converted.append(round(float(amount) * factor, 2))
+    return converted
+
@@ -1,3 +1,4 @@
+import re
 from datetime import datetime, timedelta
 import dateparser
 from dateparser.search import search_dates
@@ -91,3 +92,43 @@ def extract_dates_from_text(text: str):
             ret = depart + timedelta(days=7)
 
     return depart.strftime("%Y-%m-%d"), ret.strftime("%Y-%m-%d")
+
+
+_MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+           "august", "september", "october", "november", "december"]
+_FLEXIBLE_RE = re.compile(r"\b(?:some ?time|any ?time|whenever|flexible|cheapest (?:dates?|time|week))\b")
+# "in March", "during dec" ("may" on its own is usually not the month)
+_MONTH_RE = re.compile(r"\b(?:in|during|around|through)\s+(?:early\s+|mid\s+|late\s+)?("
+                       + "|".join(f"{m[:3]}(?:{m[3:]})?" for m in _MONTHS) + r")\b")
+_LENGTH_RE = re.compile(r"\b(\d{1,2}|a|one|two|three)[ -](day|night|week)s?\b")
+_NUMBER_WORDS = {"a": 1, "one": 1, "two": 2, "three": 3}
+
+
+def flexible_window_from_text(text: str):
+    """
+    For flexible requests like 'sometime in March, 7 days': the window of
+    possible departure days and the trip length.
+    Returns {"earliest": 'YYYY-MM-DD', "latest": 'YYYY-MM-DD', "length_days": n},
+    or None when the request has no flexible month (fixed dates are handled
+    by extract_dates_from_text).
+    """
+    text = (text or "").lower()
+    month_match = _MONTH_RE.search(text)
+    if not _FLEXIBLE_RE.search(text) or not month_match:
+        return None
+    month = [m[:3] for m in _MONTHS].index(month_match.group(1)[:3]) + 1
+    today = datetime.utcnow().date()
+    if month == today.month:
+        # The rest of this month
+        first = today + timedelta(days=1)
+    else:
+        first = _next_occurrence_month(month, today.year).date()
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+    length = 7
+    length_match = _LENGTH_RE.search(text)
+    if length_match:
+        count, unit = length_match.groups()
+        count = _NUMBER_WORDS.get(count) or int(count)
+        length = count * 7 if unit == "week" else count
+    return {"earliest": first.strftime("%Y-%m-%d"), "latest": last.strftime("%Y-%m-%d"), "length_days": length}
@@ -0,0 +1,134 @@
+"""
+Flexible-date fare search ("sometime in March, 7 days").
+
+The answer is a price matrix: one row per departure date, one column per
+trip length. It comes from Amadeus' cheapest-date endpoint when that covers
+the route. Otherwise a grid of departure dates x lengths is fanned out to
+flight-offers, FARE_GRID_WORKERS cells at a time.
+
+Each cell's fare is cached on its own (route, depart, return). Overlapping
+grids, e.g. 'March' followed by 'mid March, 8 days', only fetch the cells
+that are new.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from amadeus_api import fetch_flight_offers, search_flight_dates
+from cache_utils import ttl_cache
+from currency import convert, convert_many
+from telemetry import counter
+from utils import submit_in_context
+
+# Try Amadeus' cheapest-date endpoint before the flight-offers grid
+USE_FLIGHT_DATES = os.getenv("TRAVELBUDDY_FLIGHT_DATES", "1") == "1"
+# Concurrent flight-offers calls per grid (the Amadeus limiter still applies)
+FARE_GRID_WORKERS = 4
+# Longer windows are sampled down to this many departure dates
+MAX_GRID_DEPARTURES = 10
+# Trip lengths searched: the requested one +/- this many days
+LENGTH_FLEX_DAYS = 1
+# Offers per cell; Amadeus returns the cheapest first
+FARE_CELL_RESULTS = 3
+
+FARE_CALENDARS = counter("travelbuddy_fare_calendars_total", "Flexible-date searches by price source.")
+FARE_CELLS = counter("travelbuddy_fare_cells_total", "Grid cells priced by flight-offers, by outcome.")
+
+
+def date_grid(earliest: str, latest: str, length_days: int, length_flex: int = LENGTH_FLEX_DAYS,
+              max_departures: int = MAX_GRID_DEPARTURES):
+    """
+    (departure dates, trip lengths) of the grid. Windows with more days than
+    max_departures are sampled at an even step.
+    """
+    first = datetime.strptime(earliest, "%Y-%m-%d")
+    days = (datetime.strptime(latest, "%Y-%m-%d") - first).days + 1
+    step = max(1, math.ceil(days / max_departures))
+    departures = [(first + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(0, max(days, 1), step)]
+    lengths = [n for n in range(length_days - length_flex, length_days + length_flex + 1) if n >= 1]
+    return departures, lengths
+
+
+def _return_date(depart_date: str, length_days: int) -> str:
+    return (datetime.strptime(depart_date, "%Y-%m-%d") + timedelta(days=length_days)).strftime("%Y-%m-%d")
+
+
+@ttl_cache(30 * 60, stale_ttl=6 * 60 * 60)
+def cell_fare(origin: str, destination: str, depart_date: str, return_date: str, adults: int = 1):
+    """Cheapest round-trip fare for one date pair: {"price_usd", "price", "currency"}, or None."""
+    offers = [o for o in fetch_flight_offers(origin, destination, depart_date, return_date, adults, FARE_CELL_RESULTS)
+              if isinstance(o, dict) and not o.get("error")]
+    prices = convert_many([o.get("price") for o in offers], [o.get("currency") for o in offers])
+    priced = [(usd, o) for usd, o in zip(prices, offers) if usd is not None]
+    if not priced:
+        return None
+    usd, offer = min(priced, key=lambda p: p[0])
+    return {"price_usd": usd, "price": offer.get("price"), "currency": offer.get("currency")}
+
+
+def _cell_or_none(origin, destination, depart_date, return_date, adults):
+    try:
+        fare = cell_fare(origin, destination, depart_date, return_date, adults)
+    except Exception:
+        fare = None
+    FARE_CELLS.inc(outcome="priced" if fare else "missing")
+    return fare["price_usd"] if fare else None
+
+
+def _matrix_from_flight_dates(origin, destination, departures, lengths):
+    """The matrix filled from the cheapest-date endpoint, or None if it had nothing."""
+    results = search_flight_dates(origin, destination, departures[0], departures[-1], min(lengths), max(lengths))
+    prices = {}
+    for item in results:
+        if item.get("error") or not item.get("depart_date") or not item.get("return_date"):
+            continue
+        length = (datetime.strptime(item["return_date"], "%Y-%m-%d")
+                  - datetime.strptime(item["depart_date"], "%Y-%m-%d")).days
+        prices[(item["depart_date"], length)] = convert(item.get("price"), item.get("currency"))
+    matrix = [[prices.get((d, n)) for n in lengths] for d in departures]
+    return matrix if any(p is not None for row in matrix for p in row) else None
+
+
+def _matrix_from_grid(origin, destination, departures, lengths, adults):
+    with ThreadPoolExecutor(max_workers=FARE_GRID_WORKERS) as pool:
+        futures = [[submit_in_context(pool, _cell_or_none, origin, destination, d, _return_date(d, n), adults)
+                    for n in lengths] for d in departures]
+        return [[f.result() for f in row] for row in futures]
+
+
+def fare_calendar(origin: str, destination: str, earliest: str, latest: str, length_days: int,
+                  adults: int = 1, length_flex: int = LENGTH_FLEX_DAYS) -> dict:
+    """
+    Price matrix (USD, None where no fare was found) for departures in
+    [earliest, latest] and trip lengths around length_days, plus the
+    cheapest window:
+        {"source": "flight-dates" | "grid", "depart_dates": [...], "lengths_days": [...],
+         "matrix": [[...]], "currency": "USD",
+         "cheapest": {"depart_date", "return_date", "length_days", "price_usd"} or None}
+    """
+    source, matrix = "flight-dates", None
+    if USE_FLIGHT_DATES:
+        # One call covers every day of the window, so nothing is sampled
+        departures, lengths = date_grid(earliest, latest, length_days, length_flex, max_departures=366)
+        matrix = _matrix_from_flight_dates(origin, destination, departures, lengths)
+    if matrix is None:
+        source = "grid"
+        departures, lengths = date_grid(earliest, latest, length_days, length_flex)
+        matrix = _matrix_from_grid(origin, destination, departures, lengths, adults)
+    FARE_CALENDARS.inc(source=source)
+
+    cheapest = None
+    for depart, row in zip(departures, matrix):
+        for length, price in zip(lengths, row):
+            if price is not None and (cheapest is None or price < cheapest["price_usd"]):
+                cheapest = {"depart_date": depart, "return_date": _return_date(depart, length),
+                            "length_days": length, "price_usd": price}
+    return {
+        "source": source,
+        "depart_dates": departures,
+        "lengths_days": lengths,
+        "matrix": matrix,
+        "currency": "USD",
+        "cheapest": cheapest,
+    }
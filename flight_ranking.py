@@ -0,0 +1,175 @@
+"""
+Local ranking of Amadeus flight offers.
+
+Offers are parsed once into numeric columns: price in USD, total duration
+in minutes, stops, outbound departure hour, and a red-eye flag. Hard
+preferences filter the rows. The Pareto frontier on (price, duration, stops)
+is computed, and each row gets a weighted score from min-max normalised
+columns. Only the top-K offers go downstream.
+
+Preferences (all optional):
+    {"no_red_eye": True, "max_stops": 0, "max_price": 300, "depart_after": 8,
+     "depart_before": 20, "weights": {"price": 0.6, "duration": 0.3, "stops": 0.1}}
+preferences_from_text() derives them from the user's request.
+"""
+import re
+
+from currency import convert_many
+
+DEFAULT_WEIGHTS = {"price": 0.6, "duration": 0.3, "stops": 0.1}
+# Outbound departures in [RED_EYE_START, 24) or [0, RED_EYE_END) count as red-eyes
+RED_EYE_START = 22
+RED_EYE_END = 5
+DEFAULT_TOP_K = 3
+
+_DURATION_RE = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?")
+
+
+def parse_duration(text: str):
+    """ISO 8601 duration ('PT2H10M', 'P1DT3H') in minutes, or None."""
+    match = _DURATION_RE.fullmatch(text or "")
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes = (int(g or 0) for g in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def _departure_hour(itinerary: dict):
+    segments = itinerary.get("segments") or []
+    at = (segments[0].get("departure") or {}).get("at", "") if segments else ""
+    return int(at[11:13]) if len(at) >= 13 and at[11:13].isdigit() else None
+
+
+def offer_columns(offers: list) -> dict:
+    """Numeric columns (one entry per offer); unknown values are None."""
+    itineraries = [o.get("itineraries") or [] for o in offers]
+    durations = []
+    for its in itineraries:
+        parts = [parse_duration(it.get("duration")) for it in its]
+        durations.append(sum(parts) if parts and None not in parts else None)
+    depart_hours = [_departure_hour(its[0]) if its else None for its in itineraries]
+    return {
+        "price": convert_many([_to_float(o.get("price")) for o in offers], [o.get("currency") for o in offers]),
+        "duration": durations,
+        "stops": [sum(max(len(it.get("segments") or []) - 1, 0) for it in its) if its else None
+                  for its in itineraries],
+        "depart_hour": depart_hours,
+        "red_eye": [any(_is_red_eye(_departure_hour(it)) for it in its) for its in itineraries],
+    }
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_red_eye(hour) -> bool:
+    return hour is not None and (hour >= RED_EYE_START or hour < RED_EYE_END)
+
+
+def preferences_from_text(text: str) -> dict:
+    """Flight preferences stated in a free-text request."""
+    text = (text or "").lower()
+    prefs = {}
+    if re.search(r"no red[- ]?eyes?|avoid red[- ]?eyes?|no overnight flights?", text):
+        prefs["no_red_eye"] = True
+    if re.search(r"non[- ]?stop|direct flights?|no (?:stops|layovers|connections)", text):
+        prefs["max_stops"] = 0
+    elif re.search(r"(?:at most|max(?:imum)?) (?:one|1) (?:stop|layover)", text):
+        prefs["max_stops"] = 1
+    if re.search(r"morning flights?", text):
+        prefs["depart_after"], prefs["depart_before"] = 5, 12
+    elif re.search(r"evening flights?", text):
+        prefs["depart_after"], prefs["depart_before"] = 17, 23
+    weights = dict(DEFAULT_WEIGHTS)
+    if re.search(r"cheapest|lowest price|as cheap as", text):
+        weights.update(price=0.8, duration=0.15, stops=0.05)
+    elif re.search(r"fastest|quickest|shortest", text):
+        weights.update(price=0.25, duration=0.6, stops=0.15)
+    if weights != DEFAULT_WEIGHTS:
+        prefs["weights"] = weights
+    return prefs
+
+
+def _passes(row: dict, prefs: dict) -> bool:
+    if prefs.get("no_red_eye") and row["red_eye"]:
+        return False
+    if prefs.get("max_stops") is not None and row["stops"] is not None and row["stops"] > prefs["max_stops"]:
+        return False
+    if prefs.get("max_price") is not None and row["price"] is not None and row["price"] > prefs["max_price"]:
+        return False
+    hour = row["depart_hour"]
+    if hour is not None:
+        if prefs.get("depart_after") is not None and hour < prefs["depart_after"]:
+            return False
+        if prefs.get("depart_before") is not None and hour >= prefs["depart_before"]:
+            return False
+    return True
+
+
+def pareto_front(rows: list, keys=("price", "duration", "stops")) -> set:
+    """Indexes of rows not dominated on `keys` (lower is better; None counts as worst)."""
+    def vector(row):
+        return tuple(float("inf") if row[k] is None else row[k] for k in keys)
+
+    ordered = sorted(rows, key=vector)
+    front, front_vectors = set(), []
+    for row in ordered:
+        v = vector(row)
+        # Sorted lexicographically, so only earlier rows can dominate this one
+        if not any(all(a <= b for a, b in zip(f, v)) and f != v for f in front_vectors):
+            front.add(row["index"])
+            front_vectors.append(v)
+    return front
+
+
+def _normalised(values: list) -> list:
+    known = [v for v in values if v is not None]
+    if not known:
+        return [0.0] * len(values)
+    low, high = min(known), max(known)
+    span = (high - low) or 1.0
+    return [1.0 if v is None else (v - low) / span for v in values]
+
+
+def rank_offers(offers: list, preferences: dict = None, top_k: int = DEFAULT_TOP_K, columns: dict = None) -> list:
+    """
+    The top_k offers by weighted score, Pareto-optimal ones first, each
+    annotated with its numeric features. Error entries pass through
+    unchanged. If the hard preferences exclude every offer, they are
+    relaxed rather than returning nothing.
+    columns: offer_columns(offers) computed earlier (offers must then
+    contain no error entries).
+    """
+    valid = [o for o in offers or [] if isinstance(o, dict) and not o.get("error")]
+    if not valid:
+        return offers
+    prefs = preferences or {}
+    if columns is None or len(valid) != len(offers):
+        columns = offer_columns(valid)
+    rows = [{"index": i, **{name: col[i] for name, col in columns.items()}} for i in range(len(valid))]
+
+    candidates = [row for row in rows if _passes(row, prefs)] or rows
+    weights = prefs.get("weights") or DEFAULT_WEIGHTS
+    scores = [0.0] * len(candidates)
+    for name, weight in weights.items():
+        for i, value in enumerate(_normalised([row[name] for row in candidates])):
+            scores[i] += weight * value
+    front = pareto_front(candidates)
+
+    ranked = sorted(zip(candidates, scores), key=lambda rs: (rs[0]["index"] not in front, rs[1]))
+    result = []
+    for row, score in ranked[:top_k]:
+        offer = dict(valid[row["index"]])
+        offer.update(
+            price_usd=row["price"],
+            total_duration_minutes=row["duration"],
+            stops=row["stops"],
+            red_eye=row["red_eye"],
+            pareto_optimal=row["index"] in front,
+            score=round(score, 4),
+        )
+        result.append(offer)
+    return result
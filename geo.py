@@ -0,0 +1,46 @@
+"""
+Bundled city gazetteer (data/cities.json) and great-circle distances.
+
+Lookups are local and case-insensitive. Cities the gazetteer doesn't know
+give None, and callers fall back to their previous behaviour.
+"""
+import json
+import math
+import os
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.json")
+EARTH_RADIUS_KM = 6371.0
+
+_gazetteer = {}
+
+
+def load_gazetteer(path: str = GAZETTEER_FILE) -> dict:
+    """{lowercased city name: {"name", "lat", "lon", "country", "iata"}}, loaded once."""
+    if not _gazetteer:
+        with open(path, "r", encoding="utf-8") as f:
+            cities = json.load(f)["cities"]
+        _gazetteer.update({name.lower(): dict(entry, name=name) for name, entry in cities.items()})
+    return _gazetteer
+
+
+def city_info(city: str):
+    """Gazetteer entry for a city name, or None."""
+    if not isinstance(city, str):
+        return None
+    return load_gazetteer().get(city.strip().lower())
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def distance_km(city_a: str, city_b: str):
+    """Great-circle distance between two gazetteer cities, or None if either is unknown."""
+    a, b = city_info(city_a), city_info(city_b)
+    if a is None or b is None:
+        return None
+    return haversine_km(a["lat"], a["lon"], b["lat"], b["lon"])
@@ -0,0 +1,344 @@
+"""
+Background trip-planning jobs.
+
+POST /plan_trip/jobs queues a request and returns a job id right away. A
+pool of worker threads runs TravelBuddyCoordinator.handle_request for
+queued jobs. Clients poll GET /plan_trip/jobs/{id} for progress and partial
+results, or pass a webhook_url that receives the finished job as a POST.
+
+The queue/state backend is pluggable (JobStore):
+    TRAVELBUDDY_JOB_STORE=sqlite   persisted in TRAVELBUDDY_JOB_DB and shared by
+                                   every worker process on the node (default);
+                                   a running job whose claim expires (its
+                                   process died) is re-queued
+    TRAVELBUDDY_JOB_STORE=memory   in-process, lost on restart; only for a
+                                   single worker process
+"""
+import ipaddress
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+
+from coordinator import TravelBuddyCoordinator
+from telemetry import counter
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JOB_STORE = os.getenv("TRAVELBUDDY_JOB_STORE", "sqlite")
+JOB_DB_FILE = os.getenv(
+    "TRAVELBUDDY_JOB_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.sqlite3"),
+)
+JOB_WORKERS = int(os.getenv("TRAVELBUDDY_JOB_WORKERS", "4"))
+# Jobs don't hold an HTTP connection open, so they get a longer deadline than /plan_trip
+JOB_SLO_SECONDS = float(os.getenv("TRAVELBUDDY_JOB_SLO_SECONDS", "120"))
+# A running job not updated (claimed or a stage finished) for this long
+# belongs to a dead process and is queued again
+JOB_CLAIM_TTL_S = float(os.getenv("TRAVELBUDDY_JOB_CLAIM_TTL_S", str(2 * JOB_SLO_SECONDS)))
+# Finished jobs are dropped after this long
+JOB_RETENTION_S = int(os.getenv("TRAVELBUDDY_JOB_RETENTION_S", str(24 * 60 * 60)))
+WEBHOOK_TIMEOUT_S = 10
+WEBHOOK_ATTEMPTS = 3
+# Comma-separated host names webhooks may go to; empty means any public host
+WEBHOOK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("TRAVELBUDDY_WEBHOOK_HOSTS", "").split(",") if h.strip()}
+
+# Stages reported by handle_request, in order, for the progress indicator
+STAGES = ["trip_plan", "bookings", "safety", "budget"]
+
+JOBS = counter("travelbuddy_jobs_total", "Background jobs by final status.")
+WEBHOOKS = counter("travelbuddy_job_webhooks_total", "Webhook deliveries by outcome.")
+
+
+def _new_job(request: dict, webhook_url: str = None) -> dict:
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "request": request,
+        "webhook_url": webhook_url,
+        "progress": {"completed": [], "total": len(STAGES)},
+        "partial_result": {},
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class JobStore:
+    """Queue plus job state. Implementations must be safe across threads."""
+
+    def submit(self, request: dict, webhook_url: str = None) -> dict:
+        raise NotImplementedError
+
+    def get(self, job_id: str):
+        """The job dict, or None if unknown (or purged)."""
+        raise NotImplementedError
+
+    def claim(self, timeout: float):
+        """Mark the oldest queued job running and return it; None if none came within timeout."""
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields):
+        raise NotImplementedError
+
+    def purge(self, older_than: float):
+        """Drop finished jobs last updated before `older_than` (epoch seconds)."""
+        raise NotImplementedError
+
+
+class InMemoryJobStore(JobStore):
+    def __init__(self):
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+    def submit(self, request: dict, webhook_url: str = None) -> dict:
+        job = _new_job(request, webhook_url)
+        with self._lock:
+            self._jobs[job["id"]] = job
+        self._queue.put(job["id"])
+        return json.loads(json.dumps(job, default=str))
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # Copy, so callers never see a half-applied update
+            return json.loads(json.dumps(job, default=str)) if job else None
+
+    def claim(self, timeout: float):
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.update(job_id, status=RUNNING)
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def purge(self, older_than: float):
+        with self._lock:
+            for job_id in [k for k, j in self._jobs.items()
+                           if j["status"] in (SUCCEEDED, FAILED) and j["updated_at"] < older_than]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs in one SQLite table; JSON columns hold the request and results."""
+
+    JSON_FIELDS = ("request", "progress", "partial_result", "result")
+    POLL_SECONDS = 0.5
+
+    def __init__(self, path: str = JOB_DB_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT, webhook_url TEXT,
+                    progress TEXT, partial_result TEXT, result TEXT, error TEXT,
+                    created_at REAL, updated_at REAL
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(row)
+        for field in self.JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def submit(self, request: dict, webhook_url: str = None) -> dict:
+        job = _new_job(request, webhook_url)
+        row = {k: json.dumps(v, default=str) if k in self.JSON_FIELDS else v for k, v in job.items()}
+        columns = ", ".join(row)
+        self._connect().execute(f"INSERT INTO jobs ({columns}) VALUES ({', '.join('?' * len(row))})",
+                                list(row.values()))
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id: str):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        db = self._connect()
+        while True:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # The process running these died (other processes' live jobs are left alone)
+                db.execute("UPDATE jobs SET status = ? WHERE status = ? AND updated_at < ?",
+                           (QUEUED, RUNNING, time.time() - JOB_CLAIM_TTL_S))
+                row = db.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                                 (QUEUED,)).fetchone()
+                if row:
+                    db.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                               (RUNNING, time.time(), row["id"]))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            if row:
+                return self.get(row["id"])
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return None
+            # Woken early by a submit from this process; other processes are polled
+            self._wakeup.wait(min(left, self.POLL_SECONDS))
+            self._wakeup.clear()
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        values = [json.dumps(v, default=str) if k in self.JSON_FIELDS else v for k, v in fields.items()]
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        self._connect().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", values + [job_id])
+
+    def purge(self, older_than: float):
+        self._connect().execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                                (SUCCEEDED, FAILED, older_than))
+
+
+def make_store(kind: str = JOB_STORE) -> JobStore:
+    if kind == "memory":
+        return InMemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore(JOB_DB_FILE)
+    raise ValueError(f"Unknown job store: {kind}")
+
+
+def webhook_url_error(url: str):
+    """
+    Why `url` can't be a webhook, or None. Only http(s) URLs whose host
+    resolves to public addresses (or is in TRAVELBUDDY_WEBHOOK_HOSTS) are
+    allowed, so jobs can't be used to reach loopback, link-local (cloud
+    metadata) or private-network services.
+    """
+    parts = urlsplit(url or "")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "webhook_url must be an http(s) URL"
+    host = parts.hostname.lower()
+    if WEBHOOK_ALLOWED_HOSTS:
+        return None if host in WEBHOOK_ALLOWED_HOSTS else "webhook_url host is not allowed"
+    try:
+        infos = socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError):
+        return "webhook_url host does not resolve"
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            return "webhook_url must point to a public address"
+    return None
+
+
+def notify_webhook(job: dict):
+    """POST the finished job to its webhook_url, with a few jittered retries."""
+    payload = {k: job.get(k) for k in ("id", "status", "result", "error")}
+    for attempt in range(WEBHOOK_ATTEMPTS):
+        # Checked again at delivery: DNS may have changed since submit
+        error = webhook_url_error(job["webhook_url"])
+        if error:
+            logging.warning(f"Webhook for job {job['id']} not sent: {error}")
+            WEBHOOKS.inc(outcome="blocked")
+            return
+        try:
+            resp = requests.post(job["webhook_url"], json=payload, timeout=WEBHOOK_TIMEOUT_S,
+                                 allow_redirects=False)
+            if resp.status_code < 500:
+                WEBHOOKS.inc(outcome="delivered" if resp.status_code < 400 else "rejected")
+                return
+        except requests.RequestException as e:
+            logging.warning(f"Webhook for job {job['id']} failed: {e}")
+        time.sleep(random.uniform(0, 2 ** attempt))
+    WEBHOOKS.inc(outcome="failed")
+
+
+class JobWorkerPool:
+    """Daemon threads that claim queued jobs from a store and run them."""
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self):
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.time() - last_purge > 60:
+                    self.store.purge(time.time() - JOB_RETENTION_S)
+                    last_purge = time.time()
+                job = self.store.claim(timeout=1.0)
+            except Exception:
+                logging.exception("Job store unavailable")
+                time.sleep(1.0)
+                continue
+            if job is not None:
+                self.run(job)
+
+    def run(self, job: dict):
+        request = job["request"]
+        completed, partial = [], {}
+
+        def progress(stage, data):
+            completed.append(stage)
+            partial[stage] = data
+            self.store.update(job["id"], progress={"completed": list(completed), "total": len(STAGES)},
+                              partial_result=partial)
+
+        try:
+            coordinator = TravelBuddyCoordinator(user_id=request.get("user_id", "default_user"))
+            result = coordinator.handle_request(
+                request["request"], request.get("budget", 1000.0), deadline_s=JOB_SLO_SECONDS,
+                mode=request.get("mode", "sequential"), progress=progress,
+            )
+            self.store.update(job["id"], status=SUCCEEDED, result=result)
+        except Exception as e:
+            logging.exception(f"Job {job['id']} failed")
+            self.store.update(job["id"], status=FAILED, error=str(e))
+        finished = self.store.get(job["id"])
+        JOBS.inc(status=finished["status"] if finished else FAILED)
+        if finished and finished.get("webhook_url"):
+            notify_webhook(finished)
@@ -1,17 +1,97 @@
-from fastapi import FastAPI
+import json
+from typing import Literal
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import agent_client
+import context_cache
+from batch_planner import DEFAULT_WORKERS, MAX_WORKERS, parse_jsonl, plan_batch
 from coordinator import TravelBuddyCoordinator
+from currency import start_refresh_scheduler
+from jobs import JobWorkerPool, make_store, webhook_url_error
+from telemetry import render_prometheus
 
 app = FastAPI()
 
+job_store = make_store()
+job_workers = JobWorkerPool(job_store)
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    start_refresh_scheduler()
+    job_workers.start()
+
+
+@app.on_event("shutdown")
+def release_gemini_caches():
+    # Stop paying storage for cached system instructions nobody will use
+    context_cache.delete_all(agent_client.client)
+    job_workers.stop()
+
+
 class TripRequest(BaseModel):
     user_id: str = "default_user"
     request: str
     budget: float = 1000.0
+    # Unknown modes are rejected with 422 instead of failing in handle_request
+    mode: Literal["sequential", "fused"] = "sequential"
 
 
 @app.post("/plan_trip")
 def plan_trip(body: TripRequest):
     coordinator = TravelBuddyCoordinator(user_id=body.user_id)
-    result = coordinator.handle_request(body.request, body.budget)
-    return result
\ No newline at end of file
+    result = coordinator.handle_request(body.request, body.budget, mode=body.mode)
+    return result
+
+
+class JobRequest(TripRequest):
+    webhook_url: str = None
+
+
+@app.post("/plan_trip/jobs", status_code=202)
+def submit_plan_trip_job(body: JobRequest):
+    """
+    Queue a trip plan and return its job id right away. Poll
+    GET /plan_trip/jobs/{job_id}, or give a webhook_url to be POSTed the
+    finished job.
+    """
+    error = webhook_url_error(body.webhook_url) if body.webhook_url else None
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    request = {"user_id": body.user_id, "request": body.request, "budget": body.budget, "mode": body.mode}
+    job = job_store.submit(request, webhook_url=body.webhook_url)
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/plan_trip/jobs/{job['id']}"}
+
+
+@app.get("/plan_trip/jobs/{job_id}")
+def get_plan_trip_job(job_id: str):
+    """Status, progress (completed stages) and partial or final result of a job."""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    job.pop("webhook_url", None)
+    return job
+
+
+@app.post("/plan_trips")
+async def plan_trips(request: Request, workers: int = Query(DEFAULT_WORKERS, ge=1, le=MAX_WORKERS),
+                     gemini_batch: bool = False):
+    """
+    Batch planning: the request body is JSONL (one trip request per line),
+    the response streams one JSON result per line as trips finish.
+    """
+    items = parse_jsonl((await request.body()).splitlines())
+
+    def stream():
+        for record in plan_batch(items, workers=workers, gemini_batch=gemini_batch):
+            yield json.dumps(record, default=str) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage latencies, Gemini tokens, cache hit ratios."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
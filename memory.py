@@ -1,8 +1,12 @@
 import json
 import os
+import threading
 
 MEMORY_FILE = "user_memory.json"
 
+# Batch planning updates memory from several threads at once
+_memory_lock = threading.Lock()
+
 def load_memory():
     """Load all user memory from the JSON file (or return empty dict if not found)."""
     if not os.path.exists(MEMORY_FILE):
@@ -22,8 +26,9 @@ def get_user_preferences(user_id: str):
 
 def update_user_preferences(user_id: str, new_prefs: dict):
     """Merge new_prefs into the user's existing preferences and save."""
-    memory = load_memory()
-    if user_id not in memory:
-        memory[user_id] = {"preferences": {}}
-    memory[user_id]["preferences"].update(new_prefs)
-    save_memory(memory)
+    with _memory_lock:
+        memory = load_memory()
+        if user_id not in memory:
+            memory[user_id] = {"preferences": {}}
+        memory[user_id]["preferences"].update(new_prefs)
+        save_memory(memory)
@@ -0,0 +1,124 @@
+"""
+Per-agent Gemini model selection with a validation cascade.
+
+Each agent has a chain of models, cheapest first. The router calls the first
+model and only escalates to the next one when the output fails the agent's
+schema check. Call errors are not escalated: a pricier model would only
+repeat a timeout or outage (transient errors surface as Unavailable once
+ask_gemini's retries are spent, so the agents degrade). Override a chain with TRAVELBUDDY_MODELS_<AGENT>, e.g.
+    TRAVELBUDDY_MODELS_BOOKING=gemini-2.0-flash-lite-001,gemini-2.0-flash-001
+"""
+import os
+import time
+
+from agent_client import ask_gemini, ask_gemini_stream, is_transient
+from resilience import Unavailable
+from stream_json import IncrementalJSONParser
+from telemetry import counter, histogram
+from utils import cleanup_json
+
+DEFAULT_AGENT_MODELS = {
+    "planner": ["gemini-2.0-flash-001", "gemini-2.5-flash"],
+    "booking": ["gemini-2.0-flash-lite-001", "gemini-2.0-flash-001"],
+    "safety": ["gemini-2.0-flash-001", "gemini-2.5-flash"],
+    "budget": ["gemini-2.0-flash-lite-001", "gemini-2.0-flash-001"],
+    "fused": ["gemini-2.0-flash-001", "gemini-2.5-flash"],
+}
+
+# Keys an agent's JSON output must contain (and their expected types)
+AGENT_SCHEMAS = {
+    "planner": {"city": list, "days": (int, float, str), "daily_plan": list},
+    "booking": {"hotels": list, "activities": list},
+    "safety": {"overall_risk": str, "city_safety_notes": list},
+    "budget": {"adjustments": list},
+    "fused": {"bookings": dict, "safety": dict, "budget": dict},
+}
+
+ROUTE_SECONDS = histogram("travelbuddy_llm_route_seconds", "Gemini latency per agent and model.")
+ROUTE_CALLS = counter("travelbuddy_llm_route_calls_total", "Routed Gemini calls per agent, model and outcome.")
+
+
+def models_for(agent: str) -> list:
+    override = os.getenv(f"TRAVELBUDDY_MODELS_{agent.upper()}")
+    if override:
+        return [m.strip() for m in override.split(",") if m.strip()]
+    return DEFAULT_AGENT_MODELS.get(agent, [DEFAULT_AGENT_MODELS["planner"][0]])
+
+
+def validate_output(agent: str, parsed) -> bool:
+    """True if the parsed output has every key of the agent's schema."""
+    schema = AGENT_SCHEMAS.get(agent)
+    if schema is None:
+        return True
+    if not isinstance(parsed, dict):
+        return False
+    return all(isinstance(parsed.get(key), expected) for key, expected in schema.items())
+
+
+def route_gemini(agent: str, prompt: str, system: str = None) -> str:
+    """
+    Ask the agent's cheapest model first; escalate along the chain when the
+    output doesn't validate. Returns the raw text of the accepted (or last) answer.
+    `system` is the agent's static instruction (context-cached per model).
+    """
+    return _route(agent, prompt, system, models_for(agent))
+
+
+def _call_failed(agent: str, model: str, error: Exception):
+    """Count a failed call and raise what the agents should see."""
+    ROUTE_CALLS.inc(agent=agent, model=model, outcome="error")
+    if isinstance(error, Unavailable):
+        raise error
+    if is_transient(error):
+        raise Unavailable(f"gemini: {error}") from error
+    raise error
+
+
+def _route(agent: str, prompt: str, system: str, chain: list) -> str:
+    raw = ""
+    for index, model in enumerate(chain):
+        start = time.perf_counter()
+        try:
+            raw = ask_gemini(prompt, model=model, system=system)
+        except Exception as e:
+            _call_failed(agent, model, e)
+        ROUTE_SECONDS.observe(time.perf_counter() - start, agent=agent, model=model)
+        if validate_output(agent, cleanup_json(raw)):
+            ROUTE_CALLS.inc(agent=agent, model=model, outcome="accepted")
+            return raw
+        outcome = "escalated" if index < len(chain) - 1 else "invalid"
+        ROUTE_CALLS.inc(agent=agent, model=model, outcome=outcome)
+    return raw
+
+
+def route_gemini_stream(agent: str, prompt: str, system: str = None, on_field=None) -> str:
+    """
+    route_gemini with the first model's answer streamed: on_field(key, value)
+    is called as each top-level JSON field completes, so callers can start
+    work before the whole answer is in. An invalid answer escalates (not
+    streamed) along the rest of the chain; a failed stream does not.
+    """
+    chain = models_for(agent)
+    model = chain[0]
+    parser = IncrementalJSONParser()
+    parts = []
+    start = time.perf_counter()
+    try:
+        for text in ask_gemini_stream(prompt, model=model, system=system):
+            parts.append(text)
+            if on_field is not None:
+                for key, value in parser.feed(text):
+                    on_field(key, value)
+    except Exception as e:
+        _call_failed(agent, model, e)
+    ROUTE_SECONDS.observe(time.perf_counter() - start, agent=agent, model=model)
+
+    raw = "".join(parts)
+    if validate_output(agent, cleanup_json(raw)):
+        ROUTE_CALLS.inc(agent=agent, model=model, outcome="accepted")
+        return raw
+    if len(chain) == 1:
+        ROUTE_CALLS.inc(agent=agent, model=model, outcome="invalid")
+        return raw
+    ROUTE_CALLS.inc(agent=agent, model=model, outcome="escalated")
+    return _route(agent, prompt, system, chain[1:])
@@ -0,0 +1,110 @@
+"""
+Flight offer store: one large Amadeus page per route and dates, many local queries.
+
+The first query for a route/date pair fetches up to OFFER_PAGE_SIZE offers.
+They are kept in compact form: only the fields ranking and display need, with
+the numeric columns from flight_ranking precomputed. Later queries for the
+same trip are answered from the cached page, with different filters and
+weights ("cheaper", "nonstop only", "leave after 9am") and no further
+Amadeus calls. The page goes through ttl_cache, so it is single-flight and
+lives in the shared cache tier too.
+
+The cheapest fare and shortest duration seen per route are also kept
+(known_fare), so planning steps like route_optimizer can use real prices
+without making a search.
+"""
+import threading
+import time
+
+from amadeus_api import fetch_flight_offers
+from cache_utils import ttl_cache
+from flight_ranking import DEFAULT_TOP_K, offer_columns, rank_offers
+
+# Amadeus' maximum page size for flight-offers
+OFFER_PAGE_SIZE = 250
+
+_SEGMENT_KEYS = ("carrierCode", "number", "numberOfStops")
+
+# known_fare entries older than this are ignored
+KNOWN_FARE_TTL = 6 * 60 * 60
+
+# (origin, destination) -> {"price_usd", "minutes", "seen_at"}, one way
+_known_fares = {}
+_known_fares_lock = threading.Lock()
+
+
+def compact_offer(offer: dict) -> dict:
+    """The parts of an Amadeus offer that ranking and the response use."""
+    raw = offer.get("raw") or {}
+    itineraries = []
+    for itinerary in offer.get("itineraries") or []:
+        segments = []
+        for segment in itinerary.get("segments") or []:
+            compact = {k: segment[k] for k in _SEGMENT_KEYS if k in segment}
+            for end in ("departure", "arrival"):
+                place = segment.get(end) or {}
+                compact[end] = {"iataCode": place.get("iataCode"), "at": place.get("at")}
+            segments.append(compact)
+        itineraries.append({"duration": itinerary.get("duration"), "segments": segments})
+    return {
+        "id": raw.get("id"),
+        "price": offer.get("price"),
+        "currency": offer.get("currency"),
+        "seats": raw.get("numberOfBookableSeats"),
+        "last_ticketing_date": raw.get("lastTicketingDate"),
+        "itineraries": itineraries,
+    }
+
+
+@ttl_cache(15 * 60, stale_ttl=6 * 60 * 60)
+def offer_page(origin: str, destination: str, depart_date: str, return_date: str = None, adults: int = 1):
+    """
+    {"offers": [compact offers], "columns": {name: [values]}} for the route,
+    or [{"error": ...}] (not cached) if the search failed.
+    """
+    offers = fetch_flight_offers(origin, destination, depart_date, return_date, adults, OFFER_PAGE_SIZE)
+    valid = [o for o in offers if isinstance(o, dict) and not o.get("error")]
+    if not valid:
+        return offers or [{"error": "No flight offers found"}]
+    compact = [compact_offer(o) for o in valid]
+    return {"offers": compact, "columns": offer_columns(compact)}
+
+
+def find_offers(origin: str, destination: str, depart_date: str, return_date: str = None, adults: int = 1,
+                preferences: dict = None, top_k: int = DEFAULT_TOP_K) -> list:
+    """
+    The best top_k offers for the route under `preferences` (see
+    flight_ranking), served from the cached page when there is one.
+    """
+    page = offer_page(origin, destination, depart_date, return_date, adults)
+    if not isinstance(page, dict):
+        return page
+    _remember_fare(origin, destination, page["columns"], legs=2 if return_date else 1)
+    return rank_offers(page["offers"], preferences, top_k=top_k, columns=page["columns"])
+
+
+def _remember_fare(origin: str, destination: str, columns: dict, legs: int):
+    prices = [p for p in columns["price"] if p is not None]
+    durations = [d for d in columns["duration"] if d is not None]
+    if not prices:
+        return
+    with _known_fares_lock:
+        _known_fares[(origin, destination)] = {
+            "price_usd": round(min(prices) / legs, 2),
+            "minutes": min(durations) / legs if durations else None,
+            "seen_at": time.time(),
+        }
+
+
+def known_fare(origin: str, destination: str):
+    """
+    The cheapest one-way fare (USD) and shortest flight time (minutes) seen
+    recently between two IATA codes, in either direction; None if neither
+    direction has been searched.
+    """
+    with _known_fares_lock:
+        for key in ((origin, destination), (destination, origin)):
+            fare = _known_fares.get(key)
+            if fare and time.time() - fare["seen_at"] < KNOWN_FARE_TTL:
+                return dict(fare)
+    return None
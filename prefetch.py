@@ -0,0 +1,129 @@
+"""
+Speculative tool prefetch while the TripPlannerAgent is still generating.
+
+The raw request usually names the destinations already ("7 days in Paris and
+Berlin in March"). A fast local parser picks out known cities and the travel
+dates, and the tool lookups the agents will make later are started right
+away, in parallel with the planner call.
+
+Nothing is handed over explicitly. The lookups go through the tools' TTL
+caches, and those are single-flight. When the plan confirms a city, the
+agent's own call joins the in-flight lookup or gets the cached result. When
+it doesn't, the speculative result just stays in the cache.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from agents import CITY_TO_COUNTRY, BookingAgent
+from amadeus_api import city_to_iata, get_city_hotel_ids
+from budget_engine import NIGHTLY_HOTEL_COST
+from country_info_api import get_country_info
+from date_utils import extract_dates_from_text
+from geo import city_info
+from rate_limiter import BATCH, priority_scope
+import route_optimizer
+from telemetry import counter
+from utils import submit_in_context
+from weather_api import FORECAST_HORIZON_DAYS, get_forecast
+
+PREFETCH_ENABLED = os.getenv("TRAVELBUDDY_PREFETCH", "1") == "1"
+# Cities the local parser recognises
+KNOWN_CITIES = sorted(set(NIGHTLY_HOTEL_COST) | set(CITY_TO_COUNTRY))
+# Don't speculate on more cities than this per request
+MAX_SPECULATIVE_CITIES = 4
+
+_CITY_RE = re.compile(r"\b(" + "|".join(re.escape(c) for c in KNOWN_CITIES) + r")\b", re.IGNORECASE)
+_canonical = {c.lower(): c for c in KNOWN_CITIES}
+
+# Shared by all requests; lookups are I/O bound
+_prefetch_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="prefetch")
+
+PREFETCH = counter("travelbuddy_prefetch_total",
+                   "Speculatively prefetched cities by outcome (confirmed/wasted) once the plan is known.")
+
+
+def candidate_cities(text: str) -> list:
+    """Known cities named in text, in order of first mention."""
+    found = []
+    for match in _CITY_RE.finditer(text or ""):
+        city = _canonical[match.group(1).lower()]
+        if city not in found:
+            found.append(city)
+    return found[:MAX_SPECULATIVE_CITIES]
+
+
+def _hotel_ids(city: str):
+    city_code = city_to_iata(city)
+    return get_city_hotel_ids(city_code) if city_code else []
+
+
+def _forecasts(cities: list, date_text: str):
+    # Trips beyond the forecast horizon use climate normals: nothing to fetch
+    depart_date, _ = extract_dates_from_text(date_text)
+    horizon_end = (datetime.utcnow() + timedelta(days=FORECAST_HORIZON_DAYS - 1)).strftime("%Y-%m-%d")
+    if depart_date <= horizon_end:
+        for city in cities:
+            get_forecast(city)
+
+
+def _flights(cities: list, date_text: str):
+    # Date parsing is slow-ish, so it runs here rather than ahead of the planner.
+    # Flexible requests warm the fare calendar cells too.
+    plan = {"city": list(cities), "user_request": date_text}
+    if route_optimizer.OPTIMIZE_ROUTE:
+        # Search the route the coordinator will book, not the mention order
+        plan = route_optimizer.optimize_plan(plan)
+    booking = BookingAgent()
+    route = booking.route_transport(plan)
+    if route and not route["search_flights"]:
+        return []
+    # A guess: queue behind real requests for the Amadeus quota
+    with priority_scope(BATCH):
+        depart_date, return_date, _ = booking.choose_dates(plan)
+        return booking.search_flights(plan, depart_date, return_date)
+
+
+class Speculation:
+    """Lookups started for one request, checked against the plan later."""
+
+    def __init__(self, cities: list, futures: list):
+        self.cities = cities
+        self.futures = futures
+
+    def settle(self, trip_plan: dict):
+        """Record how much of the speculation the plan confirmed."""
+        planned = trip_plan.get("city") if isinstance(trip_plan, dict) else None
+        planned = planned if isinstance(planned, list) else []
+        for city in self.cities:
+            PREFETCH.inc(outcome="confirmed" if city in planned else "wasted")
+
+
+def start(user_request: str, date_text: str = None) -> Speculation:
+    """
+    Start weather, country, IATA, hotel-list and flight lookups for the
+    cities named in user_request. date_text is the text the BookingAgent
+    will parse dates from, so speculative flight searches hit the same
+    cache keys. Lookups run in the caller's context (deadline, priority);
+    flight searches always run at BATCH priority and are skipped when every
+    leg of the route is a ground leg.
+    """
+    return start_for_cities(candidate_cities(user_request), date_text or user_request)
+
+
+def start_for_cities(cities: list, date_text: str) -> Speculation:
+    """Start the lookups for a known list of cities (e.g. streamed from the planner)."""
+    futures = []
+    if cities:
+        futures.append(submit_in_context(_prefetch_pool, _forecasts, cities, date_text))
+    for city in cities:
+        country = (city_info(city) or {}).get("country") or CITY_TO_COUNTRY.get(city)
+        if country:
+            futures.append(submit_in_context(_prefetch_pool, get_country_info, country))
+    # Hotels are looked up for the first city; flights go first -> last city
+    if cities:
+        futures.append(submit_in_context(_prefetch_pool, _hotel_ids, cities[0]))
+    if len(cities) >= 2:
+        futures.append(submit_in_context(_prefetch_pool, _flights, cities, date_text))
+    return Speculation(cities, futures)
@@ -0,0 +1,192 @@
+"""
+Prompt templates with typed slots and per-slot token budgets.
+
+Templates are compiled once, at import time, into literal and slot parts.
+Rendering fills each slot through the serializer for its kind and then
+enforces the slot's token budget, so a runaway preferences dict or a huge
+bookings payload can't blow up prompt size or latency:
+
+    PLAN_PROMPT = PromptTemplate("planner", '''
+        User request:
+        {user_request}
+        ''', user_request=Slot("text", max_tokens=1500))
+    PLAN_PROMPT.render(user_request="5 days in Kyoto")
+
+Slot kinds:    "text" (str() of the value), "json" (compact JSON), "number"
+Strategies:    "truncate"  - cut the rendered text and mark the cut
+               "head_tail" - keep the start and end, drop the middle
+               "summarize" - shrink JSON structurally: long lists keep their
+                             first items plus an omitted-count marker, long
+                             strings inside are shortened; falls back to
+                             "truncate" if still too big
+"""
+import json
+import re
+import string
+import textwrap
+
+from telemetry import counter
+
+SLOT_KINDS = ("text", "json", "number")
+STRATEGIES = ("truncate", "head_tail", "summarize")
+TRUNCATION_MARK = " …[truncated]"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+PROMPT_TRUNCATIONS = counter("travelbuddy_prompt_truncations_total",
+                             "Prompt slots cut down to their token budget, by template and slot.")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: words and punctuation marks count
+    one token each and long words an extra token per 8 characters. Tracks
+    Gemini's count for English prose and JSON better than len/4.
+    """
+    if not text:
+        return 1
+    pieces = _TOKEN_RE.findall(text)
+    return max(1, len(pieces) + sum(len(p) // 8 for p in pieces if len(p) > 8))
+
+
+def _fit_chars(text: str, max_tokens: int, take) -> str:
+    """Longest text produced by take(n_chars) that fits in max_tokens."""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(take(mid)) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return take(low)
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(1, max_tokens - estimate_tokens(TRUNCATION_MARK))
+    return _fit_chars(text, budget, lambda n: text[:n]) + TRUNCATION_MARK
+
+
+def head_tail_text(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(2, max_tokens - estimate_tokens(TRUNCATION_MARK))
+    head = _fit_chars(text, budget // 2, lambda n: text[:n])
+    tail = _fit_chars(text, budget - budget // 2, lambda n: text[len(text) - n:])
+    return head + TRUNCATION_MARK + " " + tail
+
+
+def _compact(value) -> str:
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def _shrink(value, max_items: int, max_chars: int):
+    """Copy of value with lists cut to max_items and strings to max_chars."""
+    if isinstance(value, dict):
+        return {k: _shrink(v, max_items, max_chars) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_shrink(v, max_items, max_chars) for v in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"…{len(value) - max_items} more")
+        return items
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "…"
+    return value
+
+
+def summarize_json(value, max_tokens: int) -> str:
+    """Compact JSON of value, structurally reduced until it fits max_tokens."""
+    rendered = _compact(value)
+    if estimate_tokens(rendered) <= max_tokens:
+        return rendered
+    max_items, max_chars = 16, 400
+    while max_items >= 1:
+        rendered = _compact(_shrink(value, max_items, max_chars))
+        if estimate_tokens(rendered) <= max_tokens:
+            return rendered
+        max_items //= 2
+        max_chars = max(40, max_chars // 2)
+    return truncate_text(rendered, max_tokens)
+
+
+class Slot:
+    """A typed placeholder with a token budget."""
+
+    def __init__(self, kind: str = "text", max_tokens: int = 500, strategy: str = None, required: bool = True):
+        if kind not in SLOT_KINDS:
+            raise ValueError(f"Unknown slot kind: {kind}")
+        strategy = strategy or ("summarize" if kind == "json" else "truncate")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown slot strategy: {strategy}")
+        self.kind = kind
+        self.max_tokens = max_tokens
+        self.strategy = strategy
+        self.required = required
+
+    def fill(self, value) -> tuple:
+        """(rendered text, whether it had to be cut to the budget)."""
+        if self.kind == "number":
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise TypeError(f"number slot got {type(value).__name__}")
+            return str(value), False
+
+        if self.kind == "json":
+            if self.strategy == "summarize":
+                rendered = summarize_json(value, self.max_tokens)
+                return rendered, rendered != _compact(value)
+            text = _compact(value)
+        else:
+            text = "" if value is None else str(value)
+
+        if estimate_tokens(text) <= self.max_tokens:
+            return text, False
+        if self.strategy == "head_tail":
+            return head_tail_text(text, self.max_tokens), True
+        return truncate_text(text, self.max_tokens), True
+
+
+class PromptTemplate:
+    """
+    A template compiled once into literal text and {slot} references.
+    Literal braces are written {{ }} as with str.format.
+    """
+
+    def __init__(self, name: str, text: str, **slots: Slot):
+        self.name = name
+        self.slots = slots
+        self._parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(textwrap.dedent(text).strip("\n")):
+            if literal:
+                self._parts.append((literal, None))
+            if field is None:
+                continue
+            if spec or conversion or field not in slots:
+                raise ValueError(f"Template {name}: bad or undeclared slot {{{field}}}")
+            self._parts.append((None, field))
+        unused = set(slots) - {field for _, field in self._parts if field}
+        if unused:
+            raise ValueError(f"Template {name}: slots not used in text: {sorted(unused)}")
+
+    @property
+    def max_tokens(self) -> int:
+        """Upper bound on the size of a rendered prompt."""
+        literal = "".join(text for text, _ in self._parts if text)
+        fields = [field for _, field in self._parts if field]
+        return estimate_tokens(literal) + sum(self.slots[f].max_tokens for f in fields)
+
+    def render(self, **values) -> str:
+        unknown = set(values) - set(self.slots)
+        if unknown:
+            raise KeyError(f"Template {self.name}: unknown slots {sorted(unknown)}")
+        filled = {}
+        for field, slot in self.slots.items():
+            if field not in values:
+                if slot.required:
+                    raise KeyError(f"Template {self.name}: missing slot {field}")
+                filled[field] = ""
+                continue
+            filled[field], cut = slot.fill(values[field])
+            if cut:
+                PROMPT_TRUNCATIONS.inc(template=self.name, slot=field)
+        return "".join(text if field is None else filled[field] for text, field in self._parts)
@@ -0,0 +1,176 @@
+"""
+Client-side rate limiting for upstream quotas (Gemini RPM/TPM, Amadeus TPS).
+
+Each upstream gets a RateLimiter: a token bucket for requests, an optional
+second bucket for tokens per minute, a priority queue so interactive
+requests go before batch work, and AIMD-style backoff when the upstream
+answers 429.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from resilience import Unavailable
+from telemetry import counter, histogram
+
+INTERACTIVE = 0
+BATCH = 1
+
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+THROTTLED = counter("travelbuddy_rate_limit_throttled_total", "429 responses seen per upstream.")
+WAIT_SECONDS = histogram("travelbuddy_rate_limit_wait_seconds", "Time spent waiting for a rate limit slot.")
+
+
+class RateLimitTimeout(Unavailable):
+    """
+    No slot became available within the caller's timeout. An Unavailable,
+    so a request that runs out of time in the queue degrades like one whose
+    deadline or breaker stops the call.
+    """
+
+
+@contextmanager
+def priority_scope(priority: int):
+    """Run a block (e.g. one batch item) at the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        self.tokens -= cost
+
+
+class RateLimiter:
+    """
+    name:  upstream label for metrics
+    rate:  sustained requests per second
+    burst: bucket capacity (requests allowed back to back)
+    tpm:   optional tokens-per-minute budget (Gemini)
+    """
+
+    MIN_BACKOFF = 1.0
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, name: str, rate: float, burst: float = 1.0, tpm: float = None):
+        self.name = name
+        self.max_rate = rate
+        self.requests = TokenBucket(rate, burst)
+        self.tokens = TokenBucket(tpm / 60.0, tpm) if tpm else None
+        self.blocked_until = 0.0
+        self.backoff = self.MIN_BACKOFF
+        # Off for offline replay (benchmark.py), where there is no quota to protect
+        self.enabled = True
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _wait_time(self, cost: int, now: float) -> float:
+        wait = max(self.blocked_until - now, self.requests.wait_time(1, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(min(cost, self.tokens.capacity), now))
+        return wait
+
+    def acquire(self, cost: int = 0, priority: int = None, timeout: float = None):
+        """
+        Block until a request slot (and `cost` TPM tokens) is available.
+        Lower priority values are served first; FIFO within a priority.
+        """
+        if not self.enabled:
+            return
+        priority = current_priority() if priority is None else priority
+        ticket = (priority, next(self._seq))
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiters[0] == ticket:
+                        wait = self._wait_time(cost, now)
+                        if wait <= 0:
+                            self.requests.take(1)
+                            if self.tokens:
+                                self.tokens.take(min(cost, self.tokens.capacity))
+                            WAIT_SECONDS.observe(now - start, upstream=self.name)
+                            return
+                    else:
+                        # Not our turn; wake up when the head waiter is served
+                        wait = 0.1
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise RateLimitTimeout(f"{self.name}: no rate limit slot within {timeout}s")
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                if ticket in self._waiters:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def report_throttled(self, retry_after: float = None):
+        """Upstream said 429: pause everyone and halve the sustained rate."""
+        THROTTLED.inc(upstream=self.name)
+        with self._cond:
+            pause = retry_after if retry_after else self.backoff
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+            self.requests.rate = max(self.requests.rate / 2, self.max_rate / 16)
+
+    def report_success(self):
+        """Recover gradually after throttling (additive increase)."""
+        if self.requests.rate >= self.max_rate and self.backoff == self.MIN_BACKOFF:
+            return
+        with self._cond:
+            self.requests.rate = min(self.max_rate, self.requests.rate + self.max_rate / 20)
+            self.backoff = max(self.MIN_BACKOFF, self.backoff / 2)
+
+
+def parse_retry_after(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+GEMINI_LIMITER = RateLimiter(
+    "gemini",
+    rate=float(os.getenv("GEMINI_RPM", "60")) / 60.0,
+    burst=float(os.getenv("GEMINI_BURST", "5")),
+    tpm=float(os.getenv("GEMINI_TPM", "1000000")),
+)
+AMADEUS_LIMITER = RateLimiter(
+    "amadeus",
+    rate=float(os.getenv("AMADEUS_TPS", "10")),
+    burst=float(os.getenv("AMADEUS_BURST", "1")),
+)
@@ -0,0 +1,157 @@
+"""
+Circuit breakers per upstream and a per-request deadline.
+
+A request sets a deadline once (deadline_scope); every tool call then asks
+call_timeout() how long it may take. If the upstream's breaker is open, or
+too little time is left to make the call worthwhile, Unavailable is raised
+and the caller degrades (stale cache, or the data is omitted).
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from telemetry import counter
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Below this much remaining time a call to the upstream is not attempted
+MIN_CALL_BUDGET = {
+    "gemini": 2.0,
+    "amadeus": 1.0,
+    "openweather": 0.3,
+    "restcountries": 0.3,
+}
+DEFAULT_SLO_SECONDS = float(os.getenv("TRAVELBUDDY_SLO_SECONDS", "45"))
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+DEGRADED = counter("travelbuddy_degraded_calls_total", "Tool calls skipped by an open breaker or exhausted deadline.")
+BREAKER_TRIPS = counter("travelbuddy_circuit_breaker_trips_total", "Times a circuit breaker opened.")
+
+
+class Unavailable(Exception):
+    """The upstream must not be called right now (breaker open or no time left)."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_running = False
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def release_trial(self):
+        """End a half-open trial that proved nothing either way (e.g. a 429 or an abandoned stream)."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    BREAKER_TRIPS.inc(upstream=self.name)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+BREAKERS = {
+    "gemini": CircuitBreaker("gemini", failure_threshold=3, reset_timeout=30.0),
+    "amadeus": CircuitBreaker("amadeus", failure_threshold=5, reset_timeout=30.0),
+    "openweather": CircuitBreaker("openweather", failure_threshold=3, reset_timeout=60.0),
+    "restcountries": CircuitBreaker("restcountries", failure_threshold=3, reset_timeout=60.0),
+}
+
+
+@contextmanager
+def deadline_scope(seconds: float = None):
+    """Give everything inside this block (including tool calls) `seconds` in total."""
+    seconds = DEFAULT_SLO_SECONDS if seconds is None else seconds
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float:
+    """Seconds left for the current request, or None when no deadline is set."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def call_timeout(upstream: str, default_timeout: float) -> float:
+    """
+    Timeout to use for the next call to `upstream`, capped by the request
+    deadline. Raises Unavailable if the breaker is open or time is too short.
+    """
+    left = remaining()
+    if left is not None and left < MIN_CALL_BUDGET.get(upstream, 0.5):
+        DEGRADED.inc(upstream=upstream, reason="deadline")
+        raise Unavailable(f"{upstream}: only {max(left, 0):.1f}s left in the request budget")
+    if not BREAKERS[upstream].allow():
+        DEGRADED.inc(upstream=upstream, reason="circuit_open")
+        raise Unavailable(f"{upstream}: circuit open")
+    return default_timeout if left is None else min(default_timeout, left)
+
+
+def guarded_request(upstream: str, method: str, url: str, timeout: float, **kwargs):
+    """
+    requests.get/post through the upstream's breaker and the request deadline.
+    Network errors and 5xx count as failures; other responses as successes.
+    """
+    timeout = call_timeout(upstream, timeout)
+    breaker = BREAKERS[upstream]
+    try:
+        resp = getattr(requests, method.lower())(url, timeout=timeout, **kwargs)
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    if resp.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return resp
@@ -0,0 +1,112 @@
+"""
+Bundled risk table (data/risk_profiles.json) and the compact safety context
+built from it.
+
+The file is versioned and columnar: one column per field, for baseline
+country advisory levels and for recurring seasonal hazards. It is loaded
+once, with a per-country row index. After that a trip's safety context
+(advisory, hazards in the travel months, weather summary) is assembled from
+memory in microseconds. It is the same for every request with the same
+inputs, and much smaller than the raw weather and country API payloads it
+replaces in the Safety prompt.
+"""
+import json
+import os
+from datetime import datetime
+
+from geo import city_info
+
+RISK_PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "risk_profiles.json")
+ADVISORY_LABELS = {1: "normal precautions", 2: "increased caution", 3: "reconsider travel", 4: "do not travel"}
+# Weather summary fields passed on to the prompt
+WEATHER_FIELDS = ("source", "temp_min_c", "temp_max_c", "conditions", "monthly_precip_mm")
+
+_tables = {}
+
+
+def _index(countries: list) -> dict:
+    index = {}
+    for row, country in enumerate(countries):
+        index.setdefault(country, []).append(row)
+    return index
+
+
+def load_tables(path: str = RISK_PROFILES_FILE) -> dict:
+    """{"version", "advisories": {column: [...]}, "hazards": {column: [...]}, "*_index": {country: [rows]}}."""
+    if not _tables:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        _tables.update(
+            version=data.get("version"),
+            advisories=data["advisories"],
+            hazards=data["hazards"],
+            advisories_index=_index(data["advisories"]["country"]),
+            hazards_index=_index(data["hazards"]["country"]),
+        )
+    return _tables
+
+
+def advisory(country: str):
+    """{"level", "label", "summary"} for an ISO country code, or None."""
+    tables = load_tables()
+    rows = tables["advisories_index"].get(country)
+    if not rows:
+        return None
+    column = tables["advisories"]
+    level = column["level"][rows[0]]
+    return {"level": level, "label": ADVISORY_LABELS.get(level), "summary": column["summary"][rows[0]]}
+
+
+def seasonal_hazards(country: str, months) -> list:
+    """[{"hazard", "severity", "advice"}] recurring in any of `months` (1-12)."""
+    tables = load_tables()
+    column = tables["hazards"]
+    months = set(months)
+    return [
+        {"hazard": column["hazard"][row], "severity": column["severity"][row], "advice": column["advice"][row]}
+        for row in tables["hazards_index"].get(country, [])
+        if months & set(column["months"][row])
+    ]
+
+
+def _months(start_date: str, end_date: str) -> list:
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date or start_date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return [datetime.utcnow().month]
+    months, year, month = [], start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(month)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def safety_context(weather_data: list, country_profiles: list = None) -> dict:
+    """
+    Compact per-city safety facts for the prompt, from trip_weather entries
+    (one per city) and the matching country profiles:
+        {"dataset_version", "cities": [{"city", "country", "dates", "weather",
+         "advisory", "hazards"}, ...]}
+    """
+    profiles = country_profiles or []
+    cities = []
+    for n, weather in enumerate(weather_data or []):
+        if not isinstance(weather, dict):
+            continue
+        city = weather.get("city")
+        info = city_info(city) or {}
+        profile = profiles[n] if n < len(profiles) and isinstance(profiles[n], dict) else {}
+        code = info.get("country")
+        entry = {
+            "city": city,
+            "country": profile.get("name") or code,
+            "dates": f"{weather.get('start_date')}..{weather.get('end_date')}" if weather.get("end_date") else None,
+        }
+        if not weather.get("error"):
+            entry["weather"] = {k: weather[k] for k in WEATHER_FIELDS if k in weather}
+        if code:
+            entry["advisory"] = advisory(code)
+            entry["hazards"] = seasonal_hazards(code, _months(weather.get("start_date"), weather.get("end_date")))
+        cities.append(entry)
+    return {"dataset_version": load_tables()["version"], "cities": cities}
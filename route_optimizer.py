@@ -0,0 +1,190 @@
+"""
+City order optimisation for multi-city trips.
+
+The planner LLM picks the order of the cities, but for 3+ cities the order
+changes how much the trip costs and how long it takes to travel. This
+module builds a pairwise leg matrix from local data only: for each pair,
+the best of the rail, bus, car and flight estimates from transport (a
+known recent fare, or distance models over the gazetteer). Each leg's
+money and time are folded into one cost with transport.weight. The order is then solved with Held-Karp
+dynamic programming for up to EXACT_MAX_CITIES cities, and with nearest
+neighbour plus 2-opt above that. Plans keep their first and last city, the
+ends of the flight search, and only the cities in between are reordered as
+an open path, so a cheaper order never changes which flights are searched.
+No network calls are made, so this takes milliseconds.
+"""
+import itertools
+import os
+
+from transport import estimate_leg, weight
+
+# Reorder 3+ city plans to the cheapest/fastest route
+OPTIMIZE_ROUTE = os.getenv("TRAVELBUDDY_OPTIMIZE_ROUTE", "1") == "1"
+
+# Above this many cities Held-Karp (O(n^2 2^n)) is replaced by a heuristic
+EXACT_MAX_CITIES = 10
+# Closing cost that keeps every city but the last from ending an open path
+_NOT_LAST = 1e12
+
+
+def leg_estimate(city_a: str, city_b: str):
+    """
+    {"mode", "cost_usd", "minutes", "source"} of the best way from city_a to
+    city_b, or None if either city is not in the gazetteer.
+    """
+    leg = estimate_leg(city_a, city_b)
+    return dict(leg["best"]) if leg else None
+
+
+def held_karp(cost: list, round_trip: bool = True):
+    """
+    Cheapest order visiting every node once, starting at node 0 (and
+    returning to it if round_trip), by dynamic programming over subsets.
+    Returns (order, total).
+    """
+    n = len(cost)
+    if n <= 2:
+        order = list(range(n))
+        return order, _path_cost(cost, order, round_trip)
+    # best[(mask, j)] = (cost, previous node) of the cheapest path from 0 over mask ending at j
+    best = {(1 << j, j): (cost[0][j], 0) for j in range(1, n)}
+    for size in range(2, n):
+        for subset in itertools.combinations(range(1, n), size):
+            mask = sum(1 << j for j in subset)
+            for j in subset:
+                prev_mask = mask & ~(1 << j)
+                best[(mask, j)] = min((best[(prev_mask, k)][0] + cost[k][j], k) for k in subset if k != j)
+    full = (1 << n) - 2
+    total, last = min((best[(full, j)][0] + (cost[j][0] if round_trip else 0), j) for j in range(1, n))
+    order, mask = [], full
+    while last != 0:
+        order.append(last)
+        mask, last = mask & ~(1 << last), best[(mask, last)][1]
+    return [0] + order[::-1], total
+
+
+def _path_cost(cost: list, order: list, round_trip: bool) -> float:
+    total = sum(cost[a][b] for a, b in zip(order, order[1:]))
+    if round_trip and len(order) > 1:
+        total += cost[order[-1]][order[0]]
+    return total
+
+
+def nearest_neighbour_2opt(cost: list, round_trip: bool = True):
+    """Heuristic order for larger trips: greedy tour from node 0, improved by 2-opt moves."""
+    n = len(cost)
+    order, left = [0], set(range(1, n))
+    while left:
+        nxt = min(left, key=lambda j: cost[order[-1]][j])
+        order.append(nxt)
+        left.remove(nxt)
+    best = _path_cost(cost, order, round_trip)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for k in range(i + 1, n):
+                candidate = order[:i] + order[i:k + 1][::-1] + order[k + 1:]
+                candidate_cost = _path_cost(cost, candidate, round_trip)
+                if candidate_cost < best - 1e-9:
+                    order, best, improved = candidate, candidate_cost, True
+    return order, best
+
+
+def _totals(legs: list) -> dict:
+    return {"cost_usd": round(sum(leg["cost_usd"] for leg in legs), 2),
+            "minutes": sum(leg["minutes"] for leg in legs)}
+
+
+def _open_path_matrix(cost: list) -> list:
+    """
+    Cost matrix whose cheapest tour is the cheapest open path from node 0 to
+    the last node: only the last node returns to 0, at no cost.
+    """
+    last = len(cost) - 1
+    return [[(0.0 if i == last else _NOT_LAST) if j == 0 and i else c for j, c in enumerate(row)]
+            for i, row in enumerate(cost)]
+
+
+def optimize_route(cities: list, round_trip: bool = True, keep_last: bool = False):
+    """
+    Best order for `cities` (first city fixed; with keep_last, the last one
+    too, as an open path) with its legs, totals and savings against the
+    given order. None if there are fewer than 3 cities or one is not in the
+    gazetteer.
+    """
+    if not isinstance(cities, list) or len(cities) < 3 or len(set(cities)) != len(cities):
+        return None
+    n = len(cities)
+    legs = [[None] * n for _ in range(n)]
+    for i, j in itertools.permutations(range(n), 2):
+        legs[i][j] = leg_estimate(cities[i], cities[j])
+        if legs[i][j] is None:
+            return None
+    cost = [[weight(legs[i][j]) if i != j else 0.0 for j in range(n)] for i in range(n)]
+    if keep_last:
+        round_trip = False
+        search, closed = _open_path_matrix(cost), True
+    else:
+        search, closed = cost, round_trip
+
+    if n <= EXACT_MAX_CITIES:
+        order, total = held_karp(search, closed)
+        method = "exact"
+    else:
+        order, total = nearest_neighbour_2opt(search, closed)
+        method = "heuristic"
+    if total >= _path_cost(search, list(range(n)), closed) - 1e-9:
+        # No better than the planner's order (ties included): keep that one
+        order = list(range(n))
+
+    def route_legs(indexes):
+        pairs = list(zip(indexes, indexes[1:])) + ([(indexes[-1], indexes[0])] if round_trip else [])
+        return [dict(legs[a][b], **{"from": cities[a], "to": cities[b]}) for a, b in pairs]
+
+    chosen = route_legs(order)
+    original = _totals(route_legs(list(range(n))))
+    totals = _totals(chosen)
+    return {
+        "order": [cities[i] for i in order],
+        "original_order": list(cities),
+        "method": method,
+        "round_trip": round_trip,
+        "legs": chosen,
+        **totals,
+        "savings": {"cost_usd": round(original["cost_usd"] - totals["cost_usd"], 2),
+                    "minutes": original["minutes"] - totals["minutes"]},
+    }
+
+
+def _reorder_days(daily_plan: list, order: list) -> list:
+    """Daily plan grouped by the new city order; days for other cities stay with the day before them."""
+    position = {city: i for i, city in enumerate(order)}
+    keyed, key = [], -1
+    for day in daily_plan:
+        city = day.get("city") if isinstance(day, dict) else None
+        key = position.get(city, key)
+        keyed.append((key, day))
+    reordered = [day for _, day in sorted(keyed, key=lambda kd: kd[0])]
+    if all(isinstance(d, dict) and isinstance(d.get("day"), int) for d in reordered):
+        reordered = [dict(d, day=n) for n, d in enumerate(reordered, start=1)]
+    return reordered
+
+
+def optimize_plan(trip_plan: dict) -> dict:
+    """
+    Reorder the plan's cities between the first and the last (and the
+    daily_plan) when a better order exists, and record the result as
+    trip_plan["route"]. The plan is changed in place and returned.
+    """
+    if not isinstance(trip_plan, dict):
+        return trip_plan
+    route = optimize_route(trip_plan.get("city"), keep_last=True)
+    if route is None:
+        return trip_plan
+    trip_plan["route"] = route
+    if route["order"] != route["original_order"]:
+        trip_plan["city"] = route["order"]
+        if isinstance(trip_plan.get("daily_plan"), list):
+            trip_plan["daily_plan"] = _reorder_days(trip_plan["daily_plan"], route["order"])
+    return trip_plan
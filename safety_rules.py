@@ -0,0 +1,118 @@
+"""
+Deterministic safety assessment for low-risk trips.
+
+Most trips (a week in Paris in mild weather) get boilerplate from the
+Safety LLM call. These rules read the compact safety context (risk_data)
+and, when nothing is elevated, produce the same report shape as the LLM:
+overall_risk, per-city notes with standard guidelines, and general
+recommendations. The LLM is only called when a rule flags something or
+the user asks about safety in detail.
+"""
+import os
+import re
+
+from telemetry import counter
+
+SAFETY_FAST_PATH = os.getenv("TRAVELBUDDY_SAFETY_FAST_PATH", "1") == "1"
+
+# Advisory levels at or above this need the LLM's judgement
+ELEVATED_ADVISORY_LEVEL = 3
+HOT_DAY_C = 35
+COLD_NIGHT_C = -10
+HEAVY_RAIN_MM = 200
+SEVERE_CONDITIONS = {"Thunderstorm", "Tornado", "Squall", "Snow"}
+ELEVATED_SEVERITIES = {"moderate", "high"}
+
+_DETAIL_RE = re.compile(r"\b(?:safety|safe|dangerous|danger|crime|risks?|security|scams?|health|vaccin\w*)\b",
+                        re.IGNORECASE)
+
+GENERAL_RECOMMENDATIONS = [
+    "Keep copies of your passport and travel insurance details separate from the originals.",
+    "Save the local emergency number and your embassy's contact details.",
+    "Check your government's travel advice again shortly before departure.",
+]
+
+SAFETY_ASSESSMENTS = counter("travelbuddy_safety_assessments_total",
+                             "Safety reports by who produced them (rules/llm) and, for the LLM, why.")
+
+
+def elevated_flags(context: dict, user_request: str = "") -> list:
+    """Reasons the trip needs the LLM's assessment (empty for the rule-based fast path)."""
+    flags = []
+    if _DETAIL_RE.search(user_request or ""):
+        flags.append("user asked about safety")
+    for city in context.get("cities", []):
+        name = city.get("city")
+        advisory, weather = city.get("advisory"), city.get("weather")
+        if not advisory or not weather:
+            flags.append(f"{name}: no local risk or weather data")
+            continue
+        if advisory["level"] >= ELEVATED_ADVISORY_LEVEL:
+            flags.append(f"{name}: advisory level {advisory['level']}")
+        flags.extend(f"{name}: {h['hazard']}" for h in city.get("hazards", []) if h["severity"] in ELEVATED_SEVERITIES)
+        if weather.get("temp_max_c", 0) >= HOT_DAY_C:
+            flags.append(f"{name}: extreme heat")
+        if weather.get("temp_min_c", 0) <= COLD_NIGHT_C:
+            flags.append(f"{name}: extreme cold")
+        if weather.get("monthly_precip_mm", 0) >= HEAVY_RAIN_MM:
+            flags.append(f"{name}: heavy rain season")
+        severe = SEVERE_CONDITIONS & set(weather.get("conditions", []))
+        if severe:
+            flags.append(f"{name}: forecast {', '.join(sorted(severe))}")
+    return flags
+
+
+def _weather_note(weather: dict) -> str:
+    source = "forecast" if weather.get("source") == "forecast" else "typical for the season"
+    note = f"Low risk: {weather['temp_min_c']:.0f}-{weather['temp_max_c']:.0f}°C ({source})"
+    if weather.get("conditions"):
+        note += f", {', '.join(weather['conditions']).lower()}"
+    elif weather.get("monthly_precip_mm") is not None:
+        note += f", about {weather['monthly_precip_mm']} mm of rain in the month"
+    return note + "."
+
+
+def _guidelines(city: dict) -> list:
+    weather, advisory = city["weather"], city["advisory"]
+    guidelines = []
+    if advisory["level"] >= 2:
+        guidelines.append("Stay alert in crowded places and transport hubs; keep valuables out of sight.")
+    else:
+        guidelines.append("Use normal precautions with valuables in tourist areas.")
+    if weather["temp_max_c"] - weather["temp_min_c"] >= 8 or weather["temp_min_c"] < 10:
+        guidelines.append("Pack layers for cooler mornings and evenings.")
+    if (weather.get("monthly_precip_mm") or 0) >= 60 or {"Rain", "Drizzle"} & set(weather.get("conditions", [])):
+        guidelines.append("Carry an umbrella or rain jacket.")
+    guidelines.extend(h["advice"] for h in city.get("hazards", []))
+    return guidelines
+
+
+def rule_based_report(context: dict) -> dict:
+    """Safety report in the Safety agent's shape, for a context with no elevated flags."""
+    notes = []
+    for city in context.get("cities", []):
+        advisory = city["advisory"]
+        notes.append({
+            "city": city.get("city"),
+            "weather_risk": _weather_note(city["weather"]),
+            "country_risk": f"Low: {advisory['label']} (level {advisory['level']}). {advisory['summary']}",
+            "guidelines": _guidelines(city),
+        })
+    return {
+        "overall_risk": "Low",
+        "city_safety_notes": notes,
+        "general_recommendations": list(GENERAL_RECOMMENDATIONS),
+    }
+
+
+def fast_assessment(context: dict, user_request: str = ""):
+    """The rule-based report, or None when the LLM should assess the trip."""
+    if not SAFETY_FAST_PATH or not context.get("cities"):
+        return None
+    flags = elevated_flags(context, user_request)
+    if flags:
+        reason = "detail_requested" if _DETAIL_RE.search(user_request or "") else "elevated_risk"
+        SAFETY_ASSESSMENTS.inc(source="llm", reason=reason)
+        return None
+    SAFETY_ASSESSMENTS.inc(source="rules")
+    return rule_based_report(context)
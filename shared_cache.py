@@ -0,0 +1,318 @@
+"""
+Cache tier shared by all worker processes on a node (or, with a networked
+backend, by a whole fleet).
+
+ttl_cache keeps its in-process entries and checks this tier on a miss, so
+with N uvicorn workers an IATA code, forecast or flight search is fetched
+once, not N times. Leases give cross-process single flight: one process
+calls the upstream while the others wait for its result. The Amadeus token
+refresh uses the same mechanism.
+
+Backend, chosen by TRAVELBUDDY_SHARED_CACHE:
+    sqlite (default)   file in TRAVELBUDDY_SHARED_CACHE_DB, shared on the node
+    local              no shared tier, in-process caches only
+    redis://host:6379  RedisCacheBackend (needs the redis package)
+Any other store can be plugged in with set_backend(). If the backend errors,
+it is bypassed for BACKEND_RETRY_S and the in-process caches keep working.
+
+This module must not import telemetry (telemetry -> cache_utils -> here).
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+SHARED_CACHE = os.getenv("TRAVELBUDDY_SHARED_CACHE", "sqlite")
+SHARED_CACHE_DB = os.getenv(
+    "TRAVELBUDDY_SHARED_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shared_cache.sqlite3"),
+)
+# How long a process may hold a key's lease while it calls the upstream
+LEASE_SECONDS = 30.0
+# After a backend error, use in-process caches only for this long
+BACKEND_RETRY_S = 30.0
+WAIT_POLL_S = 0.05
+
+# Identifies this process's leases
+_owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+stats = {"hits": 0, "misses": 0, "waits": 0, "errors": 0}
+
+
+class CacheBackend:
+    """
+    Interface for a shared store. Values are JSON-serializable; entries are
+    (expires_at, keep_until, value) with absolute epoch times.
+    """
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, expires_at: float, keep_until: float):
+        raise NotImplementedError
+
+    def clear(self, prefix: str = ""):
+        raise NotImplementedError
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def release_lease(self, name: str, owner: str):
+        raise NotImplementedError
+
+    def lease_held(self, name: str) -> bool:
+        raise NotImplementedError
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """One SQLite file (WAL mode) shared by every process on the node."""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str = SHARED_CACHE_DB):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path):
+            # The Amadeus token lives here too: keep the file private
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        db = self._connect()
+        db.execute("CREATE TABLE IF NOT EXISTS cache "
+                   "(key TEXT PRIMARY KEY, value TEXT, expires_at REAL, keep_until REAL)")
+        db.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL)")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str):
+        row = self._connect().execute(
+            "SELECT expires_at, keep_until, value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def set(self, key: str, value, expires_at: float, keep_until: float):
+        db = self._connect()
+        db.execute("INSERT OR REPLACE INTO cache (key, value, expires_at, keep_until) VALUES (?, ?, ?, ?)",
+                   (key, json.dumps(value), expires_at, keep_until))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            db.execute("DELETE FROM cache WHERE keep_until < ?", (time.time(),))
+
+    def clear(self, prefix: str = ""):
+        self._connect().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        db = self._connect()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            acquired = row is None or row[1] < now or row[0] == owner
+            if acquired:
+                db.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                           (name, owner, now + ttl))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def release_lease(self, name: str, owner: str):
+        self._connect().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def lease_held(self, name: str) -> bool:
+        row = self._connect().execute("SELECT expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] >= time.time()
+
+
+class RedisCacheBackend(CacheBackend):
+    """Networked backend for several nodes; needs the optional redis package."""
+
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self._redis.get(key)
+        if raw is None:
+            return None
+        expires_at, keep_until, value = json.loads(raw)
+        return expires_at, keep_until, value
+
+    def set(self, key: str, value, expires_at: float, keep_until: float):
+        ttl_ms = max(1, int((keep_until - time.time()) * 1000))
+        self._redis.set(key, json.dumps([expires_at, keep_until, value]), px=ttl_ms)
+
+    def clear(self, prefix: str = ""):
+        for key in self._redis.scan_iter(match=f"{prefix}*"):
+            if not key.startswith(b"lease:"):
+                self._redis.delete(key)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return bool(self._redis.set(f"lease:{name}", owner, nx=True, px=int(ttl * 1000)))
+
+    def release_lease(self, name: str, owner: str):
+        self._redis.eval(self._RELEASE, 1, f"lease:{name}", owner)
+
+    def lease_held(self, name: str) -> bool:
+        return bool(self._redis.exists(f"lease:{name}"))
+
+
+_backend = None
+_backend_ready = False
+_disabled_until = 0.0
+_init_lock = threading.Lock()
+
+
+def make_backend(spec: str = SHARED_CACHE):
+    """Backend for a TRAVELBUDDY_SHARED_CACHE value; None means in-process only."""
+    if spec == "local":
+        return None
+    if spec == "sqlite":
+        return SQLiteCacheBackend(SHARED_CACHE_DB)
+    if spec.startswith(("redis://", "rediss://")):
+        return RedisCacheBackend(spec)
+    raise ValueError(f"Unknown shared cache backend: {spec}")
+
+
+def set_backend(backend):
+    """Plug in a CacheBackend (or None to turn the shared tier off)."""
+    global _backend, _backend_ready, _disabled_until
+    with _init_lock:
+        _backend = backend
+        _backend_ready = True
+        _disabled_until = 0.0
+
+
+def _active():
+    global _backend, _backend_ready
+    if not _backend_ready:
+        with _init_lock:
+            if not _backend_ready:
+                try:
+                    _backend = make_backend()
+                except Exception as e:
+                    logging.warning(f"Shared cache unavailable, using in-process caches only: {e}")
+                    _backend = None
+                _backend_ready = True
+    if _backend is None or time.time() < _disabled_until:
+        return None
+    return _backend
+
+
+def _failed(error: Exception):
+    global _disabled_until
+    stats["errors"] += 1
+    _disabled_until = time.time() + BACKEND_RETRY_S
+    logging.warning(f"Shared cache error, bypassing it for {BACKEND_RETRY_S:.0f}s: {error}")
+
+
+def get(key: str):
+    """(expires_at, keep_until, value) if the key is stored (fresh or stale), else None."""
+    backend = _active()
+    if backend is None:
+        return None
+    try:
+        entry = backend.get(key)
+    except Exception as e:
+        _failed(e)
+        return None
+    stats["hits" if entry and time.time() < entry[0] else "misses"] += 1
+    return entry
+
+
+def put(key: str, value, ttl: float, stale_ttl: float = 0):
+    backend = _active()
+    if backend is None:
+        return
+    now = time.time()
+    try:
+        backend.set(key, value, now + ttl, now + ttl + stale_ttl)
+    except (TypeError, ValueError):
+        # Not JSON-serializable: stays in the in-process cache only
+        pass
+    except Exception as e:
+        _failed(e)
+
+
+def clear(prefix: str = ""):
+    backend = _active()
+    if backend is None:
+        return
+    try:
+        backend.clear(prefix)
+    except Exception as e:
+        _failed(e)
+
+
+@contextmanager
+def lease(name: str, ttl: float = LEASE_SECONDS):
+    """
+    Yields True if this process holds `name` (or there is no shared tier),
+    False if another process does; released on exit.
+    """
+    backend = _active()
+    held = True
+    if backend is not None:
+        try:
+            held = backend.acquire_lease(name, _owner, ttl)
+        except Exception as e:
+            _failed(e)
+            backend = None
+    try:
+        yield held
+    finally:
+        if backend is not None and held:
+            try:
+                backend.release_lease(name, _owner)
+            except Exception as e:
+                _failed(e)
+
+
+def wait_for(key: str, timeout: float = LEASE_SECONDS):
+    """
+    Wait while another process holds the key's lease, then return the fresh
+    entry it stored; None if it gave up, failed or took longer than timeout.
+    The wait never outlasts the current request's deadline.
+    """
+    # Imported here: resilience imports telemetry, which imports this module
+    from resilience import remaining
+
+    backend = _active()
+    if backend is None:
+        return None
+    left = remaining()
+    if left is not None:
+        timeout = min(timeout, max(left, 0.0))
+    stats["waits"] += 1
+    deadline = time.time() + timeout
+    try:
+        while time.time() < deadline:
+            entry = backend.get(key)
+            if entry and time.time() < entry[0]:
+                return entry
+            if not backend.lease_held(key):
+                # Leader finished without a usable result (e.g. an error)
+                entry = backend.get(key)
+                return entry if entry and time.time() < entry[0] else None
+            time.sleep(WAIT_POLL_S)
+    except Exception as e:
+        _failed(e)
+    return None
@@ -0,0 +1,82 @@
+"""
+Incremental parsing of a JSON object that arrives in chunks (streamed LLM output).
+
+    parser = IncrementalJSONParser()
+    for chunk in stream:
+        for key, value in parser.feed(chunk):
+            ...  # "city" is known long before "daily_plan" has finished
+
+Only top-level fields are reported, each once, as soon as its value is
+complete. Text before the opening brace (e.g. a ```json fence) is ignored.
+"""
+import json
+
+
+class IncrementalJSONParser:
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk; return [(key, value), ...] for fields completed by it."""
+        events = []
+        if self.done or not chunk:
+            return events
+        self._buf += chunk
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_start is not None and self._key is None:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+            elif not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and self._value_start is None:
+                    self._key_start = i
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf[self._value_start:i] if self._value_start is not None else None, events)
+                    self.done = True
+                    break
+            elif ch == ":" and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = i + 1
+            elif ch == "," and self._depth == 1:
+                self._emit(buf[self._value_start:i] if self._value_start is not None else None, events)
+            i += 1
+        self._pos = i
+        return events
+
+    def _emit(self, text, events: list):
+        key = self._key
+        self._key = self._key_start = self._value_start = None
+        if key is None or text is None:
+            return
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return
+        self.fields[key] = value
+        events.append((key, value))
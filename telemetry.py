@@ -0,0 +1,249 @@
+"""
+Lightweight instrumentation: spans, latency histograms, counters and
+Prometheus text export. OpenTelemetry is used in addition when installed and
+TRAVELBUDDY_OTEL=1 (spans are exported via OTLP).
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import shared_cache
+from cache_utils import all_cache_info
+
+# Seconds; covers cached lookups (ms) up to slow Amadeus/Gemini calls (20s+)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_metrics = {}
+_tracer = None
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in items]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[_label_key(labels)] = value
+
+    def render(self) -> list:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with _lock:
+            series = self.series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self.series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, **labels) -> int:
+        series = self.series.get(_label_key(labels))
+        return series["count"] if series else 0
+
+    def total(self, **labels) -> float:
+        series = self.series.get(_label_key(labels))
+        return series["sum"] if series else 0.0
+
+    def quantile(self, q: float, **labels):
+        """Estimate a quantile from the buckets (upper bound of the bucket), or None."""
+        series = self.series.get(_label_key(labels))
+        if not series or not series["count"]:
+            return None
+        target = q * series["count"]
+        for bound, count in zip(self.buckets, series["counts"]):
+            if count >= target:
+                return bound
+        return self.buckets[-1]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(key, dict(series, counts=list(series["counts"]))) for key, series in sorted(self.series.items())]
+        for key, series in items:
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+def _register(metric):
+    _metrics[metric.name] = metric
+    return metric
+
+
+# Share of the input price charged for prompt tokens read from a context cache
+CACHED_INPUT_PRICE_FACTOR = 0.25
+
+STAGE_SECONDS = _register(Histogram(
+    "travelbuddy_stage_seconds", "Latency of pipeline stages, agents and tool calls."))
+STAGE_ERRORS = _register(Counter(
+    "travelbuddy_stage_errors_total", "Stages and tool calls that raised an exception."))
+GEMINI_TOKENS = _register(Counter(
+    "travelbuddy_gemini_tokens_total", "Gemini tokens by model and kind (prompt/cached/output)."))
+GEMINI_COST = _register(Counter(
+    "travelbuddy_gemini_cost_usd_total", "Estimated Gemini spend in USD by model."))
+CACHE_HITS = _register(Gauge(
+    "travelbuddy_cache_hits", "Cache hits per tool cache."))
+CACHE_MISSES = _register(Gauge(
+    "travelbuddy_cache_misses", "Cache misses per tool cache."))
+CACHE_HIT_RATIO = _register(Gauge(
+    "travelbuddy_cache_hit_ratio", "Hit ratio per tool cache."))
+CACHE_SHARED_HITS = _register(Gauge(
+    "travelbuddy_cache_shared_hits", "In-process misses answered by the shared cache tier, per tool cache."))
+SHARED_CACHE_OPS = _register(Gauge(
+    "travelbuddy_shared_cache_ops", "Shared cache tier lookups, waits on other processes and backend errors."))
+
+
+def counter(name: str, help_text: str) -> Counter:
+    """Get or create a counter (lets other modules add their own metrics)."""
+    with _lock:
+        return _metrics.get(name) or _register(Counter(name, help_text))
+
+
+def histogram(name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+    with _lock:
+        return _metrics.get(name) or _register(Histogram(name, help_text, buckets))
+
+
+def enable_otel():
+    """Use OpenTelemetry spans if the packages are installed. Returns True on success."""
+    global _tracer
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logging.warning("opentelemetry not installed; OTel export disabled")
+        return False
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": "travelbuddy"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+    except ImportError:
+        # API only: spans go to whatever provider the host application set up
+        pass
+    _tracer = trace.get_tracer("travelbuddy")
+    return True
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """
+    Time a block as one stage. kind is "request", "agent", "llm" or "tool";
+    name identifies it (e.g. "planner", "amadeus.flight-offers").
+    """
+    otel_cm = _tracer.start_as_current_span(f"{kind}.{name}", attributes=attributes) if _tracer else None
+    otel_span = otel_cm.__enter__() if otel_cm else None
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, kind=kind, name=name)
+        if error is not None:
+            STAGE_ERRORS.inc(kind=kind, name=name, error=type(error).__name__)
+        logging.debug(f"span {kind}.{name} took {elapsed * 1000:.1f} ms")
+        if otel_cm:
+            if error is not None:
+                otel_span.record_exception(error)
+            otel_cm.__exit__(type(error) if error else None, error, error.__traceback__ if error else None)
+
+
+def record_gemini_usage(model: str, response, prices: tuple = None):
+    """
+    Count prompt/output tokens from a generate_content response, if reported.
+    prices is (USD per 1M input tokens, USD per 1M output tokens); prompt
+    tokens served from a context cache are billed at CACHED_INPUT_PRICE_FACTOR.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+    cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+    output_tokens = getattr(usage, "candidates_token_count", None) or 0
+    GEMINI_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    GEMINI_TOKENS.inc(cached_tokens, model=model, kind="cached")
+    GEMINI_TOKENS.inc(output_tokens, model=model, kind="output")
+    if prices:
+        input_cost = (prompt_tokens - cached_tokens + cached_tokens * CACHED_INPUT_PRICE_FACTOR) * prices[0]
+        GEMINI_COST.inc((input_cost + output_tokens * prices[1]) / 1_000_000, model=model)
+
+
+def _update_cache_gauges():
+    for name, info in all_cache_info().items():
+        total = info["hits"] + info["misses"]
+        CACHE_HITS.set(info["hits"], cache=name)
+        CACHE_MISSES.set(info["misses"], cache=name)
+        CACHE_HIT_RATIO.set(round(info["hits"] / total, 4) if total else 0.0, cache=name)
+        CACHE_SHARED_HITS.set(info.get("shared", 0), cache=name)
+    for op, value in shared_cache.stats.items():
+        SHARED_CACHE_OPS.set(value, op=op)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    _update_cache_gauges()
+    lines = []
+    for metric in list(_metrics.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+if os.getenv("TRAVELBUDDY_OTEL") == "1":
+    enable_otel()
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from budget_engine import accommodation_cost, estimate_trip_cost
+
+PLAN = {
+    "city": ["Paris", "Marrakech"],
+    "days": 4,
+    "daily_plan": [{"city": "Paris"}, {"city": "Paris"}, {"city": "Marrakech"}, {"city": "Marrakech"}],
+}
+DATES = {"depart_date": "2026-05-01", "return_date": "2026-05-05"}
+
+
+def test_flight_price_used_for_two_city_trip():
+    bookings = dict(DATES, flights=[{"price": "300", "currency": "USD"}, {"price": "250", "currency": "USD"}])
+    estimate = estimate_trip_cost(PLAN, bookings, 5000)
+    assert estimate["estimated_total"]["transportation"] == 250
+    assert estimate["unpriced"] == []
+    assert estimate["within_budget"] == "yes"
+
+
+def test_failed_flight_search_without_route_is_unpriced():
+    # Marrakech is not in the gazetteer, so there is no local route estimate
+    for flights in ([{"error": "HTTPError: 500"}], []):
+        bookings = dict(DATES, flights=flights, transport=None)
+        estimate = estimate_trip_cost(PLAN, bookings, 5000)
+        assert estimate["estimated_total"]["transportation"] == 0
+        assert estimate["unpriced"] == ["transportation"]
+        assert estimate["within_budget"] == "unknown"
+
+
+def test_single_city_trip_needs_no_transport():
+    plan = {"city": ["Paris"], "days": 2}
+    estimate = estimate_trip_cost(plan, dict(DATES, flights=[]), 5000)
+    assert estimate["unpriced"] == []
+    assert estimate["within_budget"] == "yes"
+
+
+def test_route_legs_replace_round_trip_fare_for_longer_trips():
+    route = {"legs": [{}, {}, {}], "cost_usd": 180.0}
+    bookings = dict(DATES, flights=[{"price": "90", "currency": "USD"}], transport=route)
+    estimate = estimate_trip_cost({"city": ["Paris", "Brussels", "Amsterdam"], "days": 4}, bookings, 5000)
+    assert estimate["estimated_total"]["transportation"] == 180
+
+
+def test_over_budget():
+    estimate = estimate_trip_cost(PLAN, dict(DATES, flights=[{"price": "300", "currency": "USD"}]), 100)
+    assert estimate["within_budget"] == "no"
+    assert estimate["over_budget_by"] > 0
+    assert estimate["adjustments"]
+
+
+def test_accommodation_priced_per_city():
+    bookings = {
+        "hotel_offers": [
+            {"price": "300", "currency": "USD", "check_in": "2026-05-01", "check_out": "2026-05-03", "city": "Paris"},
+            {"error": "No hotels found for city code RAK"},
+        ],
+        "hotels": [{"city": "Rome", "approx_price_per_night": 80}],
+    }
+    # Paris 2 x 150 from the offer, Berlin from the local table, Rome from the LLM
+    assert accommodation_cost(bookings, ["Paris", "Paris", "Berlin", "Rome"], 4) == 150 * 2 + 100 + 80
+
+
+def test_untagged_offers_belong_to_first_city():
+    bookings = {"hotel_offers": [{"price": "200", "currency": "USD", "check_in": "2026-05-01", "check_out": "2026-05-03"}]}
+    assert accommodation_cost(bookings, ["Paris", "Berlin"], 2) == 100 + 100
+    # Nights beyond the daily plan use the last city's rate
+    assert accommodation_cost({}, ["Paris"], 3) == 150 * 3
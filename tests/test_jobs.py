@@ -0,0 +1,120 @@
+import socket
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("google.genai")
+
+import jobs
+from jobs import QUEUED, RUNNING, SUCCEEDED, InMemoryJobStore, SQLiteJobStore, webhook_url_error
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.mark.parametrize("make", [InMemoryJobStore, "sqlite"])
+def test_claim_oldest_first_and_timeout(make, db_path):
+    store = SQLiteJobStore(db_path) if make == "sqlite" else make()
+    first = store.submit({"request": "Paris"})
+    second = store.submit({"request": "Rome"}, webhook_url="https://example.com/hook")
+    claimed = store.claim(timeout=0)
+    assert claimed["id"] == first["id"] and claimed["status"] == RUNNING
+    assert store.claim(timeout=0)["id"] == second["id"]
+    assert store.get(second["id"])["webhook_url"] == "https://example.com/hook"
+    start = time.monotonic()
+    assert store.claim(timeout=0.1) is None
+    assert time.monotonic() - start >= 0.1
+
+
+def test_concurrent_claims_never_share_a_job(db_path):
+    store = SQLiteJobStore(db_path)
+    submitted = {store.submit({"request": str(n)})["id"] for n in range(20)}
+    claimed, lock = [], threading.Lock()
+
+    def worker():
+        # A store per thread, like separate worker processes on one file
+        mine = SQLiteJobStore(db_path)
+        while True:
+            job = mine.claim(timeout=0)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert sorted(claimed) == sorted(submitted)
+
+
+def test_running_job_is_requeued_only_after_its_claim_expires(db_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_CLAIM_TTL_S", 60)
+    live, other = SQLiteJobStore(db_path), SQLiteJobStore(db_path)
+    job = live.submit({"request": "Paris"})
+    assert live.claim(timeout=0)["id"] == job["id"]
+    # Another process leaves a job that is still being worked on alone
+    assert other.claim(timeout=0) is None
+
+    # The first process died: its job hasn't been updated for longer than the TTL
+    live._connect().execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 61, job["id"]))
+    reclaimed = other.claim(timeout=0)
+    assert reclaimed["id"] == job["id"] and reclaimed["status"] == RUNNING
+
+
+def test_update_and_purge(db_path):
+    store = SQLiteJobStore(db_path)
+    done = store.submit({"request": "a"})
+    queued = store.submit({"request": "b"})
+    store.update(done["id"], status=SUCCEEDED, result={"trip_plan": {"city": ["Paris"]}})
+    assert store.get(done["id"])["result"] == {"trip_plan": {"city": ["Paris"]}}
+    store.purge(older_than=time.time() + 1)
+    assert store.get(done["id"]) is None
+    assert store.get(queued["id"])["status"] == QUEUED
+
+
+def _resolves_to(*addresses):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET6 if ":" in a else socket.AF_INET, socket.SOCK_STREAM, 6, "", (a, port))
+                for a in addresses]
+    return getaddrinfo
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "169.254.169.254", "10.1.2.3", "192.168.0.10", "::1",
+                                     "fe80::1%eth0", "224.0.0.1"])
+def test_webhook_to_internal_address_is_rejected(address, monkeypatch):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", _resolves_to(address))
+    assert webhook_url_error("https://hooks.example.com/done") == "webhook_url must point to a public address"
+
+
+def test_webhook_rejected_if_any_address_is_internal(monkeypatch):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", _resolves_to("93.184.216.34", "127.0.0.1"))
+    assert webhook_url_error("https://hooks.example.com/done") is not None
+
+
+def test_public_webhook_is_allowed(monkeypatch):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", _resolves_to("93.184.216.34"))
+    assert webhook_url_error("https://hooks.example.com/done") is None
+
+
+@pytest.mark.parametrize("url", ["ftp://example.com/x", "file:///etc/passwd", "https://", "not a url", None])
+def test_webhook_must_be_http(url):
+    assert webhook_url_error(url) == "webhook_url must be an http(s) URL"
+
+
+def test_unresolvable_webhook_host(monkeypatch):
+    def fail(*args, **kwargs):
+        raise socket.gaierror("Name or service not known")
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", fail)
+    assert webhook_url_error("https://nowhere.invalid/") == "webhook_url host does not resolve"
+
+
+def test_webhook_allow_list(monkeypatch):
+    monkeypatch.setattr(jobs, "WEBHOOK_ALLOWED_HOSTS", {"hooks.internal"})
+    assert webhook_url_error("http://hooks.internal/done") is None
+    assert webhook_url_error("https://example.com/done") == "webhook_url host is not allowed"
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from rate_limiter import BATCH, INTERACTIVE, RateLimiter, RateLimitTimeout, priority_scope
+from resilience import Unavailable
+
+
+def test_burst_then_sustained_rate():
+    limiter = RateLimiter("test", rate=20, burst=3)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.03
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.04
+
+
+def test_timeout_raises_an_unavailable():
+    limiter = RateLimiter("test", rate=1, burst=1)
+    limiter.acquire()
+    with pytest.raises(RateLimitTimeout) as info:
+        limiter.acquire(timeout=0.05)
+    assert isinstance(info.value, Unavailable)
+    # Giving up leaves no stale ticket at the head of the queue
+    assert limiter._waiters == []
+
+
+def test_tokens_per_minute_budget():
+    limiter = RateLimiter("test", rate=1000, burst=10, tpm=600)
+    limiter.acquire(cost=600)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(cost=100, timeout=0.05)
+
+
+def test_interactive_requests_go_before_queued_batch_work():
+    limiter = RateLimiter("test", rate=10, burst=1)
+    limiter.acquire()
+    served = []
+
+    def wait_for_slot(priority):
+        with priority_scope(priority):
+            limiter.acquire()
+        served.append(priority)
+
+    batch = threading.Thread(target=wait_for_slot, args=(BATCH,))
+    batch.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=wait_for_slot, args=(INTERACTIVE,))
+    interactive.start()
+    batch.join(2)
+    interactive.join(2)
+    assert served == [INTERACTIVE, BATCH]
+
+
+def test_throttling_pauses_and_halves_the_rate_until_recovered():
+    limiter = RateLimiter("test", rate=100, burst=5)
+    limiter.report_throttled(retry_after=0.1)
+    assert limiter.requests.rate == 50
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+    for _ in range(20):
+        limiter.report_success()
+    assert limiter.requests.rate == 100
+    assert limiter.backoff == RateLimiter.MIN_BACKOFF
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter("test", rate=1, burst=1)
+    limiter.enabled = False
+    start = time.monotonic()
+    for _ in range(10):
+        limiter.acquire(timeout=0)
+    assert time.monotonic() - start < 0.05
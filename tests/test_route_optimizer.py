@@ -0,0 +1,72 @@
+import itertools
+import random
+
+import pytest
+
+pytest.importorskip("requests")
+
+from route_optimizer import (_open_path_matrix, _path_cost, held_karp, nearest_neighbour_2opt, optimize_plan,
+                             optimize_route)
+
+
+def _matrix(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [[0.0 if i == j else rng.uniform(1, 100) for j in range(n)] for i in range(n)]
+
+
+def _brute_force(cost: list, round_trip: bool) -> float:
+    n = len(cost)
+    return min(_path_cost(cost, [0] + list(rest), round_trip) for rest in itertools.permutations(range(1, n)))
+
+
+@pytest.mark.parametrize("round_trip", [True, False])
+@pytest.mark.parametrize("seed", range(5))
+def test_held_karp_matches_brute_force(seed, round_trip):
+    cost = _matrix(6, seed)
+    order, total = held_karp(cost, round_trip)
+    assert sorted(order) == list(range(6)) and order[0] == 0
+    assert total == pytest.approx(_path_cost(cost, order, round_trip))
+    assert total == pytest.approx(_brute_force(cost, round_trip))
+
+
+def test_open_path_matrix_fixes_both_ends():
+    cost = _matrix(6, 42)
+    order, total = held_karp(_open_path_matrix(cost), True)
+    assert order[0] == 0 and order[-1] == 5
+    best = min(_path_cost(cost, [0] + list(mid) + [5], False) for mid in itertools.permutations(range(1, 5)))
+    assert total == pytest.approx(best)
+
+
+def test_heuristic_returns_a_valid_order():
+    cost = _matrix(12, 7)
+    order, total = nearest_neighbour_2opt(cost, True)
+    assert sorted(order) == list(range(12)) and order[0] == 0
+    assert total == pytest.approx(_path_cost(cost, order, True))
+
+
+def test_optimize_route_keeps_ends_and_never_costs_more():
+    cities = ["Paris", "Rome", "Amsterdam", "Madrid", "Berlin"]
+    route = optimize_route(cities, keep_last=True)
+    assert route["order"][0] == "Paris" and route["order"][-1] == "Berlin"
+    assert sorted(route["order"]) == sorted(cities)
+    assert route["round_trip"] is False
+    assert len(route["legs"]) == len(cities) - 1
+    assert route["savings"]["cost_usd"] >= 0
+
+
+def test_optimize_route_needs_three_known_cities():
+    assert optimize_route(["Paris", "Berlin"]) is None
+    assert optimize_route(["Paris", "Berlin", "Atlantis"]) is None
+    assert optimize_route(["Paris", "Berlin", "Paris"]) is None
+
+
+def test_optimize_plan_reorders_daily_plan():
+    plan = {
+        "city": ["Paris", "Rome", "Amsterdam", "Berlin"],
+        "daily_plan": [{"day": 1, "city": "Paris"}, {"day": 2, "city": "Rome"},
+                       {"day": 3, "city": "Amsterdam"}, {"day": 4, "city": "Berlin"}],
+    }
+    plan = optimize_plan(plan)
+    assert plan["city"] == plan["route"]["order"]
+    assert [d["city"] for d in plan["daily_plan"]] == plan["city"]
+    assert [d["day"] for d in plan["daily_plan"]] == [1, 2, 3, 4]
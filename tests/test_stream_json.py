@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from stream_json import IncrementalJSONParser
+
+PLAN = {
+    "city": ["Paris", "Berlin"],
+    "days": 4,
+    "summary": "Art, \"beer\" and {braces}, [brackets], commas",
+    "daily_plan": [{"day": 1, "city": "Paris", "activities": ["Louvre"]}],
+}
+
+
+def _feed_all(text: str, size: int) -> list:
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return parser, events
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 10000])
+def test_fields_match_json_loads_for_any_chunking(size):
+    text = json.dumps(PLAN, indent=2)
+    parser, events = _feed_all(text, size)
+    assert dict(events) == PLAN
+    assert [key for key, _ in events] == list(PLAN)
+    assert parser.done
+
+
+def test_field_is_reported_as_soon_as_it_completes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"city": ["Paris", "Ber') == []
+    assert parser.feed('lin"], "days"') == [("city", ["Paris", "Berlin"])]
+    assert parser.feed(": 3}") == [("days", 3)]
+
+
+def test_fence_before_the_object_and_text_after_it_are_ignored():
+    parser, events = _feed_all('```json\n{"days": 2}\n```\n{"days": 5}', 3)
+    assert events == [("days", 2)]
+    assert parser.feed('{"city": []}') == []
+
+
+def test_escaped_quotes_and_unicode_in_keys_and_values():
+    text = json.dumps({"naïve \"key\"": "a \\ b \"c\"", "n": None})
+    _, events = _feed_all(text, 1)
+    assert events == [("naïve \"key\"", "a \\ b \"c\""), ("n", None)]
+
+
+def test_malformed_value_is_skipped():
+    parser = IncrementalJSONParser()
+    events = parser.feed('{"a": nope, "b": 1}')
+    assert events == [("b", 1)]
+    assert parser.fields == {"b": 1}
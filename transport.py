@@ -0,0 +1,142 @@
+"""
+Local travel-time and cost estimates for one leg between two cities.
+
+Distances come from the gazetteer (geo). Each mode has a simple model:
+    rail, bus, car   route factor x great-circle km at an average speed, a
+                     base fare plus a per-km rate, fixed overhead minutes;
+                     only within one land region, up to GROUND_MAX_KM
+    flight           the cheapest recent fare if offer_store has one, else
+                     a distance model, plus airport overhead
+A flight search is only worth an Amadeus call when no ground mode gets
+there within GROUND_MAX_MINUTES. Paris -> Brussels or Amsterdam -> Berlin
+is answered from the models; Paris -> Rome still searches flights. For a
+whole trip (estimate_route) that holds for every leg, or flights are searched.
+"""
+from geo import city_info, distance_km
+from offer_store import known_fare
+from telemetry import counter
+
+# How much an hour of travel is worth when trading time against money
+VALUE_OF_TIME_USD_PER_HOUR = 20.0
+
+# Above this door-to-door time a ground leg no longer replaces a flight
+GROUND_MAX_MINUTES = 390
+GROUND_MAX_KM = 1500
+
+# mode -> route factor (vs great circle), average km/h, base USD, USD per km, overhead minutes
+GROUND_MODES = {
+    "rail": {"route_factor": 1.2, "kmh": 125.0, "base_usd": 10.0, "usd_per_km": 0.12, "overhead_minutes": 30},
+    "bus": {"route_factor": 1.25, "kmh": 70.0, "base_usd": 5.0, "usd_per_km": 0.06, "overhead_minutes": 20},
+    "car": {"route_factor": 1.25, "kmh": 85.0, "base_usd": 0.0, "usd_per_km": 0.15, "overhead_minutes": 10},
+}
+
+FLIGHT_BASE_USD = 50.0
+FLIGHT_USD_PER_KM = 0.08
+FLIGHT_KMH = 750.0
+# Getting to the airport, check-in, boarding and getting into town
+FLIGHT_OVERHEAD_MINUTES = 150.0
+
+# Countries joined by land (or the Channel Tunnel); ground modes stay inside one region
+LAND_REGIONS = {
+    "europe": {"AT", "BE", "CH", "CZ", "DE", "DK", "ES", "FR", "GB", "GR", "HU", "IT", "NL", "NO", "PL",
+               "PT", "SE", "TR"},
+    "east_asia": {"CN", "HK"},
+    "north_america": {"US", "CA", "MX"},
+}
+
+FLIGHT_SEARCHES_SKIPPED = counter("travelbuddy_flight_searches_skipped_total",
+                                  "Flight searches not made because a ground leg was good enough.")
+
+
+def _region(country: str) -> str:
+    for region, countries in LAND_REGIONS.items():
+        if country in countries:
+            return region
+    # Anything else only connects to itself (islands, unlisted countries)
+    return country
+
+
+def weight(option: dict) -> float:
+    """Money plus time valued at VALUE_OF_TIME_USD_PER_HOUR, for comparing options."""
+    return option["cost_usd"] + option["minutes"] / 60.0 * VALUE_OF_TIME_USD_PER_HOUR
+
+
+def ground_options(city_a: str, city_b: str, km: float) -> list:
+    """Rail, bus and car estimates for the leg (empty if no ground route is plausible)."""
+    a, b = city_info(city_a), city_info(city_b)
+    if _region(a["country"]) != _region(b["country"]) or km > GROUND_MAX_KM:
+        return []
+    options = []
+    for mode, model in GROUND_MODES.items():
+        route_km = km * model["route_factor"]
+        options.append({
+            "mode": mode,
+            "cost_usd": round(model["base_usd"] + model["usd_per_km"] * route_km, 2),
+            "minutes": round(route_km / model["kmh"] * 60 + model["overhead_minutes"]),
+            "source": "model",
+        })
+    return options
+
+
+def flight_option(city_a: str, city_b: str, km: float) -> dict:
+    fare = known_fare(city_info(city_a)["iata"], city_info(city_b)["iata"])
+    if fare:
+        minutes = fare["minutes"] if fare["minutes"] is not None else km / FLIGHT_KMH * 60
+        return {"mode": "flight", "cost_usd": fare["price_usd"],
+                "minutes": round(minutes + FLIGHT_OVERHEAD_MINUTES), "source": "fare"}
+    return {
+        "mode": "flight",
+        "cost_usd": round(FLIGHT_BASE_USD + FLIGHT_USD_PER_KM * km, 2),
+        "minutes": round(km / FLIGHT_KMH * 60 + FLIGHT_OVERHEAD_MINUTES),
+        "source": "model",
+    }
+
+
+def estimate_leg(city_a: str, city_b: str):
+    """
+    {"from", "to", "distance_km", "options", "best", "search_flights"} for
+    one leg, or None if either city is not in the gazetteer.
+    search_flights is False when a ground mode is fast enough that an
+    Amadeus search isn't worth making; best is then the ground option with
+    the lowest weight(), otherwise the lowest-weight option of all.
+    """
+    km = distance_km(city_a, city_b)
+    if km is None:
+        return None
+    ground = ground_options(city_a, city_b, km)
+    fastest_ground = min((o["minutes"] for o in ground), default=None)
+    search_flights = fastest_ground is None or fastest_ground > GROUND_MAX_MINUTES
+    options = ground + [flight_option(city_a, city_b, km)]
+    return {
+        "from": city_a,
+        "to": city_b,
+        "distance_km": round(km),
+        "options": options,
+        "best": min(options if search_flights else ground, key=weight),
+        "search_flights": search_flights,
+    }
+
+
+def estimate_route(cities: list, round_trip: bool = True):
+    """
+    {"legs": [estimate_leg(...) per consecutive pair of cities, plus last ->
+    first if round_trip], "search_flights", "cost_usd"}, or None with fewer
+    than two cities or one not in the gazetteer. search_flights is True if
+    any leg needs a flight; cost_usd adds up each leg's best option.
+    """
+    if not isinstance(cities, list) or len(cities) < 2:
+        return None
+    pairs = list(zip(cities, cities[1:]))
+    if round_trip:
+        pairs.append((cities[-1], cities[0]))
+    legs = []
+    for city_a, city_b in pairs:
+        leg = estimate_leg(city_a, city_b)
+        if leg is None:
+            return None
+        legs.append(leg)
+    return {
+        "legs": legs,
+        "search_flights": any(leg["search_flights"] for leg in legs),
+        "cost_usd": round(sum(leg["best"]["cost_usd"] for leg in legs), 2),
+    }
@@ -0,0 +1,86 @@
+"""
+Weather for the days the traveller is actually in each city.
+
+The plan's days are assigned to cities (same rule as the budget), which
+gives a date range per city. Days within the forecast horizon are taken
+from the cached per-city forecast (weather_api.get_forecast, one call per
+city). Days beyond it use the bundled monthly normals (climatology). A
+trip that starts after the horizon therefore makes no weather call at all.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from budget_engine import day_cities
+from climatology import monthly_normals
+from utils import submit_in_context
+from weather_api import FORECAST_HORIZON_DAYS, get_forecast
+
+
+def city_dates(trip_plan: dict, depart_date: str, return_date: str) -> dict:
+    """{city: ['YYYY-MM-DD', ...]} for each night of the trip, in plan order."""
+    start = datetime.strptime(depart_date, "%Y-%m-%d")
+    nights = max((datetime.strptime(return_date, "%Y-%m-%d") - start).days, 1)
+    dates = {}
+    for offset, city in enumerate(day_cities(trip_plan, nights)[:nights]):
+        if city:
+            dates.setdefault(city, []).append((start + timedelta(days=offset)).strftime("%Y-%m-%d"))
+    return dates
+
+
+def _climate_day(city: str, date: str):
+    normals = monthly_normals(city, int(date[5:7]))
+    if normals is None:
+        return None
+    return dict(normals, date=date, source="climatology")
+
+
+def _city_weather(city: str, dates: list, horizon_end: str) -> dict:
+    forecast = {}
+    if dates and dates[0] <= horizon_end:
+        result = get_forecast(city)
+        forecast = {day["date"]: day for day in result.get("days", [])} if not result.get("error") else {}
+    days = []
+    for date in dates:
+        day = dict(forecast[date], source="forecast") if date in forecast else _climate_day(city, date)
+        if day:
+            days.append(day)
+    if not days:
+        return {"city": city, "start_date": dates[0] if dates else None, "error": "no forecast or climate data"}
+    sources = {day["source"] for day in days}
+    summary = {
+        "city": city,
+        "start_date": dates[0],
+        "end_date": dates[-1],
+        "source": sources.pop() if len(sources) == 1 else "mixed",
+        "temp_min_c": min(day["temp_min_c"] for day in days),
+        "temp_max_c": max(day["temp_max_c"] for day in days),
+    }
+    conditions = [day["weather"] for day in days if day.get("weather")]
+    if conditions:
+        summary["conditions"] = sorted(set(conditions), key=conditions.index)
+    precip = [day["precip_mm"] for day in days if "precip_mm" in day]
+    if precip:
+        summary["monthly_precip_mm"] = max(precip)
+    summary["days"] = days
+    return summary
+
+
+def trip_weather(trip_plan: dict, depart_date: str, return_date: str) -> list:
+    """
+    One entry per planned city: {"city", "start_date", "end_date", "source"
+    ("forecast", "climatology" or "mixed"), "temp_min_c", "temp_max_c",
+    "conditions"?, "monthly_precip_mm"?, "days": [...]}, or {"city", "error"}.
+    """
+    cities = trip_plan.get("city") or []
+    if isinstance(cities, str):
+        cities = [cities]
+    try:
+        dates = city_dates(trip_plan, depart_date, return_date)
+    except (TypeError, ValueError):
+        dates = {}
+    # Cities the daily plan doesn't mention get the whole trip
+    trip_days = sorted({date for city_days in dates.values() for date in city_days})
+    horizon_end = (datetime.utcnow() + timedelta(days=FORECAST_HORIZON_DAYS - 1)).strftime("%Y-%m-%d")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [submit_in_context(pool, _city_weather, city, dates.get(city) or trip_days, horizon_end) for city in cities]
+        return [f.result() for f in futures]
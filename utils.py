@@ -1,3 +1,4 @@
+import contextvars
 import json
 import re
 
@@ -21,3 +22,11 @@ def cleanup_json(raw_text: str):
     except Exception:
         # If it isn't valid JSON, just return the cleaned string
         return cleaned
+
+
+def submit_in_context(pool, fn, *args, **kwargs):
+    """
+    Submit work to a thread pool while keeping the caller's context variables
+    (request priority, deadlines) visible inside the worker thread.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -1,7 +1,11 @@
 import os
-import requests
+from datetime import datetime
 from dotenv import load_dotenv
 
+from cache_utils import ttl_cache
+from resilience import guarded_request
+from telemetry import span
+
 load_dotenv()
 
 WEATHER_KEY = os.getenv("OPENWEATHER_API_KEY")
@@ -9,33 +13,65 @@ if not WEATHER_KEY:
     raise ValueError("OPENWEATHER_API_KEY not found in .env")
 
 
-def get_weather(city_name: str):
-    """
-    Get current weather and alerts for the city.
-    Uses OpenWeather.
-    """
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+DAILY_FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast/daily"
+# The 16-day daily forecast needs a paid OpenWeather plan; the default is the free 5-day/3-hour one
+DAILY_FORECAST = os.getenv("OPENWEATHER_DAILY_FORECAST", "0") == "1"
+FORECAST_HORIZON_DAYS = 16 if DAILY_FORECAST else 5
 
-    url = "https://api.openweathermap.org/data/2.5/weather"
-    params = {
-        "q": city_name,
-        "appid": WEATHER_KEY,
-        "units": "metric"
-    }
 
-    try:
-        resp = requests.get(url, params=params, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
+def _daily_from_3h(entries: list) -> list:
+    """Collapse 3-hourly forecast entries into one summary per date."""
+    by_date = {}
+    for entry in entries:
+        by_date.setdefault(entry.get("dt_txt", "")[:10], []).append(entry)
+    days = []
+    for date, items in sorted(by_date.items()):
+        conditions = [item["weather"][0] for item in items if item.get("weather")]
+        # The midday-ish entry describes the day best
+        typical = conditions[len(conditions) // 2] if conditions else {}
+        days.append({
+            "date": date,
+            "temp_min_c": min(item["main"]["temp_min"] for item in items),
+            "temp_max_c": max(item["main"]["temp_max"] for item in items),
+            "weather": typical.get("main"),
+            "description": typical.get("description"),
+            "pop": max(item.get("pop", 0) for item in items),
+        })
+    return days
 
-        result = {
-            "city": city_name,
-            "temp_c": data["main"]["temp"],
-            "feels_like": data["main"]["feels_like"],
-            "weather": data["weather"][0]["main"],
-            "description": data["weather"][0]["description"]
-        }
 
-        return result
+def _daily_from_16d(entries: list) -> list:
+    return [{
+        "date": datetime.utcfromtimestamp(entry["dt"]).strftime("%Y-%m-%d"),
+        "temp_min_c": entry["temp"]["min"],
+        "temp_max_c": entry["temp"]["max"],
+        "weather": (entry.get("weather") or [{}])[0].get("main"),
+        "description": (entry.get("weather") or [{}])[0].get("description"),
+        "pop": entry.get("pop", 0),
+    } for entry in entries]
 
+
+@ttl_cache(3 * 60 * 60, stale_ttl=12 * 60 * 60)
+def get_forecast(city_name: str):
+    """
+    Daily forecast for the next FORECAST_HORIZON_DAYS days, fetched once per
+    city and cached: {"city", "days": [{"date", "temp_min_c", "temp_max_c",
+    "weather", "description", "pop"}, ...]}.
+    """
+    params = {"q": city_name, "appid": WEATHER_KEY, "units": "metric"}
+    try:
+        if DAILY_FORECAST:
+            with span("tool", "openweather.forecast_daily"):
+                resp = guarded_request("openweather", "GET", DAILY_FORECAST_URL, timeout=5,
+                                       params=dict(params, cnt=FORECAST_HORIZON_DAYS))
+            resp.raise_for_status()
+            days = _daily_from_16d(resp.json().get("list", []))
+        else:
+            with span("tool", "openweather.forecast"):
+                resp = guarded_request("openweather", "GET", FORECAST_URL, timeout=5, params=params)
+            resp.raise_for_status()
+            days = _daily_from_3h(resp.json().get("list", []))
+        return {"city": city_name, "days": days}
     except Exception as e:
         return {"city": city_name, "error": str(e)}